@@ -195,6 +195,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 #STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
-
-
-
+# Tickets PDF ya generados (caché en disco, se puede borrar: se regeneran al pedirlos)
+TICKETS_DIR = os.environ.get('TICKETS_DIR', os.path.join(BASE_DIR, 'cache', 'tickets'))
+# Procesos para renderizar tickets y estados de cuenta en lote (render_tickets y /api/tickets/lote/)
+IMPRESION_WORKERS = int(os.environ.get('IMPRESION_WORKERS', os.cpu_count() or 1))
+# Cada cuánto revisa cada proceso si cambió la versión del catálogo de productos (gimnasio.catalogo)
+CATALOGO_REVISION_SEGUNDOS = float(os.environ.get('CATALOGO_REVISION_SEGUNDOS', 5))
+# Antigüedad máxima (días) de una venta sin conexión al sincronizarla
+VENTAS_SIN_CONEXION_DIAS = int(os.environ.get('VENTAS_SIN_CONEXION_DIAS', 7))
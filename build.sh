@@ -6,6 +6,10 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py sweep_memberships
+python manage.py sync_sequences
+python manage.py extend_class_series
+python manage.py close_day
 
 echo "--- INICIANDO CONFIGURACION DE ROLES ---"
 python manage.py setup_roles
@@ -1,5 +1,10 @@
-from django.contrib import admin
-from .models import Entrenador, Socio, Suscripcion, Clase, InscripcionClase, Producto, Caja, VentaItem, CajaMovimiento
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
+from .models import Entrenador, Socio, Suscripcion, Clase, ClaseSerie, InscripcionClase, ListaEspera, Producto, Caja, VentaItem, CajaMovimiento, CierreCaja, MovimientoStock, Secuencia
+from .agenda import ConflictoHorario, validar_disponibilidad, validar_duracion
+from .cierres import acumular
+from .inventario import StockInsuficiente, ajustar_stock
 
 @admin.register(Entrenador)
 class EntrenadorAdmin(admin.ModelAdmin):
@@ -24,30 +29,148 @@ class SuscripcionAdmin(admin.ModelAdmin):
     raw_id_fields = ('socio',)
 
 
+class InscripcionClaseInline(admin.TabularInline):
+    # Solo lectura: inscribir o dar de baja debe pasar por gimnasio.inscripciones (cobro, cupo, lista de espera)
+    model = InscripcionClase
+    fields = ('socio', 'movimiento_caja', 'fecha_inscripcion')
+    readonly_fields = fields
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ClaseForm(forms.ModelForm):
+    class Meta:
+        model = Clase
+        fields = '__all__'
+
+    def clean(self):
+        datos = super().clean()
+        duracion = datos.get('duracion_minutos')
+        if duracion is not None:
+            try:
+                validar_duracion(duracion)
+            except ValueError as e:
+                self.add_error('duracion_minutos', str(e))
+                return datos
+        if datos.get('entrenador') and datos.get('fecha_hora') and duracion:
+            # El admin guarda dentro de la misma transacción: el entrenador queda bloqueado hasta el guardado
+            try:
+                with transaction.atomic():
+                    validar_disponibilidad(datos['entrenador'].pk, datos['fecha_hora'], duracion, excluir_pk=self.instance.pk)
+            except ConflictoHorario as e:
+                raise forms.ValidationError(str(e))
+        return datos
+
+
 @admin.register(Clase)
 class ClaseAdmin(admin.ModelAdmin):
+    form = ClaseForm
     list_display = ('id_clase', 'nombre', 'fecha_hora', 'entrenador', 'precio', 'participantes_actuales')
     list_filter = ('entrenador', 'fecha_hora')
-    filter_horizontal = ('participantes',)
+    inlines = (InscripcionClaseInline,)
     readonly_fields = ('participantes_actuales',)
     raw_id_fields = ('entrenador',)
 
+@admin.register(ClaseSerie)
+class ClaseSerieAdmin(admin.ModelAdmin):
+    # Solo lectura: crear, editar o borrar una serie debe pasar por gimnasio.series (API o formulario)
+    list_display = ('nombre', 'entrenador', 'hora', 'fecha_inicio', 'fecha_fin', 'generada_hasta')
+    list_filter = ('entrenador',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(InscripcionClase)
 class InscripcionClaseAdmin(admin.ModelAdmin):
+    # Solo lectura, igual que el inline de ClaseAdmin
     list_display = ('id_inscripcion', 'socio', 'clase', 'fecha_inscripcion', 'movimiento_caja')
     list_filter = ('fecha_inscripcion',)
     raw_id_fields = ('socio', 'clase', 'movimiento_caja')
 
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ListaEspera)
+class ListaEsperaAdmin(admin.ModelAdmin):
+    list_display = ('clase', 'socio', 'posicion', 'fecha')
+    raw_id_fields = ('socio', 'clase')
+
 
 class VentaItemInline(admin.TabularInline):
     model = VentaItem
     extra = 0
 
 
+class ProductoForm(forms.ModelForm):
+    ajuste_stock = forms.IntegerField(
+        required=False, label="Ajuste de stock",
+        help_text="Unidades a sumar (compra) o restar (merma). Queda registrado en los movimientos de stock.",
+    )
+
+    class Meta:
+        model = Producto
+        fields = ("nombre", "precio", "stock_minimo")
+
+
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ("nombre", "precio")
+    form = ProductoForm
+    list_display = ("nombre", "precio", "stock", "stock_minimo")
     search_fields = ("nombre",)
+    # El stock solo cambia con ajustes y ventas (UPDATE con F()), nunca sobrescribiendo el valor leído
+    readonly_fields = ("stock",)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # Sin stock en el UPDATE: una venta simultánea no se pierde
+            obj.save(update_fields=ProductoForm._meta.fields)
+        else:
+            super().save_model(request, obj, form, change)
+        ajuste = form.cleaned_data.get("ajuste_stock")
+        if ajuste:
+            try:
+                ajustar_stock(obj.pk, ajuste, descripcion=f"Ajuste de {request.user.get_username()}")
+            except StockInsuficiente as e:
+                self.message_user(request, str(e), messages.ERROR)
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    # Solo lectura: los movimientos los registran gimnasio.inventario y las ventas
+    list_display = ("fecha", "producto", "cantidad", "motivo", "venta", "descripcion")
+    list_filter = ("motivo", "fecha")
+    search_fields = ("producto__nombre",)
+    list_select_related = ("producto",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Caja)
@@ -56,9 +179,51 @@ class CajaAdmin(admin.ModelAdmin):
     list_filter = ("metodo_pago", "fecha")
     inlines = [VentaItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # La venta cambió: el ticket guardado ya no corresponde y se regenera al pedirlo
+        Caja.objects.filter(pk=form.instance.pk).update(ticket='')
+
 
 @admin.register(CajaMovimiento)
 class CajaMovimientoAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'tipo', 'descripcion', 'metodo_pago', 'monto', 'venta', 'socio')
     list_filter = ('tipo', 'metodo_pago', 'fecha')
-    search_fields = ('descripcion',)
\ No newline at end of file
+    search_fields = ('descripcion',)
+
+    # Los cambios hechos desde el admin también se reflejan en CierreCaja
+    def save_model(self, request, obj, form, change):
+        if change:
+            acumular([CajaMovimiento.objects.get(pk=obj.pk)], signo=-1)
+        super().save_model(request, obj, form, change)
+        acumular([obj])
+
+    def delete_model(self, request, obj):
+        acumular([obj], signo=-1)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        acumular(list(queryset), signo=-1)
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(CierreCaja)
+class CierreCajaAdmin(admin.ModelAdmin):
+    # Solo lectura: los totales los mantienen gimnasio.cierres y close_day
+    list_display = ('fecha', 'metodo_pago', 'tipo', 'total', 'movimientos', 'cerrado')
+    list_filter = ('cerrado', 'metodo_pago', 'tipo')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Secuencia)
+class SecuenciaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'ultimo_valor')
@@ -0,0 +1,118 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Clase, Entrenador
+
+
+# Tope de duración: acota la búsqueda hacia atrás para que use el índice (entrenador, fecha_hora)
+DURACION_MAXIMA_MINUTOS = 480
+
+
+class ConflictoHorario(ValueError):
+    def __init__(self, mensaje, clases):
+        super().__init__(mensaje)
+        self.clases = clases
+
+
+def leer_fecha_hora(valor):
+    """Acepta datetime o texto ISO (p. ej. de un input datetime-local) y lo devuelve aware."""
+    if isinstance(valor, str):
+        valor = parse_datetime(valor)
+        if valor is None:
+            raise ValueError("Fecha y hora inválidas. Usa YYYY-MM-DDTHH:MM.")
+    if timezone.is_naive(valor):
+        valor = timezone.make_aware(valor)
+    return valor
+
+
+def validar_duracion(duracion_minutos):
+    duracion_minutos = int(duracion_minutos)
+    if not 1 <= duracion_minutos <= DURACION_MAXIMA_MINUTOS:
+        raise ValueError(f"La duración debe estar entre 1 y {DURACION_MAXIMA_MINUTOS} minutos.")
+    return duracion_minutos
+
+
+def _candidatas(inicio, duracion_minutos):
+    """Clases que podrían cruzarse con el intervalo: rango acotado sobre fecha_hora."""
+    fin = inicio + timedelta(minutes=duracion_minutos)
+    return Clase.objects.filter(
+        fecha_hora__lt=fin,
+        fecha_hora__gt=inicio - timedelta(minutes=DURACION_MAXIMA_MINUTOS),
+    )
+
+
+def _se_cruzan(clase, inicio, duracion_minutos):
+    fin = inicio + timedelta(minutes=duracion_minutos)
+    return clase.fecha_hora < fin and clase.fecha_hora + timedelta(minutes=clase.duracion_minutos) > inicio
+
+
+def clases_superpuestas(entrenador_id, inicio, duracion_minutos, excluir_pk=None):
+    candidatas = _candidatas(inicio, duracion_minutos).filter(entrenador_id=entrenador_id)
+    if excluir_pk:
+        candidatas = candidatas.exclude(pk=excluir_pk)
+    candidatas = candidatas.only('id', 'id_clase', 'nombre', 'fecha_hora', 'duracion_minutos')
+    return [clase for clase in candidatas if _se_cruzan(clase, inicio, duracion_minutos)]
+
+
+def bloquear_entrenador(entrenador_id):
+    """
+    Bloquea la fila del entrenador hasta el fin de la transacción. Quien
+    valida y guarda una clase suya espera a que termine la anterior, así dos
+    altas simultáneas no lo dejan con clases superpuestas.
+    """
+    return Entrenador.objects.select_for_update().get(pk=entrenador_id)
+
+
+def validar_disponibilidad(entrenador_id, inicio, duracion_minutos, excluir_pk=None):
+    """
+    Lanza ConflictoHorario si el entrenador ya tiene una clase que se cruza.
+    Debe llamarse dentro de la transacción que guarda la clase.
+    """
+    bloquear_entrenador(entrenador_id)
+    conflictos = clases_superpuestas(entrenador_id, inicio, duracion_minutos, excluir_pk)
+    if conflictos:
+        detalle = ', '.join(
+            f"{c.nombre} ({timezone.localtime(c.fecha_hora):%d/%m/%Y %H:%M})" for c in conflictos
+        )
+        raise ConflictoHorario(f"El entrenador ya tiene clase en ese horario: {detalle}.", conflictos)
+
+
+def conflictos_en_lote(entrenador_id, inicios, duracion_minutos, excluir=None):
+    """
+    Igual que clases_superpuestas pero para muchas fechas (series): una sola
+    consulta por rango y búsqueda binaria en memoria. Devuelve [(inicio, clase)].
+    """
+    if not inicios:
+        return []
+    ventana = timedelta(minutes=DURACION_MAXIMA_MINUTOS)
+    existentes = Clase.objects.filter(
+        entrenador_id=entrenador_id,
+        fecha_hora__lt=max(inicios) + timedelta(minutes=duracion_minutos),
+        fecha_hora__gt=min(inicios) - ventana,
+    )
+    if excluir is not None:
+        existentes = existentes.exclude(pk__in=excluir)
+    existentes = list(existentes.only('id', 'id_clase', 'nombre', 'fecha_hora', 'duracion_minutos').order_by('fecha_hora'))
+    fechas = [clase.fecha_hora for clase in existentes]
+
+    conflictos = []
+    for inicio in inicios:
+        desde = bisect_right(fechas, inicio - ventana)
+        hasta = bisect_left(fechas, inicio + timedelta(minutes=duracion_minutos))
+        conflictos.extend(
+            (inicio, clase) for clase in existentes[desde:hasta] if _se_cruzan(clase, inicio, duracion_minutos)
+        )
+    return conflictos
+
+
+def entrenadores_libres(inicio, duracion_minutos):
+    """Entrenadores sin clases que se crucen con el intervalo (dos consultas)."""
+    ocupados = {
+        clase.entrenador_id
+        for clase in _candidatas(inicio, duracion_minutos).only('entrenador', 'fecha_hora', 'duracion_minutos')
+        if _se_cruzan(clase, inicio, duracion_minutos)
+    }
+    return Entrenador.objects.exclude(pk__in=ocupados)
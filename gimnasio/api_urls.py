@@ -4,14 +4,24 @@ from rest_framework import routers
 from .api_views import (
     EntrenadorViewSet,
     ClaseViewSet,
+    ClaseSerieViewSet,
     SocioViewSet,
     SuscripcionViewSet,
     RegistrarVentaAPIView,
+    SincronizarVentasAPIView,
+    ProductosPorReponerAPIView,
+    ReporteIngresosAPIView,
+    ExportarAPIView,
+    ImprimirLoteAPIView,
+    HorarioAPIView,
+    HorarioSocioICSView,
+    HorarioEntrenadorICSView,
 )
 
 router = routers.DefaultRouter()
 router.register(r'entrenadores', EntrenadorViewSet)
 router.register(r'clases', ClaseViewSet)
+router.register(r'series', ClaseSerieViewSet)
 router.register(r'socios', SocioViewSet)
 router.register(r'suscripciones', SuscripcionViewSet)
 registrar_venta_api = RegistrarVentaAPIView.as_view()
@@ -19,4 +29,12 @@ registrar_venta_api = RegistrarVentaAPIView.as_view()
 urlpatterns = [
     path('', include(router.urls)),
     path('registrar_venta/', registrar_venta_api, name='registrar_venta_api'),
+    path('ventas/sincronizar/', SincronizarVentasAPIView.as_view(), name='sincronizar_ventas_api'),
+    path('inventario/por_reponer/', ProductosPorReponerAPIView.as_view(), name='productos_por_reponer_api'),
+    path('reportes/ingresos/', ReporteIngresosAPIView.as_view(), name='reporte_ingresos_api'),
+    path('exportar/<str:recurso>/', ExportarAPIView.as_view(), name='exportar_api'),
+    path('tickets/lote/', ImprimirLoteAPIView.as_view(), name='imprimir_lote_api'),
+    path('horario/', HorarioAPIView.as_view(), name='horario_api'),
+    path('horario/socio/<int:pk>.ics', HorarioSocioICSView.as_view(), name='horario_socio_ics'),
+    path('horario/entrenador/<int:pk>.ics', HorarioEntrenadorICSView.as_view(), name='horario_entrenador_ics'),
 ]
\ No newline at end of file
@@ -1,54 +1,151 @@
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
 import json
-from decimal import Decimal, InvalidOperation
+from datetime import datetime, time, timedelta
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from .models import Producto, Caja, VentaItem, CajaMovimiento
+from django.db.models import Count, Prefetch
+from django.conf import settings
+from .busqueda import buscar_socios
+from .calendario import generar_ics, huella
+from .agenda import entrenadores_libres, leer_fecha_hora, validar_duracion
+from .series import eliminar_serie
+from .inscripciones import estado_espera, inscribir_en_lote
+from .reportes import ReporteError, ingresos
+from .exportaciones import EXPORTACIONES, FORMATOS, lineas
+from .impresion import archivos_estados, archivos_tickets, zip_en_streaming
+from .inventario import StockInsuficiente, por_reponer
+from .ventas import (
+    PERMISO_CAMBIAR_PRECIO, SincronizacionConcurrente, VentaError, registrar_venta, sincronizar_ventas,
+)
+from .security import sanitize_search_query
 
-from .models import Entrenador, Clase, Socio, Suscripcion # Cambiado: Import Socio en lugar de PerfilMiembro
+from .models import Entrenador, Clase, ClaseSerie, InscripcionClase, Socio, Suscripcion # Cambiado: Import Socio en lugar de PerfilMiembro
 from .serializers import (  # Asume que tienes serializers actualizados
     EntrenadorSerializer,
     ClaseSerializer,
+    ClaseSerieSerializer,
+    InscripcionLoteSerializer,
     SocioSerializer,
+    SocioCompactoSerializer,
     SuscripcionSerializer,
 )
 
+TYPEAHEAD_LIMITE = 10
+
+
 class BaseGymViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
 
 class EntrenadorViewSet(BaseGymViewSet):
-    queryset = Entrenador.objects.all()
+    queryset = Entrenador.objects.all().order_by('nombre', 'id')
     serializer_class = EntrenadorSerializer
 
+    @action(detail=False, methods=['get'])
+    def libres(self, request):
+        """Entrenadores sin clase en el horario: /api/entrenadores/libres/?inicio=2025-01-07T08:00&duracion=60"""
+        try:
+            inicio = leer_fecha_hora(request.query_params.get('inicio', ''))
+            duracion = validar_duracion(request.query_params.get('duracion', 60))
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e) or 'Parámetros inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(entrenadores_libres(inicio, duracion).order_by('nombre', 'id'))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
 
 class ClaseViewSet(BaseGymViewSet):
-    queryset = Clase.objects.select_related('entrenador').prefetch_related('participantes')
+    queryset = Clase.objects.select_related('entrenador').order_by('id')
     serializer_class = ClaseSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if 'participantes' in self.request.query_params.get('include', '').split(','):
+            queryset = queryset.prefetch_related(
+                Prefetch('participantes', queryset=Socio.objects.only('id'))
+            )
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def participantes(self, request, pk=None):
+        """Participantes de la clase, paginados y con campos compactos."""
+        clase = self.get_object()
+        socios = Socio.objects.filter(clases_inscritas=clase).order_by('apellido', 'nombre', 'id').only(
+            *SocioCompactoSerializer.Meta.fields
+        )
+        page = self.paginate_queryset(socios)
+        serializer = SocioCompactoSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'], url_path='inscripciones/bulk', url_name='inscripciones-bulk',
+            permission_classes=[IsAuthenticated])
+    def inscripciones_bulk(self, request, pk=None):
+        """Inscribe una lista de id_socio en una transacción y devuelve el resultado de cada uno."""
+        if not request.user.has_perm('gimnasio.add_inscripcionclase'):
+            return Response({'error': 'No tienes permiso para inscribir socios.'}, status=status.HTTP_403_FORBIDDEN)
+        clase = self.get_object()
+        entrada = InscripcionLoteSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        resultados = inscribir_en_lote(
+            clase,
+            entrada.validated_data['socios'],
+            metodo_pago=entrada.validated_data['metodo_pago'],
+            lista_espera=entrada.validated_data['lista_espera'],
+        )
+        inscritos = sum(1 for resultado in resultados if resultado['estado'] == 'inscrito')
+        return Response({'inscritos': inscritos, 'resultados': resultados})
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def espera(self, request, pk=None):
+        """Estado de lugar/lista de espera para consultar seguido: /api/clases/{id}/espera/?socio={pk}"""
+        socio_pk = request.query_params.get('socio')
+        if not str(pk).isdigit() or (socio_pk is not None and not socio_pk.isdigit()):
+            return Response({'error': 'Parámetros inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+        socios = Socio.objects.only('pk', 'user_id')
+        socio = get_object_or_404(socios, pk=socio_pk) if socio_pk else get_object_or_404(socios, user=request.user)
+        if not request.user.is_staff and socio.user_id != request.user.pk:
+            return Response({'error': 'No tienes acceso a este socio.'}, status=status.HTTP_403_FORBIDDEN)
+        estado = estado_espera(pk, socio)
+        if estado is None:
+            return Response({'error': 'Clase no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(estado)
+
+
+class ClaseSerieViewSet(BaseGymViewSet):
+    queryset = ClaseSerie.objects.select_related('entrenador').annotate(total_clases=Count('clases')).order_by('id')
+    serializer_class = ClaseSerieSerializer
+
+    def perform_destroy(self, instance):
+        eliminar_serie(instance)
+
 
 class SocioViewSet(BaseGymViewSet):  
     queryset = Socio.objects.all()  
     serializer_class = SocioSerializer
 
+    @action(detail=False, methods=['get'], url_path='search', permission_classes=[IsAuthenticated])
+    def search(self, request):
+        """Autocompletado de socios: /api/socios/search/?q=ana"""
+        query = sanitize_search_query(request.query_params.get('q', ''))
+        if not query:
+            return Response({'results': []})
+        resultados = buscar_socios(Socio.objects.all(), query).order_by('apellido', 'nombre', 'id').values(
+            'pk', 'id_socio', 'nombre', 'apellido', 'tipo_socio', 'estado'
+        )[:TYPEAHEAD_LIMITE]
+        return Response({'results': list(resultados)})
+
 
 class SuscripcionViewSet(BaseGymViewSet):
     queryset = Suscripcion.objects.select_related('socio').order_by('id')
     serializer_class = SuscripcionSerializer
 
-# Importa las clases necesarias
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from django.db import transaction
-# Importa tus modelos y utilidades...
-import json
-from decimal import Decimal, InvalidOperation
-from django.shortcuts import get_object_or_404
-# from .models import Producto, Caja, VentaItem, CajaMovimiento, etc.
 
 class RegistrarVentaAPIView(APIView):
 
@@ -57,65 +154,264 @@ class RegistrarVentaAPIView(APIView):
             data = request.data
         except (json.JSONDecodeError, AttributeError):
                 return Response({'error': 'Cuerpo de petición JSON inválido.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        metodo = data.get("metodo_pago", "efectivo")
-        cliente = data.get("cliente", "")
-        obs = data.get("observacion", "")
-        items_data = data.get("items", [])
-        
-        items = []
-        total = Decimal("0.00")
 
         try:
-            with transaction.atomic():
-                # 2. Validar y calcular el total
-                for item_data in items_data:
-                    pid = item_data.get("producto_id")
-                    cant = int(item_data.get("cantidad", 0))
-                    punit = Decimal(item_data.get("precio_unitario", "0"))
-
-                    if not pid or cant <= 0 or punit < 0:
-                        continue
-                    
-                    producto = get_object_or_404(Producto, pk=pid)
-                    subtotal = punit * cant
-                    total += subtotal
-                    items.append((producto, cant, punit, subtotal))
-
-                if not items:
-                    return Response({"error": "Agrega al menos un producto válido."}, status=status.HTTP_400_BAD_REQUEST)
-
-                # CREAR LA VENTA (Caja) - MANTENER IGUAL
-                venta = Caja.objects.create(
-                    total=total, 
-                    metodo_pago=metodo, 
-                    cliente=cliente, 
-                    observacion=obs
-                )
-
-                # CREAR LOS ITEMS de VENTA (VentaItem) - MANTENER IGUAL
-                for producto, cant, punit, subtotal in items:
-                    VentaItem.objects.create(
-                        venta=venta, 
-                        producto=producto, 
-                        cantidad=cant, 
-                        precio_unitario=punit, 
-                        subtotal=subtotal
-                    )
-
-                # REGISTRAR MOVIMIENTO en CajaMovimiento - MANTENER IGUAL
-                CajaMovimiento.objects.create(
-                    tipo='producto',
-                    descripcion=f'Venta #{venta.id} - {len(items)} item(s)',
-                    metodo_pago=metodo,
-                    monto=total,
-                    venta=venta,
-                )
-
-            # Responder con el ID de la venta
-            return Response({'success': True, 'venta_id': venta.id}, status=status.HTTP_201_CREATED)
-
-        except (InvalidOperation, ValueError) as e:
-            return Response({'error': f'Datos de entrada inválidos: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+            venta = registrar_venta(
+                data.get("items", []),
+                metodo_pago=data.get("metodo_pago", "efectivo"),
+                cliente=data.get("cliente", ""),
+                observacion=data.get("observacion", ""),
+                permite_precio=request.user.has_perm(PERMISO_CAMBIAR_PRECIO),
+                clave=str(data.get("clave") or "").strip()[:64] or None,
+            )
+        except (SincronizacionConcurrente, StockInsuficiente) as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except VentaError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            return Response({'error': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': f'Error interno del servidor: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Responder con el ID de la venta
+        return Response({'success': True, 'venta_id': venta.id, 'total': venta.total}, status=status.HTTP_201_CREATED)
+
+
+class SincronizarVentasAPIView(APIView):
+    """
+    Recibe en una sola petición las ventas encoladas por el punto de venta sin
+    conexión: {"ventas": [{"clave": "...", "fecha": "ISO 8601", "items": [...], "metodo_pago": ...}, ...]}.
+    Reenviar el mismo lote es seguro: las claves ya registradas vuelven como 'duplicada'.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        ventas = request.data.get('ventas') if isinstance(request.data, dict) else None
+        if not isinstance(ventas, list) or not all(isinstance(venta, dict) for venta in ventas):
+            return Response({'error': 'Se espera una lista "ventas".'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resultados = sincronizar_ventas(ventas, permite_precio=request.user.has_perm(PERMISO_CAMBIAR_PRECIO))
+        except SincronizacionConcurrente as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except VentaError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        creadas = sum(1 for resultado in resultados if resultado['estado'] == 'creada')
+        return Response(
+            {'creadas': creadas, 'resultados': resultados},
+            status=status.HTTP_201_CREATED if creadas else status.HTTP_200_OK,
+        )
+
+class ProductosPorReponerAPIView(APIView):
+    """Productos con inventario en o por debajo de su stock mínimo, los más urgentes primero."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.has_perm('gimnasio.view_producto'):
+            return Response({'error': 'No tienes permiso para ver el inventario.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(list(por_reponer().values('id', 'nombre', 'stock', 'stock_minimo')))
+
+
+class ReporteIngresosAPIView(APIView):
+    """
+    Ingresos por periodo: /api/reportes/ingresos/?desde=2025-01-01&hasta=2025-03-31&bucket=month&group_by=metodo_pago
+    Sin fechas devuelve el mes en curso por día y por tipo.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.has_perm('gimnasio.view_cajamovimiento'):
+            return Response({'error': 'No tienes permiso para ver los ingresos.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            desde = _leer_fecha(request.query_params.get('desde'))
+            hasta = _leer_fecha(request.query_params.get('hasta'))
+        except ValueError:
+            return Response({'error': 'Las fechas deben tener formato YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        hoy = timezone.localdate()
+        try:
+            reporte = ingresos(
+                desde or hoy.replace(day=1),
+                hasta or hoy,
+                bucket=request.query_params.get('bucket', 'day'),
+                agrupar=request.query_params.get('group_by', 'tipo'),
+            )
+        except ReporteError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(reporte)
+
+
+class ExportarAPIView(APIView):
+    """
+    Descarga completa de una tabla sin paginar: /api/exportar/movimientos/?formato=csv&desde=2025-01-01&hasta=2025-12-31
+    La respuesta se genera por lotes mientras se envía.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, recurso, *args, **kwargs):
+        if recurso not in EXPORTACIONES:
+            return Response({'error': f"Recurso desconocido. Opciones: {', '.join(EXPORTACIONES)}."}, status=status.HTTP_404_NOT_FOUND)
+        modelo = EXPORTACIONES[recurso][0]
+        if not request.user.has_perm(f'gimnasio.view_{modelo._meta.model_name}'):
+            return Response({'error': 'No tienes permiso para exportar estos datos.'}, status=status.HTTP_403_FORBIDDEN)
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({'error': 'formato debe ser "csv" o "jsonl".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            desde = _leer_fecha(request.query_params.get('desde'))
+            hasta = _leer_fecha(request.query_params.get('hasta'))
+        except ValueError:
+            return Response({'error': 'Las fechas deben tener formato YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(lineas(recurso, formato, desde, hasta), content_type=FORMATOS[formato])
+        response['Content-Disposition'] = f'attachment; filename={recurso}.{formato}'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+IMPRESION_MAX_DIAS = 92
+IMPRESIONES = {'tickets': archivos_tickets, 'estados': archivos_estados}
+
+
+class ImprimirLoteAPIView(APIView):
+    """
+    ZIP con los tickets de venta o los estados de cuenta mensuales de un rango:
+    /api/tickets/lote/?desde=2025-01-01&hasta=2025-01-31&tipo=estados
+    Los PDF se renderizan en IMPRESION_WORKERS procesos y el ZIP se envía a medida que se arma.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.has_perm('gimnasio.view_cajamovimiento'):
+            return Response({'error': 'No tienes permiso para imprimir tickets.'}, status=status.HTTP_403_FORBIDDEN)
+        tipo = request.query_params.get('tipo', 'tickets')
+        if tipo not in IMPRESIONES:
+            return Response({'error': 'tipo debe ser "tickets" o "estados".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            desde = _leer_fecha(request.query_params.get('desde'))
+            hasta = _leer_fecha(request.query_params.get('hasta'))
+        except ValueError:
+            return Response({'error': 'Las fechas deben tener formato YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not desde or not hasta:
+            return Response({'error': 'Indica desde y hasta.'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta < desde or (hasta - desde).days >= IMPRESION_MAX_DIAS:
+            return Response(
+                {'error': f'El rango debe ser de 1 a {IMPRESION_MAX_DIAS} días.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        archivos = IMPRESIONES[tipo](desde, hasta, settings.IMPRESION_WORKERS)
+        response = StreamingHttpResponse(zip_en_streaming(archivos), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename={tipo}_{desde:%Y%m%d}_{hasta:%Y%m%d}.zip'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+HORARIO_MAX_DIAS = 92
+HORARIO_CAMPOS = (
+    'id', 'id_clase', 'nombre', 'fecha_hora', 'duracion_minutos',
+    'entrenador_id', 'entrenador__nombre', 'ocupados', 'max_participantes',
+)
+ICS_CAMPOS = ('id', 'nombre', 'descripcion', 'fecha_hora', 'duracion_minutos', 'entrenador__nombre', 'actualizado')
+ICS_DIAS_PASADOS = 30
+
+
+def _leer_fecha(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+class HorarioAPIView(APIView):
+    """
+    Horario compacto por día: /api/horario/?desde=2025-01-06&hasta=2025-01-12&entrenador=3
+    Sin fechas devuelve la semana actual (o el mes actual con ?vista=mes).
+    """
+
+    def get(self, request, *args, **kwargs):
+        vista = request.query_params.get('vista', 'semana')
+        if vista not in ('semana', 'mes'):
+            return Response({'error': 'vista debe ser "semana" o "mes".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            desde = _leer_fecha(request.query_params.get('desde'))
+            hasta = _leer_fecha(request.query_params.get('hasta'))
+        except ValueError:
+            return Response({'error': 'Las fechas deben tener formato YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        hoy = timezone.localdate()
+        if desde is None:
+            desde = hoy - timedelta(days=hoy.weekday()) if vista == 'semana' else hoy.replace(day=1)
+        if hasta is None:
+            if vista == 'semana':
+                hasta = desde + timedelta(days=6)
+            else:
+                hasta = (desde.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        if hasta < desde or (hasta - desde).days >= HORARIO_MAX_DIAS:
+            return Response(
+                {'error': f'El rango debe ser válido y de máximo {HORARIO_MAX_DIAS} días.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        clases = Clase.objects.filter(
+            fecha_hora__gte=_inicio_del_dia(desde),
+            fecha_hora__lt=_inicio_del_dia(hasta + timedelta(days=1)),
+        )
+        entrenador = request.query_params.get('entrenador')
+        if entrenador:
+            if not entrenador.isdigit():
+                return Response({'error': 'entrenador debe ser un ID numérico.'}, status=status.HTTP_400_BAD_REQUEST)
+            clases = clases.filter(entrenador_id=entrenador)
+
+        dias = {desde + timedelta(days=n): [] for n in range((hasta - desde).days + 1)}
+        for clase in clases.order_by('fecha_hora', 'id').values(*HORARIO_CAMPOS):
+            inicio = timezone.localtime(clase.pop('fecha_hora'))
+            clase['hora'] = inicio.strftime('%H:%M')
+            clase['entrenador'] = clase.pop('entrenador__nombre')
+            dias[inicio.date()].append(clase)
+
+        return Response({
+            'vista': vista,
+            'desde': desde,
+            'hasta': hasta,
+            'dias': [{'fecha': dia, 'clases': lista} for dia, lista in dias.items()],
+        })
+
+
+class HorarioICSBaseView(APIView):
+    # Basic primero para que los clientes de calendario reciban el reto 401
+    authentication_classes = (BasicAuthentication, SessionAuthentication)
+    permission_classes = (IsAuthenticated,)
+
+    def responder_ics(self, request, clases, nombre, archivo, inscripciones=None):
+        clases = clases.filter(fecha_hora__gte=timezone.now() - timedelta(days=ICS_DIAS_PASADOS))
+        etag = f'"{huella(clases, inscripciones)}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            contenido = generar_ics(clases.order_by('fecha_hora', 'id').values(*ICS_CAMPOS), nombre)
+            response = HttpResponse(contenido, content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = f'inline; filename={archivo}'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class HorarioSocioICSView(HorarioICSBaseView):
+    """Clases en las que está inscrito el socio (solo el propio socio o el staff)."""
+
+    def get(self, request, pk, *args, **kwargs):
+        socio = get_object_or_404(Socio, pk=pk)
+        if not request.user.is_staff and socio.user_id != request.user.pk:
+            return Response({'error': 'No tienes acceso a este calendario.'}, status=status.HTTP_403_FORBIDDEN)
+        clases = Clase.objects.filter(participantes=socio)
+        return self.responder_ics(
+            request, clases, f'Clases de {socio.nombre}', f'clases_{socio.id_socio}.ics',
+            inscripciones=InscripcionClase.objects.filter(socio=socio),
+        )
+
+
+class HorarioEntrenadorICSView(HorarioICSBaseView):
+    def get(self, request, pk, *args, **kwargs):
+        entrenador = get_object_or_404(Entrenador, pk=pk)
+        clases = Clase.objects.filter(entrenador=entrenador)
+        return self.responder_ics(request, clases, f'Clases de {entrenador.nombre}', f'entrenador_{entrenador.id_entrenador}.ics')
@@ -0,0 +1,67 @@
+import html
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+
+MAX_TERMINO = 50
+MAX_PALABRAS_CONSULTA = 5
+
+
+def normalizar_busqueda(texto):
+    """Minúsculas, sin acentos ni entidades HTML y con un solo espacio entre palabras."""
+    texto = html.unescape(texto or '')
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'\w+', texto))
+
+
+def terminos_busqueda(texto):
+    return sorted({palabra[:MAX_TERMINO] for palabra in normalizar_busqueda(texto).split()})
+
+
+def usa_trigramas():
+    # La migración 0012 crea el índice GIN con pg_trgm solo en PostgreSQL
+    return connection.vendor == 'postgresql'
+
+
+def buscar_socios(queryset, query):
+    """
+    Filtra `queryset` por una consulta ya pasada por sanitize_search_query.
+    Cada palabra debe ser prefijo de alguna palabra del socio ("mar" encuentra
+    a Marcos, "arc" no) en todas las bases: en PostgreSQL con LIKE sobre
+    `busqueda` (índice de trigramas), en el resto con SocioTermino (B-tree).
+    """
+    from .models import SocioTermino
+
+    palabras = normalizar_busqueda(query).split()[:MAX_PALABRAS_CONSULTA]
+    for palabra in palabras:
+        palabra = palabra[:MAX_TERMINO]
+        if usa_trigramas():
+            # `busqueda` separa las palabras con un solo espacio
+            queryset = queryset.filter(Q(busqueda__startswith=palabra) | Q(busqueda__contains=f' {palabra}'))
+        else:
+            coincidencias = SocioTermino.objects.filter(termino__startswith=palabra)
+            queryset = queryset.filter(pk__in=coincidencias.values('socio_id'))
+    return queryset
+
+
+def reindexar_socios(socios):
+    """
+    Recalcula `busqueda` y los términos de socios que no pasaron por
+    Socio.save (p. ej. creados con bulk_create). Tres consultas por lote.
+    """
+    from .models import Socio, SocioTermino
+
+    socios = list(socios)
+    terminos = []
+    for socio in socios:
+        texto = socio.texto_busqueda()
+        socio.busqueda = normalizar_busqueda(texto)[:320]
+        terminos.extend(SocioTermino(socio_id=socio.pk, termino=t) for t in terminos_busqueda(texto))
+
+    Socio.objects.bulk_update(socios, ['busqueda'])
+    SocioTermino.objects.filter(socio__in=socios).delete()
+    SocioTermino.objects.bulk_create(terminos)
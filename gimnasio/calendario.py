@@ -0,0 +1,81 @@
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+
+PRODID = '-//ReCo Gym//Horario de clases//ES'
+
+
+def _escapar(texto):
+    return (
+        str(texto).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _plegar(linea):
+    """Corta las líneas a 75 octetos como pide RFC 5545."""
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea
+    partes, actual = [], ''
+    for caracter in linea:
+        limite = 75 if not partes else 74
+        if len((actual + caracter).encode('utf-8')) > limite:
+            partes.append(actual)
+            actual = caracter
+        else:
+            actual += caracter
+    partes.append(actual)
+    return '\r\n '.join(partes)
+
+
+def _fecha_utc(valor):
+    return valor.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def generar_ics(clases, nombre_calendario):
+    """Genera un VCALENDAR con un VEVENT por clase (dicts de Clase.values())."""
+    ahora = _fecha_utc(timezone.now())
+    lineas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escapar(nombre_calendario)}',
+    ]
+    for clase in clases:
+        inicio = clase['fecha_hora']
+        fin = inicio + timedelta(minutes=clase['duracion_minutos'])
+        lineas += [
+            'BEGIN:VEVENT',
+            f"UID:clase-{clase['id']}@reco-gym",
+            f'DTSTAMP:{ahora}',
+            f"LAST-MODIFIED:{_fecha_utc(clase['actualizado'])}",
+            f'DTSTART:{_fecha_utc(inicio)}',
+            f'DTEND:{_fecha_utc(fin)}',
+            f"SUMMARY:{_escapar(clase['nombre'])}",
+            f"DESCRIPTION:{_escapar(clase['descripcion'] or '')}",
+            f"X-ENTRENADOR:{_escapar(clase['entrenador__nombre'])}",
+            'END:VEVENT',
+        ]
+    lineas.append('END:VCALENDAR')
+    return '\r\n'.join(_plegar(linea) for linea in lineas) + '\r\n'
+
+
+def huella(clases, inscripciones=None):
+    """
+    ETag de un queryset de clases con una consulta de agregación, para
+    responder 304 sin generar el calendario. Inscribirse o cancelar no cambia
+    `actualizado` de la clase: para el calendario de un socio se pasan sus
+    `inscripciones` y la más reciente entra en la huella. No hay un
+    Last-Modified confiable (una baja no deja fecha), por eso solo ETag.
+    """
+    datos = clases.aggregate(total=Count('id'), ultima=Max('actualizado'), ids=Sum('id'))
+    partes = [datos['total'], datos['ids'], datos['ultima'].isoformat() if datos['ultima'] else '']
+    if inscripciones is not None:
+        ultima_inscripcion = inscripciones.aggregate(ultima=Max('fecha_inscripcion'))['ultima']
+        partes.append(ultima_inscripcion.isoformat() if ultima_inscripcion else '')
+    return hashlib.sha1(':'.join(map(str, partes)).encode()).hexdigest()
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+# Fila de Secuencia que hace de versión del catálogo de productos
+VERSION_CATALOGO = 'catalogo_productos'
+
+
+class _Foto:
+    def __init__(self, version, productos):
+        self.version = version
+        self.ordenados = tuple(productos)
+        self.por_pk = {producto.pk: producto for producto in productos}
+        self.revisado = time.monotonic()
+
+
+_foto = None
+_candado = threading.Lock()
+
+
+def olvidar_catalogo():
+    """Descarta la foto de este proceso; la próxima lectura consulta la versión."""
+    global _foto
+    _foto = None
+
+
+def invalidar_catalogo():
+    """
+    Sube la versión en la misma transacción que el cambio de productos, así
+    ningún proceso ve la versión nueva con los datos viejos. Los demás procesos
+    lo notan en su próxima revisión (CATALOGO_REVISION_SEGUNDOS).
+    """
+    from .models import Secuencia
+
+    with transaction.atomic():
+        version = Secuencia.objects.filter(nombre=VERSION_CATALOGO)
+        if not version.update(ultimo_valor=F('ultimo_valor') + 1):
+            try:
+                with transaction.atomic():
+                    Secuencia.objects.create(nombre=VERSION_CATALOGO, ultimo_valor=1)
+            except IntegrityError:
+                # Otro proceso creó la fila entre el UPDATE y el INSERT
+                version.update(ultimo_valor=F('ultimo_valor') + 1)
+    olvidar_catalogo()
+    transaction.on_commit(olvidar_catalogo)
+
+
+def _version():
+    from .models import Secuencia
+
+    return Secuencia.objects.filter(nombre=VERSION_CATALOGO).values_list('ultimo_valor', flat=True).first() or 0
+
+
+def _actual():
+    """
+    Foto del catálogo de este proceso. Se revisa la versión como mucho cada
+    CATALOGO_REVISION_SEGUNDOS y solo se releen los productos si cambió.
+    """
+    from .models import Producto
+
+    global _foto
+    foto = _foto
+    if foto is not None and time.monotonic() - foto.revisado < settings.CATALOGO_REVISION_SEGUNDOS:
+        return foto
+    with _candado:
+        if _foto is not None and _foto is not foto:
+            return _foto
+        # La versión se lee antes que los productos: en el peor caso la foto
+        # queda con datos más nuevos que su versión y se recarga en la próxima revisión
+        version = _version()
+        if foto is not None and foto.version == version:
+            foto.revisado = time.monotonic()
+            _foto = foto
+            return foto
+        _foto = _Foto(version, Producto.objects.order_by('nombre', 'pk'))
+        return _foto
+
+
+def productos_ordenados():
+    """Todos los productos por nombre, para la pantalla de venta."""
+    return _actual().ordenados
+
+
+def productos_con_stock():
+    """
+    [(producto, stock)] por nombre para la pantalla de venta. El stock es lo
+    único que cambia con cada venta sin subir la versión, así que se lee al
+    momento y solo de los productos con inventario; stock None = sin inventario.
+    """
+    ordenados = productos_ordenados()
+    con_inventario = [producto.pk for producto in ordenados if producto.stock is not None]
+    stock = {}
+    if con_inventario:
+        from .models import Producto
+
+        stock = dict(Producto.objects.filter(pk__in=con_inventario).values_list('pk', 'stock'))
+    return [(producto, stock.get(producto.pk)) for producto in ordenados]
+
+
+def productos(pks):
+    """
+    {pk: Producto} de los `pks` pedidos, como in_bulk. Los que no están en la
+    foto (creados por otro proceso hace instantes) se buscan en la base de datos.
+    El stock de la foto puede estar desactualizado: solo sirve para saber si el
+    producto lleva inventario.
+    """
+    por_pk = _actual().por_pk
+    encontrados = {pk: por_pk[pk] for pk in pks if pk in por_pk}
+    faltantes = set(pks) - set(encontrados)
+    if faltantes:
+        from .models import Producto
+
+        olvidar_catalogo()
+        encontrados.update(Producto.objects.in_bulk(faltantes))
+    return encontrados
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import CajaMovimiento, CierreCaja, Secuencia
+
+
+# Fila de Secuencia que sube cada vez que close_day sella un día (clave de la caché de reportes)
+VERSION_CIERRES = 'cierres_caja'
+
+
+def inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _agrupar(movimientos, signo):
+    grupos = defaultdict(lambda: [Decimal('0.00'), 0])
+    for movimiento in movimientos:
+        fecha = timezone.localdate(movimiento.fecha or timezone.now())
+        grupo = grupos[(fecha, movimiento.metodo_pago, movimiento.tipo)]
+        grupo[0] += signo * Decimal(movimiento.monto)
+        grupo[1] += signo
+    return grupos
+
+
+def acumular(movimientos, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) los movimientos a los totales del día
+    con un UPDATE condicional por grupo día × método × tipo; la fila se crea
+    la primera vez. Un día ya cerrado vuelve a quedar abierto para que
+    close_day lo recalcule.
+    """
+    with transaction.atomic():
+        for (fecha, metodo_pago, tipo), (total, cantidad) in _agrupar(movimientos, signo).items():
+            fila = CierreCaja.objects.filter(fecha=fecha, metodo_pago=metodo_pago, tipo=tipo)
+            valores = {'total': F('total') + total, 'movimientos': F('movimientos') + cantidad, 'cerrado': False}
+            if fila.update(**valores):
+                continue
+            try:
+                with transaction.atomic():
+                    CierreCaja.objects.create(
+                        fecha=fecha, metodo_pago=metodo_pago, tipo=tipo, total=total, movimientos=max(cantidad, 0),
+                    )
+            except IntegrityError:
+                # Otra transacción creó la fila entre el UPDATE y el INSERT
+                fila.update(**valores)
+
+
+def cerrar_dia(dia):
+    """
+    Recalcula los totales de `dia` desde los movimientos (por rango de fecha,
+    para aprovechar el índice) y los deja cerrados. Devuelve las filas.
+    """
+    desde = inicio_del_dia(dia)
+    movimientos = (
+        CajaMovimiento.objects.filter(fecha__gte=desde, fecha__lt=desde + timedelta(days=1))
+        .values('metodo_pago', 'tipo')
+        .annotate(total=Sum('monto'), cantidad=Count('id'))
+        .order_by()
+    )
+    filas = [
+        CierreCaja(
+            fecha=dia, metodo_pago=fila['metodo_pago'], tipo=fila['tipo'],
+            total=fila['total'], movimientos=fila['cantidad'], cerrado=True,
+        )
+        for fila in movimientos
+    ]
+    with transaction.atomic():
+        CierreCaja.objects.filter(fecha=dia).delete()
+        CierreCaja.objects.bulk_create(filas)
+        _subir_version()
+    return filas
+
+
+def _subir_version():
+    version = Secuencia.objects.filter(nombre=VERSION_CIERRES)
+    if version.update(ultimo_valor=F('ultimo_valor') + 1):
+        return
+    try:
+        with transaction.atomic():
+            Secuencia.objects.create(nombre=VERSION_CIERRES, ultimo_valor=1)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        version.update(ultimo_valor=F('ultimo_valor') + 1)
+
+
+def version_cierres():
+    """Cambia cada vez que se vuelve a cerrar cualquier día, aunque queden las mismas filas."""
+    return Secuencia.objects.filter(nombre=VERSION_CIERRES).values_list('ultimo_valor', flat=True).first() or 0
+
+
+def dias_pendientes(hasta):
+    """Días anteriores a `hasta` con totales sin cerrar."""
+    return list(
+        CierreCaja.objects.filter(fecha__lt=hasta, cerrado=False)
+        .order_by('fecha').values_list('fecha', flat=True).distinct()
+    )
+
+
+def total_del_periodo(desde, hasta, **filtros):
+    """Total cobrado entre `desde` y `hasta` (fechas, ambas inclusive) leyendo solo los cierres."""
+    return (
+        CierreCaja.objects.filter(fecha__gte=desde, fecha__lte=hasta, **filtros)
+        .aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+    )
+
+
+def totales_por_metodo(dia):
+    """{método de pago: total} de un día."""
+    filas = CierreCaja.objects.filter(fecha=dia).values('metodo_pago').annotate(suma=Sum('total')).order_by()
+    return {fila['metodo_pago']: fila['suma'] for fila in filas}
@@ -0,0 +1,106 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .cierres import inicio_del_dia
+from .models import CajaMovimiento, Clase, InscripcionClase, Socio, Suscripcion, VentaItem
+
+
+# Filas por consulta; cada lote se pide con pk > último pk, así la memoria no
+# crece con el tamaño de la tabla (MySQL no tiene cursores del lado del
+# servidor en Django y .iterator() traería el resultado completo).
+LOTE_EXPORTACION = 2000
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# recurso -> (modelo, campo de fecha para desde/hasta, columnas)
+EXPORTACIONES = {
+    'socios': (Socio, 'fecha_registro', (
+        'id', 'id_socio', 'nombre', 'apellido', 'telefono', 'domicilio', 'tipo_socio', 'estado', 'fecha_registro',
+    )),
+    'suscripciones': (Suscripcion, 'fecha_inicio', (
+        'id', 'id_suscripcion', 'socio__id_socio', 'tipo', 'fecha_inicio', 'fecha_fin', 'activa', 'monto_total',
+    )),
+    'clases': (Clase, 'fecha_hora', (
+        'id', 'id_clase', 'nombre', 'fecha_hora', 'duracion_minutos', 'entrenador__id_entrenador',
+        'entrenador__nombre', 'ocupados', 'max_participantes', 'precio', 'serie_id',
+    )),
+    'inscripciones': (InscripcionClase, 'fecha_inscripcion', (
+        'id', 'id_inscripcion', 'socio__id_socio', 'clase__id_clase', 'clase__nombre', 'fecha_inscripcion',
+        'movimiento_caja_id',
+    )),
+    'movimientos': (CajaMovimiento, 'fecha', (
+        'id', 'fecha', 'tipo', 'descripcion', 'metodo_pago', 'monto', 'venta_id', 'socio__id_socio',
+    )),
+    'ventas': (VentaItem, 'venta__fecha', (
+        'id', 'venta_id', 'venta__fecha', 'venta__metodo_pago', 'producto_id', 'producto__nombre',
+        'cantidad', 'precio_unitario', 'subtotal',
+    )),
+}
+
+
+def _campo(modelo, ruta):
+    *relaciones, nombre = ruta.split('__')
+    for relacion in relaciones:
+        modelo = modelo._meta.get_field(relacion).related_model
+    return modelo._meta.get_field(nombre)
+
+
+def filtrar(recurso, desde=None, hasta=None):
+    """Queryset del recurso limitado por fecha (ambos extremos inclusive)."""
+    modelo, campo, _ = EXPORTACIONES[recurso]
+    queryset = modelo.objects.all()
+    # Los DateTimeField se filtran por rango para poder usar su índice
+    por_rango = _campo(modelo, campo).get_internal_type() == 'DateTimeField'
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': inicio_del_dia(desde) if por_rango else desde})
+    if hasta:
+        if por_rango:
+            queryset = queryset.filter(**{f'{campo}__lt': inicio_del_dia(hasta + timedelta(days=1))})
+        else:
+            queryset = queryset.filter(**{f'{campo}__lte': hasta})
+    return queryset
+
+
+def filas(recurso, desde=None, hasta=None, lote=LOTE_EXPORTACION):
+    """Genera tuplas con las columnas del recurso, en orden de pk y por lotes."""
+    _, _, columnas = EXPORTACIONES[recurso]
+    queryset = filtrar(recurso, desde, hasta).order_by('pk').values_list(*columnas)
+    ultimo = 0
+    while True:
+        bloque = list(queryset.filter(pk__gt=ultimo)[:lote])
+        yield from bloque
+        if len(bloque) < lote:
+            return
+        ultimo = bloque[-1][0]
+
+
+class _Eco:
+    """Buffer de una línea para csv.writer: devuelve lo escrito en lugar de guardarlo."""
+    def write(self, valor):
+        return valor
+
+
+def _celda(valor):
+    # Evita que Excel interprete como fórmula un texto cargado por usuarios
+    if isinstance(valor, str) and valor[:1] in ('=', '+', '-', '@'):
+        return "'" + valor
+    return valor
+
+
+def lineas(recurso, formato, desde=None, hasta=None):
+    """Genera el archivo línea por línea (CSV con cabecera o JSONL)."""
+    _, _, columnas = EXPORTACIONES[recurso]
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(columnas)
+        for fila in filas(recurso, desde, hasta):
+            yield escritor.writerow([_celda(valor) for valor in fila])
+    else:
+        for fila in filas(recurso, desde, hasta):
+            yield json.dumps(dict(zip(columnas, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
@@ -0,0 +1,196 @@
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from itertools import groupby
+
+import django
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from .cierres import inicio_del_dia
+from .models import Caja, CajaMovimiento
+from .tickets import guardar_pdf, renderizar_ticket, ruta_ticket, ticket_guardado
+
+
+# Ventas o estados de cuenta por tarea enviada a cada proceso
+LOTE_IMPRESION = 50
+
+
+def _rango(desde, hasta):
+    return {'fecha__gte': inicio_del_dia(desde), 'fecha__lt': inicio_del_dia(hasta + timedelta(days=1))}
+
+
+def _por_lotes(queryset, lote=LOTE_IMPRESION):
+    """Listas de objetos por pk ascendente, una consulta (más sus prefetch) por lote."""
+    ultimo = 0
+    while True:
+        bloque = list(queryset.filter(pk__gt=ultimo).order_by('pk')[:lote])
+        if bloque:
+            yield bloque
+        if len(bloque) < lote:
+            return
+        ultimo = bloque[-1].pk
+
+
+def en_paralelo(funcion, lotes, workers):
+    """
+    Aplica `funcion` a cada lote en un ProcessPoolExecutor y devuelve los
+    resultados en orden. Solo hay 2 × workers lotes en vuelo a la vez, así
+    la memoria no crece con el rango pedido. Con workers=1 no se crean procesos.
+    """
+    if workers <= 1:
+        for lote in lotes:
+            yield funcion(lote)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pendientes = deque()
+        for lote in lotes:
+            pendientes.append(pool.submit(funcion, lote))
+            if len(pendientes) >= workers * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+
+def _renderizar_tickets(ventas):
+    """
+    Se ejecuta en los procesos hijos y no toca la base de datos. Devuelve
+    (pk, contenido, nuevo): los tickets ya guardados en TICKETS_DIR se leen del disco.
+    """
+    resultados = []
+    for venta in ventas:
+        huella = ticket_guardado(venta)
+        if huella:
+            with open(ruta_ticket(huella), 'rb') as archivo:
+                resultados.append((venta.pk, archivo.read(), False))
+        else:
+            resultados.append((venta.pk, renderizar_ticket(venta), True))
+    return resultados
+
+
+def archivos_tickets(desde, hasta, workers=1):
+    """
+    Genera (nombre, contenido) con el ticket PDF de cada venta del rango.
+    Los que faltaban se guardan en TICKETS_DIR para las próximas descargas.
+    """
+    ventas = Caja.objects.filter(**_rango(desde, hasta)).prefetch_related('items__producto')
+    for resultados in en_paralelo(_renderizar_tickets, _por_lotes(ventas), workers):
+        nuevas = []
+        for pk, contenido, nuevo in resultados:
+            if nuevo:
+                nuevas.append(Caja(pk=pk, ticket=guardar_pdf(contenido)))
+            yield f'ticket_venta_{pk}.pdf', contenido
+        Caja.objects.bulk_update(nuevas, ['ticket'])
+
+
+def renderizar_estado_cuenta(estado):
+    """PDF carta con los movimientos de un socio en un mes: estado = (id_socio, nombre, mes, filas)."""
+    id_socio, nombre, mes, filas = estado
+    salida = BytesIO()
+    c = canvas.Canvas(salida, pagesize=letter, invariant=1)
+    ancho, alto = letter
+
+    def encabezado():
+        y = alto - 20 * mm
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(20 * mm, y, "Control Gym - Estado de cuenta")
+        c.setFont("Helvetica", 10)
+        c.drawString(20 * mm, y - 7 * mm, f"Socio: {id_socio} - {nombre}")
+        c.drawString(20 * mm, y - 12 * mm, f"Periodo: {mes:%m/%Y}")
+        c.line(20 * mm, y - 16 * mm, ancho - 20 * mm, y - 16 * mm)
+        return y - 22 * mm
+
+    y = encabezado()
+    total = 0
+    for fecha, concepto, metodo, monto in filas:
+        if y < 25 * mm:
+            c.showPage()
+            y = encabezado()
+        c.setFont("Helvetica", 9)
+        c.drawString(20 * mm, y, f"{fecha:%d/%m/%Y}")
+        c.drawString(42 * mm, y, concepto[:60])
+        c.drawString(150 * mm, y, metodo)
+        c.drawRightString(ancho - 20 * mm, y, f"${monto:.2f}")
+        total += monto
+        y -= 5 * mm
+
+    c.line(20 * mm, y, ancho - 20 * mm, y)
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(20 * mm, y - 6 * mm, "TOTAL:")
+    c.drawRightString(ancho - 20 * mm, y - 6 * mm, f"${total:.2f}")
+    c.showPage()
+    c.save()
+    return salida.getvalue()
+
+
+def _renderizar_estados(estados):
+    return [(estado[0], estado[2], renderizar_estado_cuenta(estado)) for estado in estados]
+
+
+def _estados(desde, hasta):
+    """
+    Un estado de cuenta por socio y mes con movimientos en el rango. Se leen
+    los movimientos de LOTE_IMPRESION socios por consulta.
+    """
+    movimientos = CajaMovimiento.objects.filter(socio__isnull=False, **_rango(desde, hasta))
+    socios = list(movimientos.order_by('socio_id').values_list('socio_id', flat=True).distinct())
+
+    def clave(movimiento):
+        return movimiento.socio_id, timezone.localtime(movimiento.fecha).date().replace(day=1)
+
+    for inicio in range(0, len(socios), LOTE_IMPRESION):
+        bloque = (
+            movimientos.filter(socio_id__in=socios[inicio:inicio + LOTE_IMPRESION])
+            .select_related('socio', 'suscripcion', 'inscripcion_clase__clase')
+            .order_by('socio_id', 'fecha', 'id')
+        )
+        lote = []
+        for (_, mes), grupo in groupby(bloque, key=clave):
+            grupo = list(grupo)
+            socio = grupo[0].socio
+            lote.append((
+                socio.id_socio, f'{socio.nombre} {socio.apellido}', mes,
+                [(m.fecha, m.concepto, m.get_metodo_pago_display(), m.monto) for m in grupo],
+            ))
+        yield lote
+
+
+def archivos_estados(desde, hasta, workers=1):
+    """Genera (nombre, contenido) con el estado de cuenta PDF de cada socio y mes del rango."""
+    for resultados in en_paralelo(_renderizar_estados, _estados(desde, hasta), workers):
+        for id_socio, mes, contenido in resultados:
+            yield f'estado_{id_socio}_{mes:%Y-%m}.pdf', contenido
+
+
+class _Salida:
+    """Destino de zipfile que acumula lo escrito para ir enviándolo (no admite seek)."""
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def zip_en_streaming(archivos):
+    """Empaqueta (nombre, contenido) en un ZIP que se entrega a medida que se genera."""
+    salida = _Salida()
+    # Los PDF ya vienen comprimidos: ZIP_STORED evita gastar CPU en recomprimirlos
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, contenido in archivos:
+            archivo_zip.writestr(nombre, contenido)
+            yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,309 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+
+from .cierres import acumular
+from .models import CajaMovimiento, Clase, InscripcionClase, ListaEspera, Socio
+
+
+class InscripcionError(ValueError):
+    pass
+
+
+class ClaseLlena(InscripcionError):
+    pass
+
+
+class YaInscrito(InscripcionError):
+    pass
+
+
+class YaEnEspera(InscripcionError):
+    pass
+
+
+def inscribir(clase, socio, metodo_pago='efectivo'):
+    """
+    Inscribe a `socio` en `clase` cobrando la clase. El lugar se reserva con
+    un UPDATE condicional sobre `ocupados`, así dos inscripciones simultáneas
+    nunca superan `max_participantes`; la inscripción y su movimiento de caja
+    se crean en la misma transacción.
+    """
+    try:
+        with transaction.atomic():
+            reservado = Clase.objects.filter(
+                pk=clase.pk, ocupados__lt=F('max_participantes')
+            ).update(ocupados=F('ocupados') + 1)
+            if not reservado:
+                raise ClaseLlena(f'La clase {clase.nombre} está llena. ¡Máximo {clase.max_participantes} participantes!')
+
+            inscripcion = InscripcionClase.objects.create(
+                id_inscripcion=InscripcionClase.generar_id(socio, clase),
+                socio=socio,
+                clase=clase,
+            )
+            movimiento = CajaMovimiento.objects.create(
+                tipo='clase',
+                descripcion=f"Pago Clase {clase.nombre} - Socio {socio.id_socio}",
+                metodo_pago=metodo_pago,
+                monto=clase.precio,
+                socio=socio,
+                inscripcion_clase=inscripcion,
+            )
+            inscripcion.movimiento_caja = movimiento
+            inscripcion.save(update_fields=['movimiento_caja'])
+            acumular([movimiento])
+    except IntegrityError:
+        # Solo la restricción (socio, clase) significa que ya estaba inscrito;
+        # cualquier otra (p. ej. id_inscripcion repetido) se propaga
+        if InscripcionClase.objects.filter(socio=socio, clase=clase).exists():
+            raise YaInscrito(f'El socio {socio.nombre} ya está inscrito en {clase.nombre}.')
+        raise
+    return inscripcion
+
+
+# Límite de socios por llamada a inscribir_en_lote
+LOTE_MAXIMO = 200
+
+
+def _reservar_lugares(clase, cantidad):
+    """
+    Reserva hasta `cantidad` lugares con UPDATEs condicionales (sin leer y
+    luego escribir). Si no caben todos se reintenta con los que quedan libres.
+    Devuelve cuántos se reservaron.
+    """
+    while cantidad > 0:
+        reservado = Clase.objects.filter(
+            pk=clase.pk, ocupados__lte=F('max_participantes') - cantidad
+        ).update(ocupados=F('ocupados') + cantidad)
+        if reservado:
+            return cantidad
+        libres = Clase.objects.filter(pk=clase.pk).values_list('max_participantes', 'ocupados').get()
+        cantidad = min(cantidad, libres[0] - libres[1])
+    return 0
+
+
+def inscribir_en_lote(clase, ids_socio, metodo_pago='efectivo', lista_espera=False):
+    """
+    Inscribe muchos socios (por id_socio) en una transacción con un número fijo
+    de consultas: in_bulk para los socios, una reserva de lugares y
+    bulk_create de inscripciones y pagos.
+    Devuelve [{'id_socio', 'estado', 'detalle'}] en el orden recibido; los
+    que no caben quedan 'sin_lugar' o, con lista_espera, 'en_espera'.
+    """
+    ids = list(dict.fromkeys(ids_socio))
+    if len(ids) > LOTE_MAXIMO:
+        raise InscripcionError(f'Se pueden inscribir como máximo {LOTE_MAXIMO} socios por lote.')
+
+    resultados = {}
+    socios = Socio.objects.in_bulk(ids, field_name='id_socio')
+    inscritos = set(
+        InscripcionClase.objects.filter(clase_id=clase.pk, socio_id__in=[s.pk for s in socios.values()])
+        .values_list('socio_id', flat=True)
+    )
+    candidatos = []
+    for id_socio in ids:
+        socio = socios.get(id_socio)
+        if socio is None:
+            resultados[id_socio] = ('no_encontrado', 'No existe un socio con ese ID.')
+        elif socio.pk in inscritos:
+            resultados[id_socio] = ('ya_inscrito', f'{socio.nombre} ya está inscrito.')
+        elif socio.tipo_socio == 'interno' and not socio.activo:
+            resultados[id_socio] = ('inactivo', 'Los socios internos deben tener suscripción activa.')
+        else:
+            candidatos.append(socio)
+
+    try:
+        with transaction.atomic():
+            aceptados = candidatos[:_reservar_lugares(clase, len(candidatos))]
+            InscripcionClase.objects.bulk_create([
+                InscripcionClase(id_inscripcion=InscripcionClase.generar_id(socio, clase), socio=socio, clase=clase)
+                for socio in aceptados
+            ])
+            # Se releen los pk: MySQL no los devuelve en bulk_create
+            inscripciones = list(InscripcionClase.objects.filter(clase=clase, socio__in=aceptados))
+            por_pk = {socio.pk: socio for socio in aceptados}
+            pagos = CajaMovimiento.objects.bulk_create([
+                CajaMovimiento(
+                    tipo='clase',
+                    descripcion=f"Pago Clase {clase.nombre} - Socio {por_pk[inscripcion.socio_id].id_socio}",
+                    metodo_pago=metodo_pago,
+                    monto=clase.precio,
+                    socio_id=inscripcion.socio_id,
+                    inscripcion_clase=inscripcion,
+                )
+                for inscripcion in inscripciones
+            ])
+            movimientos = dict(
+                CajaMovimiento.objects.filter(inscripcion_clase__in=inscripciones).values_list('inscripcion_clase_id', 'pk')
+            )
+            for inscripcion in inscripciones:
+                inscripcion.movimiento_caja_id = movimientos[inscripcion.pk]
+            InscripcionClase.objects.bulk_update(inscripciones, ['movimiento_caja'])
+            acumular(pagos)
+    except IntegrityError:
+        # Alguien se inscribió en paralelo: se reintenta uno por uno para aislarlo
+        aceptados = []
+        for socio in candidatos:
+            try:
+                inscribir(clase, socio, metodo_pago)
+            except ClaseLlena:
+                pass
+            except ValueError as e:
+                resultados[socio.id_socio] = ('ya_inscrito' if isinstance(e, YaInscrito) else 'error', str(e))
+            else:
+                aceptados.append(socio)
+
+    for socio in aceptados:
+        resultados[socio.id_socio] = ('inscrito', f'{socio.nombre} inscrito por ${clase.precio}.')
+    for socio in candidatos:
+        if socio.id_socio in resultados:
+            continue
+        if lista_espera:
+            try:
+                anotar_en_espera(clase, socio, metodo_pago)
+                resultados[socio.id_socio] = ('en_espera', f'{socio.nombre} quedó en lista de espera.')
+            except YaEnEspera as e:
+                resultados[socio.id_socio] = ('en_espera', str(e))
+        else:
+            resultados[socio.id_socio] = ('sin_lugar', f'La clase {clase.nombre} está llena.')
+
+    return [{'id_socio': id_socio, 'estado': resultados[id_socio][0], 'detalle': resultados[id_socio][1]} for id_socio in ids]
+
+
+def anotar_en_espera(clase, socio, metodo_pago='efectivo'):
+    """Agrega a `socio` al final de la lista de espera de `clase`."""
+    if InscripcionClase.objects.filter(clase=clase, socio=socio).exists():
+        raise YaInscrito(f'El socio {socio.nombre} ya está inscrito en {clase.nombre}.')
+    try:
+        with transaction.atomic():
+            # El turno sale de un contador en la clase (mismo patrón que gimnasio.secuencias)
+            Clase.objects.filter(pk=clase.pk).update(espera_turnos=F('espera_turnos') + 1)
+            turno = Clase.objects.filter(pk=clase.pk).values_list('espera_turnos', flat=True).get()
+            return ListaEspera.objects.create(clase=clase, socio=socio, posicion=turno, metodo_pago=metodo_pago)
+    except IntegrityError:
+        raise YaEnEspera(f'El socio {socio.nombre} ya está en la lista de espera de {clase.nombre}.')
+
+
+def inscribir_o_esperar(clase, socio, metodo_pago='efectivo'):
+    """Inscribe si hay lugar; si la clase está llena lo anota en la lista de espera. Devuelve (inscripcion, espera)."""
+    try:
+        return inscribir(clase, socio, metodo_pago), None
+    except ClaseLlena:
+        return None, anotar_en_espera(clase, socio, metodo_pago)
+
+
+def salir_de_espera(clase, socio):
+    borrados, _ = ListaEspera.objects.filter(clase=clase, socio=socio).delete()
+    if not borrados:
+        raise InscripcionError(f'El socio {socio.nombre} no estaba en la lista de espera de {clase.nombre}.')
+
+
+def promover(clase):
+    """
+    Pasa al primero de la lista de espera a la clase (con su cobro). Se llama
+    dentro de la transacción que liberó el lugar; los turnos que ya no pueden
+    inscribirse (socio inactivo, ya inscrito) se descartan y se sigue con el
+    siguiente. Devuelve la inscripción creada o None.
+    """
+    while True:
+        espera = (
+            ListaEspera.objects.select_for_update().select_related('socio')
+            .filter(clase=clase).order_by('posicion').first()
+        )
+        if espera is None:
+            return None
+        try:
+            with transaction.atomic():
+                ListaEspera.objects.filter(pk=espera.pk).delete()
+                return inscribir(clase, espera.socio, espera.metodo_pago)
+        except ClaseLlena:
+            # Se redujo el cupo: el turno se conserva
+            return None
+        except ValueError:
+            ListaEspera.objects.filter(pk=espera.pk).delete()
+
+
+def llenar_desde_espera(clase):
+    """
+    Pasa de la lista de espera a la clase a tantos socios como lugares haya
+    libres (p. ej. tras subir max_participantes). Va dentro de la transacción
+    que liberó los lugares. Devuelve las inscripciones creadas.
+    """
+    promovidas = []
+    while True:
+        inscripcion = promover(clase)
+        if inscripcion is None:
+            return promovidas
+        promovidas.append(inscripcion)
+
+
+def estado_espera(clase_id, socio):
+    """
+    Estado de la clase para `socio` en dos consultas indexadas, pensado para
+    consultarse seguido: lugares, largo de la lista, si está inscrito y su
+    lugar en la fila (1 = el próximo en pasar).
+    """
+    estado = Clase.objects.filter(pk=clase_id).annotate(
+        inscrito=Exists(InscripcionClase.objects.filter(clase_id=OuterRef('pk'), socio_id=socio.pk))
+    ).values('ocupados', 'max_participantes', 'inscrito').first()
+    if estado is None:
+        return None
+    turno = ListaEspera.objects.filter(clase_id=clase_id, socio_id=socio.pk).values('posicion')[:1]
+    fila = ListaEspera.objects.filter(clase_id=clase_id).aggregate(
+        en_espera=Count('id'),
+        delante=Count('id', filter=Q(posicion__lte=Subquery(turno))),
+    )
+    estado['en_espera'] = fila['en_espera']
+    estado['posicion'] = fila['delante'] or None
+    return estado
+
+
+def sincronizar_participantes(clase, socios, metodo_pago='efectivo'):
+    """
+    Deja exactamente `socios` inscritos en `clase` (edición desde la API). Las
+    bajas pasan por cancelar y las altas por inscribir_en_lote, con su cobro,
+    cupo y validación de socio activo; si alguna alta no se puede hacer se
+    lanza InscripcionError y no se cambia nada. Los lugares que quedan libres
+    pasan a la lista de espera.
+    """
+    nuevos = {socio.pk: socio for socio in socios}
+    with transaction.atomic():
+        actuales = set(InscripcionClase.objects.filter(clase=clase).values_list('socio_id', flat=True))
+        for socio in Socio.objects.filter(pk__in=actuales - set(nuevos)).order_by('pk'):
+            cancelar(clase, socio, promover_espera=False)
+        altas = [socio.id_socio for pk, socio in nuevos.items() if pk not in actuales]
+        rechazadas = [
+            resultado['detalle'] for resultado in (inscribir_en_lote(clase, altas, metodo_pago) if altas else [])
+            if resultado['estado'] != 'inscrito'
+        ]
+        if rechazadas:
+            raise InscripcionError(' '.join(rechazadas))
+        llenar_desde_espera(clase)
+
+
+def cancelar(clase, socio, promover_espera=True):
+    """
+    Da de baja a `socio` de `clase`, elimina el pago asociado y libera el
+    lugar, que pasa en la misma transacción al primero de la lista de espera
+    (salvo con promover_espera=False).
+    Devuelve (pk del movimiento eliminado o None, inscripción promovida o None).
+    """
+    with transaction.atomic():
+        inscripcion = (
+            InscripcionClase.objects.select_for_update()
+            .select_related('movimiento_caja')
+            .filter(socio=socio, clase=clase)
+            .first()
+        )
+        if inscripcion is None:
+            raise InscripcionError(f'El socio {socio.nombre} no estaba inscrito en {clase.nombre}.')
+
+        pago_id = None
+        if inscripcion.movimiento_caja:
+            pago_id = inscripcion.movimiento_caja.pk
+            acumular([inscripcion.movimiento_caja], signo=-1)
+            inscripcion.movimiento_caja.delete()
+        inscripcion.delete()
+        Clase.objects.filter(pk=clase.pk, ocupados__gt=0).update(ocupados=F('ocupados') - 1)
+        promovida = promover(clase) if promover_espera else None
+    return pago_id, promovida
@@ -0,0 +1,120 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+from .catalogo import invalidar_catalogo
+from .models import MovimientoStock, Producto
+
+
+class StockInsuficiente(ValueError):
+    def __init__(self, faltantes):
+        # faltantes: [(nombre, disponible)]
+        self.faltantes = faltantes
+        super().__init__('Stock insuficiente: ' + ', '.join(
+            f'{nombre} (quedan {disponible or 0})' for nombre, disponible in faltantes
+        ))
+
+
+def _faltantes(pks):
+    return list(Producto.objects.filter(pk__in=pks).order_by('nombre').values_list('nombre', 'stock'))
+
+
+def descontar_ventas(ventas, forzar=False):
+    """
+    Descuenta el stock vendido en `ventas` = [(venta, lineas)] con un UPDATE
+    condicional (stock >= cantidad) por producto y registra un MovimientoStock
+    por línea. Los productos sin inventario (stock None) no se tocan.
+    Debe llamarse dentro de la transacción de la venta: si algún producto no
+    alcanza se lanza StockInsuficiente y la venta completa se revierte.
+    Con `forzar` (ventas ya cobradas sin conexión) el stock baja hasta 0 y lo
+    que no alcanzó queda como movimiento 'faltante' de la venta que lo causó.
+    """
+    salidas = defaultdict(int)
+    for _, lineas in ventas:
+        for linea in lineas:
+            salidas[linea.producto_id] += linea.cantidad
+
+    # Qué productos llevan inventario se lee al momento: la foto del catálogo de
+    # otro proceso puede no saber aún que un producto empezó a llevarlo
+    con_inventario = Producto.objects.filter(pk__in=salidas, stock__isnull=False)
+    if forzar:
+        restante = dict(con_inventario.select_for_update().order_by('pk').values_list('pk', 'stock'))
+    else:
+        restante = dict.fromkeys(con_inventario.values_list('pk', flat=True))
+
+    movimientos = [
+        MovimientoStock(
+            producto_id=linea.producto_id, cantidad=-linea.cantidad, motivo='venta', venta=venta,
+            descripcion=f'Venta #{venta.id}',
+        )
+        for venta, lineas in ventas for linea in lineas if linea.producto_id in restante
+    ]
+
+    if forzar:
+        movimientos += _registrar_faltantes(salidas, movimientos, restante)
+    else:
+        # Siempre en orden de pk: dos ventas simultáneas bloquean las filas en el mismo orden
+        faltantes = [
+            pk for pk in sorted(restante)
+            if not Producto.objects.filter(pk=pk, stock__gte=salidas[pk]).update(stock=F('stock') - salidas[pk])
+        ]
+        if faltantes:
+            raise StockInsuficiente(_faltantes(faltantes))
+    MovimientoStock.objects.bulk_create(movimientos)
+
+
+def _registrar_faltantes(salidas, movimientos, restante):
+    """
+    Descuenta `salidas` sin bajar de 0 (`restante` = {pk: stock} leído con
+    bloqueo) y devuelve los movimientos 'faltante' que compensan las unidades
+    vendidas sin stock, así la suma de movimientos sigue cuadrando con el
+    stock. El faltante se asigna a las últimas ventas.
+    """
+    for pk in sorted(restante):
+        descontar = min(salidas[pk], max(restante[pk], 0))
+        if descontar:
+            Producto.objects.filter(pk=pk).update(stock=F('stock') - descontar)
+
+    faltantes = []
+    for movimiento in movimientos:
+        vendido = -movimiento.cantidad
+        cubierto = min(vendido, max(restante[movimiento.producto_id], 0))
+        restante[movimiento.producto_id] -= vendido
+        if cubierto < vendido:
+            faltantes.append(MovimientoStock(
+                producto_id=movimiento.producto_id, cantidad=vendido - cubierto, motivo='faltante',
+                venta=movimiento.venta, descripcion=f'Venta #{movimiento.venta.id} sin stock registrado',
+            ))
+    return faltantes
+
+
+def ajustar_stock(producto_id, cantidad, descripcion=''):
+    """
+    Suma (compras) o resta (mermas, conteo físico) unidades sin leer el valor
+    actual. Un producto sin inventario empieza a llevarlo desde 0.
+    """
+    productos = Producto.objects.filter(pk=producto_id)
+    if cantidad < 0:
+        productos = productos.filter(stock__gte=-cantidad)
+    with transaction.atomic():
+        if not productos.update(stock=Coalesce(F('stock'), Value(0)) + cantidad):
+            raise StockInsuficiente(_faltantes([producto_id]))
+        # El producto puede empezar a llevar inventario: el catálogo en memoria debe saberlo
+        invalidar_catalogo()
+        return MovimientoStock.objects.create(
+            producto_id=producto_id, cantidad=cantidad, motivo='ajuste', descripcion=descripcion,
+        )
+
+
+def por_reponer():
+    """
+    Productos con stock <= stock_minimo, los más urgentes primero. La
+    expresión coincide con la del índice producto_margen_stock_idx.
+    """
+    return (
+        Producto.objects.alias(margen=F('stock') - F('stock_minimo'))
+        .filter(margen__lte=0)
+        .order_by('margen', 'pk')
+    )
@@ -0,0 +1,58 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gimnasio.models import Caja, Producto
+from gimnasio.tickets import renderizar_escpos, renderizar_texto, renderizar_ticket
+from gimnasio.ventas import registrar_venta
+
+
+class Rollback(Exception):
+    pass
+
+
+RENDERIZADORES = (
+    ('pdf', renderizar_ticket),
+    ('escpos', renderizar_escpos),
+    ('texto', renderizar_texto),
+)
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de generar un ticket en PDF, ESC/POS y texto (los datos se descartan al terminar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--repeticiones', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'líneas':>7} {'formato':>8} {'bytes':>8} {'mediana ms':>11} {'p95 ms':>8}")
+        try:
+            with transaction.atomic():
+                maximo = max(options['lineas'])
+                Producto.objects.bulk_create([
+                    Producto(nombre=f'Benchmark {i}', precio=Decimal('10.00')) for i in range(maximo)
+                ])
+                # Se releen los pk: MySQL no los devuelve en bulk_create
+                productos = list(Producto.objects.filter(nombre__startswith='Benchmark ').values_list('pk', flat=True))
+                for cantidad in options['lineas']:
+                    venta = registrar_venta([{'producto_id': pk, 'cantidad': 1} for pk in productos[:cantidad]])
+                    # Solo se mide el renderizado: las líneas ya están precargadas
+                    venta = Caja.objects.prefetch_related('items__producto').get(pk=venta.pk)
+                    for formato, renderizar in RENDERIZADORES:
+                        tiempos = []
+                        for _ in range(options['repeticiones']):
+                            inicio = time.perf_counter()
+                            contenido = renderizar(venta)
+                            tiempos.append((time.perf_counter() - inicio) * 1000)
+                        p95 = sorted(tiempos)[int(len(tiempos) * 0.95) - 1]
+                        self.stdout.write(
+                            f"{cantidad:>7} {formato:>8} {len(contenido):>8} "
+                            f"{statistics.median(tiempos):>11.2f} {p95:>8.2f}"
+                        )
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,48 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from gimnasio.models import Producto
+from gimnasio.ventas import registrar_venta
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide registrar_venta con distintas cantidades de líneas (los datos se descartan al terminar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', type=int, nargs='+', default=[1, 10, 50, 100])
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'líneas':>7} {'consultas':>10} {'mediana ms':>11} {'p95 ms':>8}")
+        try:
+            with transaction.atomic():
+                maximo = max(options['lineas'])
+                Producto.objects.bulk_create([
+                    Producto(nombre=f'Benchmark {i}', precio=Decimal('10.00')) for i in range(maximo)
+                ])
+                # Se releen los pk: MySQL no los devuelve en bulk_create
+                productos = list(Producto.objects.filter(nombre__startswith='Benchmark ').values_list('pk', flat=True))
+                for cantidad in options['lineas']:
+                    items = [{'producto_id': pk, 'cantidad': 1} for pk in productos[:cantidad]]
+                    tiempos = []
+                    for _ in range(options['repeticiones']):
+                        with CaptureQueriesContext(connection) as consultas:
+                            inicio = time.perf_counter()
+                            registrar_venta(items)
+                            tiempos.append((time.perf_counter() - inicio) * 1000)
+                    p95 = sorted(tiempos)[int(len(tiempos) * 0.95) - 1]
+                    self.stdout.write(
+                        f"{cantidad:>7} {len(consultas):>10} {statistics.median(tiempos):>11.2f} {p95:>8.2f}"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
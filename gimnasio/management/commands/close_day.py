@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from gimnasio.cierres import cerrar_dia, dias_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Cierra la caja del día: recalcula sus totales desde los movimientos y los sella (ejecutar diariamente por cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día a cerrar (YYYY-MM-DD). Por defecto ayer y los días anteriores sin cerrar')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        if options['fecha']:
+            try:
+                dias = [datetime.strptime(options['fecha'], '%Y-%m-%d').date()]
+            except ValueError:
+                raise CommandError('Formato de --fecha inválido. Usa YYYY-MM-DD.')
+            if dias[0] >= hoy:
+                raise CommandError('Solo se pueden cerrar días anteriores a hoy.')
+        else:
+            ayer = hoy - timedelta(days=1)
+            dias = sorted({*dias_pendientes(hoy), ayer})
+
+        for dia in dias:
+            filas = cerrar_dia(dia)
+            total = sum(fila.total for fila in filas)
+            self.stdout.write(f'{dia:%Y-%m-%d}: {sum(f.movimientos for f in filas)} movimientos, ${total:.2f}')
+        self.stdout.write(self.style.SUCCESS(f'Días cerrados: {len(dias)}.'))
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gimnasio.exportaciones import EXPORTACIONES, FORMATOS, lineas
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor}. Usa YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Exporta socios, suscripciones, clases, inscripciones, movimientos o ventas a CSV/JSONL por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recurso', choices=list(EXPORTACIONES))
+        parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+        parser.add_argument('--desde', help='Fecha inicial (YYYY-MM-DD), inclusive')
+        parser.add_argument('--hasta', help='Fecha final (YYYY-MM-DD), inclusive')
+        parser.add_argument('--salida', help='Archivo de salida; por defecto stdout')
+
+    def handle(self, *args, **options):
+        desde, hasta = _fecha(options['desde']), _fecha(options['hasta'])
+        contenido = lineas(options['recurso'], options['formato'], desde, hasta)
+        if not options['salida']:
+            for linea in contenido:
+                self.stdout.write(linea, ending='')
+            return
+
+        with open(options['salida'], 'w', newline='', encoding='utf-8') as salida:
+            salida.writelines(contenido)
+        self.stderr.write(self.style.SUCCESS(f"Exportación guardada en {options['salida']}."))
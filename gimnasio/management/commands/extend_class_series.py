@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+
+from gimnasio.models import ClaseSerie
+from gimnasio.series import HORIZONTE_DIAS, materializar
+
+
+class Command(BaseCommand):
+    help = 'Genera las clases de las series recurrentes hasta el horizonte indicado (ejecutar diariamente por cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=HORIZONTE_DIAS, help=f'Días por delante a generar (por defecto {HORIZONTE_DIAS})')
+
+    def handle(self, *args, **options):
+        # Las series ya generadas hasta su fecha_fin no se vuelven a leer
+        pendientes = ClaseSerie.objects.filter(
+            Q(generada_hasta__isnull=True) | Q(generada_hasta__lt=F('fecha_fin'))
+        ).only('pk', 'nombre')
+
+        total = 0
+        for serie in pendientes.iterator():
+            # Las fechas que chocan con otra clase del entrenador se saltan y se informan
+            clases, omitidas = materializar(serie, dias=options['dias'], omitir_conflictos=True)
+            total += len(clases)
+            for fecha in omitidas:
+                self.stderr.write(f'Serie "{serie.nombre}": {timezone.localtime(fecha):%d/%m/%Y %H:%M} omitida por choque de horario.')
+
+        self.stdout.write(self.style.SUCCESS(f'Clases generadas: {total}.'))
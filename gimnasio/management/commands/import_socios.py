@@ -0,0 +1,255 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError, IntegrityError, transaction
+from django.utils.crypto import get_random_string
+
+from gimnasio.busqueda import reindexar_socios
+from gimnasio.models import Socio, Suscripcion
+from gimnasio.secuencias import reconciliar, reservar_ids
+from gimnasio.security import sanitize_text_input, validate_phone, validate_socio_id
+
+
+TIPOS_SOCIO = dict(Socio.TIPOS_SOCIO)
+TIPOS_SUSCRIPCION = dict(Suscripcion._meta.get_field('tipo').choices)
+
+# Errores atribuibles a los datos de una fila; cualquier otro es un fallo del comando y se propaga
+ERRORES_DE_FILA = (DataError, IntegrityError, ValidationError, ValueError)
+
+
+def leer_filas(archivo, formato):
+    """Genera (número de línea, dict) sin cargar el archivo completo en memoria."""
+    if formato == 'jsonl':
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError as e:
+                yield numero, ValueError(f"JSON inválido: {e}")
+                continue
+            yield numero, fila if isinstance(fila, dict) else ValueError("Cada línea debe ser un objeto JSON.")
+    else:
+        # La línea 1 es la cabecera
+        for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+            yield numero, fila
+
+
+def validar_fila(fila):
+    """Devuelve los datos limpios de la fila o lanza ValueError con el motivo."""
+    if isinstance(fila, Exception):
+        raise fila
+
+    def texto(campo):
+        return sanitize_text_input(str(fila.get(campo) or ''))
+
+    datos = {campo: texto(campo) for campo in ('nombre', 'apellido', 'telefono', 'domicilio')}
+    faltantes = [campo for campo, valor in datos.items() if not valor]
+    if faltantes:
+        raise ValueError(f"Campos obligatorios vacíos: {', '.join(faltantes)}.")
+    # SQLite no aplica max_length; MySQL estricto y Postgres abortarían el lote
+    largos = [campo for campo, valor in datos.items() if len(valor) > Socio._meta.get_field(campo).max_length]
+    if largos:
+        raise ValueError(f"Campos demasiado largos: {', '.join(largos)}.")
+    if not validate_phone(datos['telefono']):
+        raise ValueError("El teléfono no tiene un formato válido.")
+
+    id_socio = str(fila.get('id_socio') or '').strip().upper()
+    if id_socio and not validate_socio_id(id_socio):
+        raise ValueError(f"ID de socio inválido: {id_socio}.")
+    datos['id_socio'] = id_socio
+
+    datos['tipo_socio'] = str(fila.get('tipo_socio') or 'externo').strip().lower()
+    if datos['tipo_socio'] not in TIPOS_SOCIO:
+        raise ValueError(f"Tipo de socio inválido: {datos['tipo_socio']}.")
+
+    datos['tipo_suscripcion'] = None
+    if datos['tipo_socio'] == 'interno' and fila.get('tipo_suscripcion'):
+        datos['tipo_suscripcion'] = str(fila['tipo_suscripcion']).strip().lower()
+        if datos['tipo_suscripcion'] not in TIPOS_SUSCRIPCION:
+            raise ValueError(f"Tipo de suscripción inválido: {datos['tipo_suscripcion']}.")
+        try:
+            datos['fecha_inicio'] = datetime.strptime(str(fila.get('fecha_inicio') or '').strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError("Formato de fecha_inicio inválido. Usa YYYY-MM-DD.")
+    return datos
+
+
+class Command(BaseCommand):
+    help = 'Importa socios desde un archivo CSV o JSONL por lotes (socios, suscripciones y usuarios)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV/JSONL, o "-" para leer de stdin')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=500, help='Filas por transacción (por defecto 500)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos para calcular los hashes de contraseñas')
+        parser.add_argument(
+            '--credenciales',
+            help='Archivo CSV donde guardar las contraseñas temporales generadas. '
+                 'Sin esta opción los usuarios se crean sin contraseña utilizable.'
+        )
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('jsonl' if options['archivo'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor a 0.')
+
+        self.grupo_socios = Group.objects.filter(name='Socios').first()
+        self.creados = 0
+        self.errores = 0
+        self.pool = None
+        self.credenciales = None
+        self.ids_explicitos = False
+
+        archivo = sys.stdin if options['archivo'] == '-' else open(options['archivo'], newline='', encoding='utf-8')
+        salida_credenciales = open(options['credenciales'], 'w', newline='', encoding='utf-8') if options['credenciales'] else None
+        try:
+            if salida_credenciales:
+                self.credenciales = csv.writer(salida_credenciales)
+                self.credenciales.writerow(['id_socio', 'password', 'nombre', 'apellido', 'telefono'])
+                if options['workers'] > 1:
+                    self.pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+
+            filas = leer_filas(archivo, formato)
+            while True:
+                lote = list(islice(filas, options['lote']))
+                if not lote:
+                    break
+                self.procesar_lote(lote)
+        finally:
+            if self.pool:
+                self.pool.shutdown()
+            if archivo is not sys.stdin:
+                archivo.close()
+            if salida_credenciales:
+                salida_credenciales.close()
+
+        if self.ids_explicitos:
+            # Los IDs traídos del archivo pueden quedar por delante del contador
+            reconciliar('socio')
+        estilo = self.style.SUCCESS if not self.errores else self.style.WARNING
+        self.stdout.write(estilo(f'Importación terminada: {self.creados} socios creados, {self.errores} filas con error.'))
+
+    def error(self, numero, mensaje):
+        self.errores += 1
+        self.stderr.write(f'Línea {numero}: {mensaje}')
+
+    def procesar_lote(self, lote):
+        validas = []
+        for numero, fila in lote:
+            try:
+                validas.append((numero, validar_fila(fila)))
+            except ValueError as e:
+                self.error(numero, e)
+
+        # IDs repetidos dentro del lote o ya existentes (una consulta por tabla)
+        propuestos = [datos['id_socio'] for _, datos in validas if datos['id_socio']]
+        ocupados = set(Socio.objects.filter(id_socio__in=propuestos).values_list('id_socio', flat=True))
+        ocupados |= set(User.objects.filter(username__in=propuestos).values_list('username', flat=True))
+        filas = []
+        for numero, datos in validas:
+            if datos['id_socio'] in ocupados:
+                self.error(numero, f"El ID {datos['id_socio']} ya existe.")
+                continue
+            if datos['id_socio']:
+                ocupados.add(datos['id_socio'])
+            filas.append((numero, datos))
+        if not filas:
+            return
+
+        sin_id = sum(1 for _, datos in filas if not datos['id_socio'])
+        nuevos_ids = iter(reservar_ids('socio', sin_id) if sin_id else [])
+        self.ids_explicitos = self.ids_explicitos or sin_id < len(filas)
+        for _, datos in filas:
+            datos['id_socio'] = datos['id_socio'] or next(nuevos_ids)
+
+        if self.credenciales:
+            passwords = [get_random_string(length=8) for _ in filas]
+            if self.pool:
+                hashes = list(self.pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32)))
+            else:
+                hashes = [make_password(p) for p in passwords]
+        else:
+            passwords = [None] * len(filas)
+            hashes = [make_password(None)] * len(filas)
+
+        try:
+            self.insertar(filas, hashes)
+        except ERRORES_DE_FILA as e:
+            if len(filas) == 1:
+                self.error(filas[0][0], e)
+                return
+            # Se reintenta fila por fila para aislar la(s) fila(s) con problemas
+            for fila, password, hash_ in zip(filas, passwords, hashes):
+                try:
+                    self.insertar([fila], [hash_])
+                except ERRORES_DE_FILA as e:
+                    self.error(fila[0], e)
+                else:
+                    self.registrar(fila[1], password)
+            return
+
+        for (_, datos), password in zip(filas, passwords):
+            self.registrar(datos, password)
+
+    def registrar(self, datos, password):
+        self.creados += 1
+        if self.credenciales and password:
+            self.credenciales.writerow([datos['id_socio'], password, datos['nombre'], datos['apellido'], datos['telefono']])
+
+    def insertar(self, filas, hashes):
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=datos['id_socio'], password=hash_, first_name=datos['nombre'][:150],
+                     last_name=datos['apellido'][:150], is_staff=False)
+                for (_, datos), hash_ in zip(filas, hashes)
+            ])
+            # Se releen los pk: MySQL no los devuelve en bulk_create
+            usuarios = dict(User.objects.filter(username__in=[d['id_socio'] for _, d in filas]).values_list('username', 'pk'))
+            if self.grupo_socios:
+                User.groups.through.objects.bulk_create([
+                    User.groups.through(user_id=pk, group_id=self.grupo_socios.pk) for pk in usuarios.values()
+                ])
+
+            Socio.objects.bulk_create([
+                Socio(
+                    user_id=usuarios[datos['id_socio']],
+                    id_socio=datos['id_socio'],
+                    nombre=datos['nombre'],
+                    apellido=datos['apellido'],
+                    telefono=datos['telefono'],
+                    domicilio=datos['domicilio'],
+                    tipo_socio=datos['tipo_socio'],
+                    estado='activo',
+                )
+                for _, datos in filas
+            ])
+            socios = list(Socio.objects.filter(id_socio__in=[d['id_socio'] for _, d in filas]))
+            reindexar_socios(socios)
+
+            por_id = {socio.id_socio: socio for socio in socios}
+            con_suscripcion = [datos for _, datos in filas if datos['tipo_suscripcion']]
+            suscripciones = []
+            for datos, id_suscripcion in zip(con_suscripcion, reservar_ids('suscripcion', len(con_suscripcion)) if con_suscripcion else []):
+                suscripcion = Suscripcion(
+                    id_suscripcion=id_suscripcion,
+                    socio=por_id[datos['id_socio']],
+                    tipo=datos['tipo_suscripcion'],
+                    fecha_inicio=datos['fecha_inicio'],
+                )
+                suscripcion.asignar_monto_y_fin()
+                suscripcion.activa = suscripcion.fecha_fin >= date.today()
+                suscripciones.append(suscripcion)
+            Suscripcion.objects.bulk_create(suscripciones)
+
+            Socio.objects.filter(pk__in=[socio.pk for socio in socios]).sync_membership_status()
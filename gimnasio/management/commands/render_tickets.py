@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gimnasio.impresion import archivos_estados, archivos_tickets, zip_en_streaming
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor}. Usa YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Genera en paralelo los tickets de venta o los estados de cuenta mensuales de un rango en un ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Archivo ZIP de salida')
+        parser.add_argument('--desde', required=True, help='Fecha inicial (YYYY-MM-DD), inclusive')
+        parser.add_argument('--hasta', required=True, help='Fecha final (YYYY-MM-DD), inclusive')
+        parser.add_argument('--tipo', choices=['tickets', 'estados'], default='tickets')
+        parser.add_argument('--workers', type=int, default=settings.IMPRESION_WORKERS, help='Procesos para renderizar')
+
+    def handle(self, *args, **options):
+        desde, hasta = _fecha(options['desde']), _fecha(options['hasta'])
+        if hasta < desde:
+            raise CommandError('--hasta no puede ser anterior a --desde.')
+        generar = archivos_tickets if options['tipo'] == 'tickets' else archivos_estados
+
+        cantidad = 0
+
+        def contar(archivos):
+            nonlocal cantidad
+            for archivo in archivos:
+                cantidad += 1
+                yield archivo
+
+        try:
+            with open(options['salida'], 'wb') as salida:
+                for parte in zip_en_streaming(contar(generar(desde, hasta, options['workers']))):
+                    salida.write(parte)
+        except Exception:
+            os.remove(options['salida'])
+            raise
+        self.stdout.write(self.style.SUCCESS(f"{cantidad} archivo(s) guardados en {options['salida']}."))
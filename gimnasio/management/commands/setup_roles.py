@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
-from gimnasio.models import Socio, Clase, Entrenador, InscripcionClase, CajaMovimiento, Producto
+from gimnasio.models import Socio, Clase, ClaseSerie, Entrenador, InscripcionClase, CajaMovimiento, Producto, Suscripcion, VentaItem
 
 class Command(BaseCommand):
     help = 'Configura los grupos de usuarios y asigna permisos iniciales'
@@ -20,7 +20,7 @@ class Command(BaseCommand):
 
         # 2. Obtener Permisos de la app 'gimnasio'
         # Lista de modelos que gestionan los administradores
-        modelos_admin = [Socio, Clase, Entrenador, InscripcionClase, CajaMovimiento, Producto]
+        modelos_admin = [Socio, Clase, ClaseSerie, Entrenador, InscripcionClase, CajaMovimiento, Producto]
         
         permisos_admin = []
         for modelo in modelos_admin:
@@ -28,6 +28,12 @@ class Command(BaseCommand):
             perms = Permission.objects.filter(content_type=content_type)
             permisos_admin.extend(perms)
 
+        # Modelos que los administradores solo consultan (p. ej. para /api/exportar/)
+        modelos_consulta = [Suscripcion, VentaItem]
+        for modelo in modelos_consulta:
+            content_type = ContentType.objects.get_for_model(modelo)
+            permisos_admin.extend(Permission.objects.filter(content_type=content_type, codename__startswith='view_'))
+
         # 3. Asignar permisos al grupo Administradores
         grupo_admins.permissions.set(permisos_admin)
         self.stdout.write(self.style.SUCCESS(f'Se asignaron {len(permisos_admin)} permisos al grupo "Administradores".'))
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from gimnasio.models import Socio, Suscripcion
+
+
+class Command(BaseCommand):
+    help = 'Marca como vencidas las suscripciones expiradas y sincroniza el estado de los socios (ejecutar diariamente por cron)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            vencidas = Suscripcion.objects.filter(activa=True, fecha_fin__lt=date.today()).update(activa=False)
+            activados, desactivados = Socio.objects.all().sync_membership_status()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Suscripciones vencidas: {vencidas}. Socios activados: {activados}, desactivados: {desactivados}.'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from gimnasio.secuencias import SECUENCIAS, reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Reconcilia los contadores de IDs (socios, suscripciones, entrenadores, clases) con los datos existentes'
+
+    def handle(self, *args, **options):
+        for nombre in SECUENCIAS:
+            ultimo = reconciliar(nombre)
+            self.stdout.write(self.style.SUCCESS(f'Secuencia "{nombre}": último valor {ultimo}.'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0008_remove_inscripcionclase_pago_asociado_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='socio',
+            name='estado',
+            field=models.CharField(choices=[('activo', 'Activo'), ('inactivo', 'Inactivo/Vencido')], db_index=True, default='activo', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='suscripcion',
+            index=models.Index(fields=['activa', 'fecha_fin'], name='suscripcion_activa_fin_idx'),
+        ),
+    ]
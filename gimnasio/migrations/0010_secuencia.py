@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0009_membership_status_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=30, unique=True)),
+                ('ultimo_valor', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
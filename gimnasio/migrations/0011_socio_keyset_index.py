@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0010_secuencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='socio',
+            index=models.Index(fields=['apellido', 'nombre', 'id'], name='socio_apellido_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:32
+
+import html
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia de gimnasio.busqueda al momento de esta migración: si la app cambia
+# su normalización, los datos históricos deben seguir calculándose igual.
+def normalizar_busqueda(texto):
+    texto = html.unescape(texto or '')
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'\w+', texto))
+
+
+def terminos_busqueda(texto):
+    return sorted({palabra[:50] for palabra in normalizar_busqueda(texto).split()})
+
+
+def poblar_busqueda(apps, schema_editor):
+    Socio = apps.get_model('gimnasio', 'Socio')
+    SocioTermino = apps.get_model('gimnasio', 'SocioTermino')
+    for socio in Socio.objects.only('id_socio', 'nombre', 'apellido').iterator(chunk_size=2000):
+        texto = f"{socio.id_socio} {socio.nombre} {socio.apellido}"
+        Socio.objects.filter(pk=socio.pk).update(busqueda=normalizar_busqueda(texto)[:320])
+        SocioTermino.objects.bulk_create(
+            [SocioTermino(socio_id=socio.pk, termino=t) for t in terminos_busqueda(texto)]
+        )
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS socio_busqueda_trgm_idx '
+        'ON gimnasio_socio USING gin (busqueda gin_trgm_ops)'
+    )
+
+
+def borrar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS socio_busqueda_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0011_socio_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='socio',
+            name='busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=320),
+        ),
+        migrations.CreateModel(
+            name='SocioTermino',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=50)),
+                ('socio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='gimnasio.socio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['termino', 'socio'], name='socio_termino_idx')],
+                'unique_together': {('socio', 'termino')},
+            },
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigramas, borrar_indice_trigramas),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_ocupados(apps, schema_editor):
+    Clase = apps.get_model('gimnasio', 'Clase')
+    Inscritos = Clase.participantes.through
+    conteo = (
+        Inscritos.objects.filter(clase_id=OuterRef('pk'))
+        .values('clase_id').annotate(total=Count('pk')).values('total')
+    )
+    Clase.objects.update(ocupados=Coalesce(Subquery(conteo), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0012_socio_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clase',
+            name='ocupados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(contar_ocupados, migrations.RunPython.noop),
+    ]
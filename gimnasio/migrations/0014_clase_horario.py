@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0013_clase_ocupados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clase',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='clase',
+            index=models.Index(fields=['fecha_hora'], name='clase_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clase',
+            index=models.Index(fields=['entrenador', 'fecha_hora'], name='clase_entrenador_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0014_clase_horario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaseSerie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('descripcion', models.TextField(blank=True)),
+                ('dias_semana', models.JSONField(default=list)),
+                ('hora', models.TimeField()),
+                ('duracion_minutos', models.IntegerField(default=60)),
+                ('max_participantes', models.IntegerField(default=20)),
+                ('precio', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('generada_hasta', models.DateField(blank=True, editable=False, null=True)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('entrenador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='gimnasio.entrenador')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='clase',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='clases', to='gimnasio.claseserie'),
+        ),
+    ]
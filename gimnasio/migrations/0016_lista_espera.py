@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0015_clase_serie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clase',
+            name='espera_turnos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveIntegerField()),
+                ('metodo_pago', models.CharField(default='efectivo', max_length=20)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('clase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='gimnasio.clase')),
+                ('socio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='esperas', to='gimnasio.socio')),
+            ],
+            options={
+                'ordering': ['posicion'],
+                'unique_together': {('clase', 'posicion'), ('clase', 'socio')},
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+LOTE = 1000
+
+
+def unificar_inscripciones(apps, schema_editor):
+    """Crea InscripcionClase para las filas que solo estaban en el M2M y recuenta los lugares."""
+    Clase = apps.get_model('gimnasio', 'Clase')
+    InscripcionClase = apps.get_model('gimnasio', 'InscripcionClase')
+    Inscritos = Clase.participantes.through
+
+    existentes = set(InscripcionClase.objects.values_list('clase_id', 'socio_id').iterator(chunk_size=LOTE))
+    pendientes = []
+    filas = Inscritos.objects.values_list('clase_id', 'clase__id_clase', 'socio_id', 'socio__id_socio')
+    for clase_id, id_clase, socio_id, id_socio in filas.iterator(chunk_size=LOTE):
+        if (clase_id, socio_id) in existentes:
+            continue
+        pendientes.append(InscripcionClase(
+            id_inscripcion=f"INSMIG-{id_socio}-{id_clase}", clase_id=clase_id, socio_id=socio_id,
+        ))
+        if len(pendientes) >= LOTE:
+            InscripcionClase.objects.bulk_create(pendientes)
+            pendientes = []
+    InscripcionClase.objects.bulk_create(pendientes)
+
+    conteo = (
+        InscripcionClase.objects.filter(clase_id=OuterRef('pk'))
+        .values('clase_id').annotate(total=Count('pk')).values('total')
+    )
+    Clase.objects.update(ocupados=Coalesce(Subquery(conteo), 0))
+
+
+def copiar_a_m2m(apps, schema_editor):
+    Clase = apps.get_model('gimnasio', 'Clase')
+    InscripcionClase = apps.get_model('gimnasio', 'InscripcionClase')
+    Inscritos = Clase.participantes.through
+    filas = InscripcionClase.objects.values_list('clase_id', 'socio_id').iterator(chunk_size=LOTE)
+    Inscritos.objects.bulk_create([Inscritos(clase_id=c, socio_id=s) for c, s in filas], batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0016_lista_espera'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_inscripciones, copiar_a_m2m),
+        # Django no permite agregar through= a un M2M existente: se quita la tabla automática y se redefine
+        migrations.RemoveField(
+            model_name='clase',
+            name='participantes',
+        ),
+        migrations.AddField(
+            model_name='clase',
+            name='participantes',
+            field=models.ManyToManyField(blank=True, related_name='clases_inscritas', through='gimnasio.InscripcionClase', to='gimnasio.socio'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0017_inscripcion_through'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='producto',
+            options={'permissions': [('cambiar_precio_venta', 'Puede cobrar un precio distinto al de catálogo')]},
+        ),
+    ]
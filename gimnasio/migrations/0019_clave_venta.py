@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0018_producto_permiso_precio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('recibida', models.DateTimeField(auto_now_add=True)),
+                ('venta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='clave_offline', to='gimnasio.caja')),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:02
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def calcular_cierres(apps, schema_editor):
+    """Genera los totales diarios de los movimientos existentes; los días pasados quedan cerrados."""
+    CajaMovimiento = apps.get_model('gimnasio', 'CajaMovimiento')
+    CierreCaja = apps.get_model('gimnasio', 'CierreCaja')
+    hoy = timezone.localdate()
+    filas = (
+        CajaMovimiento.objects.annotate(dia=TruncDate('fecha'))
+        .values('dia', 'metodo_pago', 'tipo')
+        .annotate(total=Sum('monto'), cantidad=Count('id'))
+        .order_by()
+    )
+    CierreCaja.objects.bulk_create([
+        CierreCaja(
+            fecha=fila['dia'], metodo_pago=fila['metodo_pago'], tipo=fila['tipo'],
+            total=fila['total'], movimientos=fila['cantidad'], cerrado=fila['dia'] < hoy,
+        )
+        for fila in filas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0019_clave_venta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreCaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia')], max_length=20)),
+                ('tipo', models.CharField(choices=[('producto', 'Venta de productos'), ('mensualidad', 'Mensualidad'), ('clase', 'Clase'), ('otro', 'Otro')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('cerrado', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Cierre de caja',
+                'verbose_name_plural': 'Cierres de caja',
+                'ordering': ['-fecha', 'metodo_pago', 'tipo'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cajamovimiento',
+            index=models.Index(fields=['fecha'], name='cajamovimiento_fecha_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cierrecaja',
+            unique_together={('fecha', 'metodo_pago', 'tipo')},
+        ),
+        migrations.RunPython(calcular_cierres, migrations.RunPython.noop),
+    ]
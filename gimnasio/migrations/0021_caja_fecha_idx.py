@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0020_cierre_caja'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caja',
+            index=models.Index(fields=['fecha'], name='caja_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0021_caja_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cajamovimiento',
+            name='cajamovimiento_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cajamovimiento',
+            index=models.Index(fields=['fecha', 'id'], name='cajamovimiento_fecha_id_idx'),
+        ),
+    ]
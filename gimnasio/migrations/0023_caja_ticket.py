@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0022_cajamovimiento_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caja',
+            name='ticket',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
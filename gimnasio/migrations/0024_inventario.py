@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:19
+
+import django.db.models.deletion
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0023_caja_ticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('cantidad', models.IntegerField()),
+                ('motivo', models.CharField(choices=[('venta', 'Venta'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('descripcion', models.CharField(blank=True, default='', max_length=200)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock_minimo',
+            field=models.IntegerField(default=0, help_text='Con esta existencia o menos el producto aparece para reponer'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('stock'), '-', models.F('stock_minimo')), name='producto_margen_stock_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.CheckConstraint(condition=models.Q(('stock__gte', 0)), name='producto_stock_no_negativo'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='gimnasio.producto'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='venta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to='gimnasio.caja'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', 'fecha'], name='movstock_producto_fecha_idx'),
+        ),
+    ]
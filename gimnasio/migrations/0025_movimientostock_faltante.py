@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0024_inventario'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='motivo',
+            field=models.CharField(choices=[('venta', 'Venta'), ('ajuste', 'Ajuste'), ('faltante', 'Faltante')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0025_movimientostock_faltante'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='caja',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='cajamovimiento',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,9 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models import F
 from datetime import date, timedelta
 from decimal import Decimal
 from django.contrib.auth.models import User #///////////////////////
 from django.conf import settings
 from datetime import timedelta, datetime
+from .busqueda import normalizar_busqueda, terminos_busqueda
+from .catalogo import invalidar_catalogo
+from django.utils import timezone
 
 # Tabla Entrenador
 class Entrenador(models.Model):
@@ -17,6 +23,37 @@ class Entrenador(models.Model):
     def __str__(self):
         return f"{self.id_entrenador} - {self.nombre}"
 
+class SocioQuerySet(models.QuerySet):
+    def with_current_subscription(self):
+        """
+        Precarga la suscripción vigente (o la más reciente) de cada socio en
+        una sola consulta, sin importar cuántos socios devuelva el queryset.
+        """
+        actual = Suscripcion.objects.filter(socio=models.OuterRef('socio')).order_by(
+            *Suscripcion.ORDEN_ACTUAL
+        ).values('pk')[:1]
+        return self.prefetch_related(
+            models.Prefetch(
+                'suscripciones',
+                queryset=Suscripcion.objects.filter(pk=models.Subquery(actual)),
+                to_attr='_suscripcion_actual',
+            )
+        )
+
+    def sync_membership_status(self):
+        """
+        Recalcula `estado` de los socios internos con dos UPDATE: activo si
+        tienen una suscripción activa y no vencida, inactivo en caso contrario.
+        """
+        vigentes = Suscripcion.objects.filter(
+            socio=models.OuterRef('pk'), activa=True, fecha_fin__gte=date.today()
+        )
+        internos = self.filter(tipo_socio='interno')
+        activados = internos.filter(models.Exists(vigentes)).exclude(estado='activo').update(estado='activo')
+        desactivados = internos.exclude(models.Exists(vigentes)).exclude(estado='inactivo').update(estado='inactivo')
+        return activados, desactivados
+
+
 # Tabla Socio ////////////////////////////////////////////
 class Socio(models.Model):
     user = models.OneToOneField(
@@ -40,20 +77,87 @@ class Socio(models.Model):
         ('activo', 'Activo'),
         ('inactivo', 'Inactivo/Vencido'),
     ]
-    estado = models.CharField(max_length=10, choices=ESTADOS, default='activo')  # Puede calcularse dinamicamente
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='activo', db_index=True)  # Lo mantiene sweep_memberships
+    busqueda = models.CharField(max_length=320, blank=True, default='', editable=False)  # id, nombre y apellido normalizados
+
+    objects = SocioQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Orden del listado paginado por cursor
+            models.Index(fields=['apellido', 'nombre', 'id'], name='socio_apellido_nombre_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id_socio} - {self.nombre} {self.apellido} ({self.get_tipo_socio_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._busqueda_guardada = instance.__dict__.get('busqueda')
+        instance._tipo_guardado = instance.__dict__.get('tipo_socio')
+        return instance
+
+    def texto_busqueda(self):
+        return f"{self.id_socio} {self.nombre} {self.apellido}"
+
+    def save(self, *args, **kwargs):
+        self.busqueda = normalizar_busqueda(self.texto_busqueda())[:320]
+        campos = {'busqueda'}
+        # Un interno nuevo (o que antes era externo) solo está activo si ya tiene suscripción vigente
+        if self.tipo_socio == 'interno' and getattr(self, '_tipo_guardado', None) != 'interno':
+            vigente = self.pk and self.suscripciones.filter(activa=True, fecha_fin__gte=date.today()).exists()
+            self.estado = 'activo' if vigente else 'inactivo'
+            campos.add('estado')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *campos}
+        super().save(*args, **kwargs)
+        self._tipo_guardado = self.tipo_socio
+
+        if self.busqueda != getattr(self, '_busqueda_guardada', None):
+            self.actualizar_terminos()
+            self._busqueda_guardada = self.busqueda
+
+    def actualizar_terminos(self):
+        self.terminos.all().delete()
+        SocioTermino.objects.bulk_create(
+            [SocioTermino(socio=self, termino=t) for t in terminos_busqueda(self.texto_busqueda())]
+        )
+
     def is_activo(self):
         if self.tipo_socio == 'interno':
-            suscripcion_activa = self.suscripciones.filter(activa=True).first()
-            return suscripcion_activa and suscripcion_activa.fecha_fin >= date.today()
+            # `estado` se sincroniza al guardar suscripciones y con sweep_memberships
+            return self.estado == 'activo'
         else:
             # Los socios externos no tienen 'pagos', tienen 'inscripcion_clase' y se asumen activos para poder registrar su próximo pago por clase.
             return True
     activo = property(is_activo)
 
+    @property
+    def suscripcion_activa(self):
+        # Los socios externos pagan por clase: no tienen suscripción vigente
+        if self.tipo_socio != 'interno':
+            return None
+        # Usa la precarga de with_current_subscription() si está disponible
+        if hasattr(self, '_suscripcion_actual'):
+            return self._suscripcion_actual[0] if self._suscripcion_actual else None
+        return self.suscripciones.order_by(*Suscripcion.ORDEN_ACTUAL).first()
+
+class SocioTermino(models.Model):
+    """Palabras normalizadas de cada socio para la búsqueda por prefijo."""
+    socio = models.ForeignKey(Socio, on_delete=models.CASCADE, related_name='terminos')
+    termino = models.CharField(max_length=50)
+
+    class Meta:
+        unique_together = ('socio', 'termino')
+        indexes = [
+            models.Index(fields=['termino', 'socio'], name='socio_termino_idx'),
+        ]
+
+    def __str__(self):
+        return self.termino
+
 # Tabla Suscripcion Intenos
 class Suscripcion(models.Model):
     id_suscripcion = models.CharField(max_length=100, unique=True, primary_key=False)
@@ -75,34 +179,74 @@ class Suscripcion(models.Model):
         related_name='suscripcion_asociada'
     )
 
+    # Primero la activa; si no hay, la de inicio más reciente
+    ORDEN_ACTUAL = ('-activa', '-fecha_inicio', '-pk')
+
+    def asignar_monto_y_fin(self):
+        """Calcula monto_total y fecha_fin según el tipo (también para bulk_create)."""
+        if isinstance(self.fecha_inicio, str):
+            try:
+                fecha_obj = datetime.strptime(self.fecha_inicio, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError("Formato de fecha inválido. Usa YYYY-MM-DD.")
+        else:
+            fecha_obj = self.fecha_inicio
+
+        # === ASIGNAR MONTO Y FECHA FIN ===
+        if self.tipo == 'mensual':
+            self.monto_total = 500
+            self.fecha_fin = fecha_obj + timedelta(days=30)
+        elif self.tipo == 'trimestral':
+            self.monto_total = 1500
+            self.fecha_fin = fecha_obj + timedelta(days=90)
+        elif self.tipo == 'anual':
+            self.monto_total = 6000
+            self.fecha_fin = fecha_obj + timedelta(days=365)
+
     def save(self, *args, **kwargs):
         if not self.pk:
-            if isinstance(self.fecha_inicio, str):
-                try:
-                    fecha_obj = datetime.strptime(self.fecha_inicio, '%Y-%m-%d').date()
-                except ValueError:
-                    raise ValueError("Formato de fecha inválido. Usa YYYY-MM-DD.")
-            else:
-                fecha_obj = self.fecha_inicio
-
-            # === ASIGNAR MONTO Y FECHA FIN ===
-            if self.tipo == 'mensual':
-                self.monto_total = 500
-                self.fecha_fin = fecha_obj + timedelta(days=30)
-            elif self.tipo == 'trimestral':
-                self.monto_total = 1500
-                self.fecha_fin = fecha_obj + timedelta(days=90)
-            elif self.tipo == 'anual':
-                self.monto_total = 6000
-                self.fecha_fin = fecha_obj + timedelta(days=365)
+            self.asignar_monto_y_fin()
+
+        if isinstance(self.fecha_fin, date) and self.fecha_fin < date.today():
+            self.activa = False
 
         super().save(*args, **kwargs)
+        Socio.objects.filter(pk=self.socio_id).sync_membership_status()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['activa', 'fecha_fin'], name='suscripcion_activa_fin_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id_suscripcion} - Suscripción {self.get_tipo_display()} para {self.socio}"
 
 
 
+# Modelo para ClaseSerie
+class ClaseSerie(models.Model):
+    """Regla de una clase recurrente (p. ej. lunes y miércoles 07:00 hasta fin de semestre)."""
+    DIAS_SEMANA = (
+        (0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'),
+        (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo'),
+    )
+    nombre = models.CharField(max_length=100)
+    descripcion = models.TextField(blank=True)
+    entrenador = models.ForeignKey(Entrenador, on_delete=models.CASCADE, related_name='series')
+    dias_semana = models.JSONField(default=list)  # Lista de enteros, 0 = lunes
+    hora = models.TimeField()
+    duracion_minutos = models.IntegerField(default=60)
+    max_participantes = models.IntegerField(default=20)
+    precio = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    generada_hasta = models.DateField(null=True, blank=True, editable=False)  # Último día materializado
+    creada = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        dias = ', '.join(dict(self.DIAS_SEMANA)[d] for d in sorted(self.dias_semana))
+        return f"{self.nombre} - {dias} {self.hora:%H:%M} ({self.fecha_inicio} a {self.fecha_fin})"
+
 # Modelo para Clase
 class Clase(models.Model):
     id_clase = models.CharField(max_length=100, unique=True, primary_key=False)
@@ -113,14 +257,25 @@ class Clase(models.Model):
     entrenador = models.ForeignKey(Entrenador, on_delete=models.CASCADE)
     max_participantes = models.IntegerField(default=20)
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
-    participantes = models.ManyToManyField(Socio, blank=True, related_name='clases_inscritas')
+    # Única fuente de las inscripciones: cada fila de InscripcionClase es un participante
+    participantes = models.ManyToManyField(Socio, through='InscripcionClase', blank=True, related_name='clases_inscritas')
+    ocupados = models.PositiveIntegerField(default=0, editable=False)  # Lo mantiene gimnasio.inscripciones
+    espera_turnos = models.PositiveIntegerField(default=0, editable=False)  # Último turno entregado en la lista de espera
+    actualizado = models.DateTimeField(auto_now=True)
+    serie = models.ForeignKey(ClaseSerie, on_delete=models.SET_NULL, null=True, blank=True, related_name='clases')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_hora'], name='clase_fecha_hora_idx'),
+            models.Index(fields=['entrenador', 'fecha_hora'], name='clase_entrenador_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id_clase} - {self.nombre} - {self.fecha_hora} ({self.entrenador.nombre}) - ${self.precio}"
 
     @property
     def participantes_actuales(self):
-        return self.participantes.count()
+        return self.ocupados
 
 # Modelo para InscripcionClase
 class InscripcionClase(models.Model):
@@ -142,18 +297,93 @@ class InscripcionClase(models.Model):
     def __str__(self):
         return f"{self.id_inscripcion} - Inscripción de {self.socio} a {self.clase.nombre}"
 
+    @staticmethod
+    def generar_id(socio, clase):
+        return f"INS{date.today().strftime('%Y%m%d')}-{socio.id_socio}-{clase.id_clase}"
+
     def save(self, *args, **kwargs):
         if self.socio.tipo_socio == 'interno' and not self.socio.activo:
             raise ValueError("Los socios internos deben tener suscripción activa para acceder al gym.")
+        if not self.id_inscripcion:
+            self.id_inscripcion = self.generar_id(self.socio, self.clase)
         super().save(*args, **kwargs)
 
+# Lista de espera de una clase llena: se promueve por orden de `posicion` al liberarse un lugar
+class ListaEspera(models.Model):
+    clase = models.ForeignKey(Clase, on_delete=models.CASCADE, related_name='lista_espera')
+    socio = models.ForeignKey(Socio, on_delete=models.CASCADE, related_name='esperas')
+    posicion = models.PositiveIntegerField()
+    metodo_pago = models.CharField(max_length=20, default='efectivo')  # Se cobra al promoverlo
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['posicion']
+        unique_together = (('clase', 'socio'), ('clase', 'posicion'))
+
+    def __str__(self):
+        return f"{self.socio} en espera para {self.clase.nombre} (turno {self.posicion})"
+
+class ProductoQuerySet(models.QuerySet):
+    """Los cambios masivos también invalidan el catálogo en memoria (gimnasio.catalogo)."""
+
+    def bulk_create(self, *args, **kwargs):
+        creados = super().bulk_create(*args, **kwargs)
+        invalidar_catalogo()
+        return creados
+
+    def bulk_update(self, *args, **kwargs):
+        filas = super().bulk_update(*args, **kwargs)
+        invalidar_catalogo()
+        return filas
+
+    def update(self, **kwargs):
+        filas = super().update(**kwargs)
+        # Las ventas solo tocan el stock: no cambian el catálogo
+        if filas and set(kwargs) != {'stock'}:
+            invalidar_catalogo()
+        return filas
+
+    def delete(self):
+        resultado = super().delete()
+        invalidar_catalogo()
+        return resultado
+
+
 class Producto(models.Model):
     nombre = models.CharField(max_length=120)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
+    # None: el producto no lleva inventario y se vende sin límite
+    stock = models.IntegerField(null=True, blank=True)
+    stock_minimo = models.IntegerField(default=0, help_text="Con esta existencia o menos el producto aparece para reponer")
+
+    objects = ProductoQuerySet.as_manager()
+
+    class Meta:
+        permissions = [
+            ('cambiar_precio_venta', 'Puede cobrar un precio distinto al de catálogo'),
+        ]
+        indexes = [
+            # Para gimnasio.inventario.por_reponer (stock - stock_minimo <= 0)
+            models.Index(F('stock') - F('stock_minimo'), name='producto_margen_stock_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='producto_stock_no_negativo'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} (${self.precio})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            invalidar_catalogo()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            invalidar_catalogo()
+        return resultado
+
 
 class Caja(models.Model):
     METODOS = (
@@ -161,16 +391,35 @@ class Caja(models.Model):
         ("tarjeta", "Tarjeta"),
         ("transferencia", "Transferencia"),
     )
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Por defecto ahora; las ventas sin conexión guardan la hora en que se cobraron
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"))
     metodo_pago = models.CharField(max_length=20, choices=METODOS, default="efectivo")
     cliente = models.CharField(max_length=120, blank=True)
     observacion = models.TextField(blank=True)
+    # sha256 del PDF guardado en TICKETS_DIR; vacío si aún no se generó (lo mantiene gimnasio.tickets)
+    ticket = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Reporte de ingresos por producto (rango de fechas)
+            models.Index(fields=['fecha'], name='caja_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Caja #{self.pk} - {self.fecha:%d/%m/%Y %H:%M} - ${self.total}"
 
 
+# Clave generada por el punto de venta para no registrar dos veces la misma venta al reintentar
+class ClaveVenta(models.Model):
+    clave = models.CharField(max_length=64, unique=True)
+    venta = models.OneToOneField(Caja, on_delete=models.CASCADE, related_name='clave_offline')
+    recibida = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.clave} -> Caja #{self.venta_id}"
+
+
 class VentaItem(models.Model):
     venta = models.ForeignKey(Caja, related_name="items", on_delete=models.CASCADE)
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT)
@@ -182,6 +431,31 @@ class VentaItem(models.Model):
         return f"{self.producto} x{self.cantidad}"
 
 
+
+class MovimientoStock(models.Model):
+    MOTIVOS = [
+        ("venta", "Venta"),
+        ("ajuste", "Ajuste"),
+        # Unidades vendidas sin conexión que el stock registrado no cubría
+        ("faltante", "Faltante"),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos_stock')
+    fecha = models.DateTimeField(auto_now_add=True)
+    # Positiva para entradas, negativa para salidas
+    cantidad = models.IntegerField()
+    motivo = models.CharField(max_length=20, choices=MOTIVOS)
+    venta = models.ForeignKey(Caja, null=True, blank=True, on_delete=models.SET_NULL, related_name='movimientos_stock')
+    descripcion = models.CharField(max_length=200, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='movstock_producto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} {self.cantidad:+d} ({self.get_motivo_display()})"
+
 class CajaMovimiento(models.Model):
     METODOS = [
         ("efectivo", "Efectivo"),
@@ -195,7 +469,8 @@ class CajaMovimiento(models.Model):
         ("otro", "Otro"),
     ]
 
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Igual a Caja.fecha en las ventas, así el cierre cuenta la venta en el día en que se cobró
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     tipo = models.CharField(max_length=20, choices=TIPOS, default="producto")
     descripcion = models.CharField(max_length=200, blank=True, default="")
     metodo_pago = models.CharField(max_length=20, choices=METODOS, default="efectivo")
@@ -216,8 +491,55 @@ class CajaMovimiento(models.Model):
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Rangos de fecha (cierres, exportaciones) y libro de caja por cursor (-fecha, -id)
+            models.Index(fields=['fecha', 'id'], name='cajamovimiento_fecha_id_idx'),
+        ]
         verbose_name = 'Movimiento de caja'
         verbose_name_plural = 'Movimientos de caja'
 
     def __str__(self):
-        return f"{self.get_tipo_display()} - ${self.monto:.2f} ({self.get_metodo_pago_display()})"
\ No newline at end of file
+        return f"{self.get_tipo_display()} - ${self.monto:.2f} ({self.get_metodo_pago_display()})"
+
+    @property
+    def concepto(self):
+        """Texto del libro de caja; CajaView precarga socio, suscripción e inscripción."""
+        socio = f" - {self.socio.nombre} {self.socio.apellido}" if self.socio_id else ""
+        if self.tipo == 'mensualidad' and self.suscripcion_id:
+            return f"Suscripción {self.suscripcion.get_tipo_display()}{socio}"
+        if self.tipo == 'clase' and self.inscripcion_clase_id:
+            return f"Clase: {self.inscripcion_clase.clase.nombre}{socio}"
+        return self.descripcion
+
+# Totales diarios de caja por método de pago y tipo; se mantienen en gimnasio.cierres al escribir movimientos
+class CierreCaja(models.Model):
+    fecha = models.DateField()
+    metodo_pago = models.CharField(max_length=20, choices=CajaMovimiento.METODOS)
+    tipo = models.CharField(max_length=20, choices=CajaMovimiento.TIPOS)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    movimientos = models.PositiveIntegerField(default=0)
+    # True cuando close_day recalculó el día desde los movimientos
+    cerrado = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('fecha', 'metodo_pago', 'tipo')
+        ordering = ['-fecha', 'metodo_pago', 'tipo']
+        verbose_name = 'Cierre de caja'
+        verbose_name_plural = 'Cierres de caja'
+
+    def __str__(self):
+        return f"{self.fecha} {self.get_metodo_pago_display()} / {self.get_tipo_display()}: ${self.total:.2f}"
+
+class Secuencia(models.Model):
+    """Contador por prefijo para los IDs legibles (S001, SUB001, 001...)."""
+    nombre = models.CharField(max_length=30, unique=True)
+    ultimo_valor = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_valor}"
+
+
+@receiver(post_delete, sender=Suscripcion)
+def _suscripcion_borrada(sender, instance, **kwargs):
+    # Cubre Suscripcion.delete() y también QuerySet.delete() (admin, API, socio.suscripciones.all().delete())
+    Socio.objects.filter(pk=instance.socio_id).sync_membership_status()
@@ -0,0 +1,120 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+POR_PAGINA_DEFECTO = 25
+POR_PAGINA_MAXIMO = 100
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder recorta los datetime a milisegundos: en un cursor eso saltaría filas
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(direccion, valores):
+    data = json.dumps({'d': direccion, 'v': valores}, cls=_CursorEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (direccion, valores) o None si el cursor está vacío o es inválido."""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direccion, valores = data['d'], data['v']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+    if direccion not in ('n', 'p') or not isinstance(valores, list):
+        return None
+    return direccion, valores
+
+
+def leer_por_pagina(valor, defecto=POR_PAGINA_DEFECTO, maximo=POR_PAGINA_MAXIMO):
+    try:
+        return max(1, min(int(valor), maximo))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _filtro_posterior(campos, valores):
+    """
+    Condición "fila estrictamente después de `valores`" según el orden de
+    `campos`, expandida como (a > x) OR (a = x AND b > y) OR ...
+    """
+    filtro = Q()
+    for i, campo in enumerate(campos):
+        nombre = campo.lstrip('-')
+        lookup = 'lt' if campo.startswith('-') else 'gt'
+        condicion = Q(**{f'{nombre}__{lookup}': valores[i]})
+        for previo, valor in zip(campos[:i], valores[:i]):
+            condicion &= Q(**{previo.lstrip('-'): valor})
+        filtro |= condicion
+    return filtro
+
+
+def _invertir(campos):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in campos]
+
+
+def paginar_keyset(queryset, campos, cursor=None, por_pagina=POR_PAGINA_DEFECTO):
+    """
+    Pagina `queryset` por cursor sobre `campos` (el último debe ser único,
+    p. ej. el id). Cada página cuesta una sola consulta indexada, sin OFFSET.
+    """
+    campos = list(campos)
+    decodificado = decodificar_cursor(cursor)
+    if decodificado and len(decodificado[1]) != len(campos):
+        decodificado = None
+    hacia_atras = bool(decodificado) and decodificado[0] == 'p'
+
+    orden = _invertir(campos) if hacia_atras else campos
+    qs = queryset.order_by(*orden)
+    if decodificado:
+        qs = qs.filter(_filtro_posterior(orden, decodificado[1]))
+
+    filas = list(qs[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if hacia_atras:
+        filas.reverse()
+
+    def clave(obj):
+        return [getattr(obj, campo.lstrip('-')) for campo in campos]
+
+    next_cursor = prev_cursor = None
+    if filas:
+        if hay_mas or hacia_atras:
+            next_cursor = codificar_cursor('n', clave(filas[-1]))
+        if (hay_mas and hacia_atras) or (decodificado and not hacia_atras):
+            prev_cursor = codificar_cursor('p', clave(filas[0]))
+    return KeysetPage(filas, next_cursor, prev_cursor)
@@ -0,0 +1,105 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .cierres import inicio_del_dia, version_cierres
+from .models import CajaMovimiento, CierreCaja, VentaItem
+
+
+# ?bucket= -> tipo de Trunc
+PERIODOS = {'day': 'day', 'week': 'week', 'month': 'month'}
+AGRUPACIONES = ('tipo', 'metodo_pago', 'producto')
+REPORTE_MAX_DIAS = 731
+
+NOMBRES = {
+    'tipo': dict(CajaMovimiento.TIPOS),
+    'metodo_pago': dict(CajaMovimiento.METODOS),
+}
+
+
+class ReporteError(ValueError):
+    pass
+
+
+def _filas_cierres(desde, hasta, kind, agrupar):
+    """Totales por periodo desde CierreCaja: O(días), no O(movimientos)."""
+    return (
+        CierreCaja.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        .annotate(periodo=Trunc('fecha', kind, output_field=DateField()))
+        .values('periodo', grupo=F(agrupar))
+        .annotate(total=Sum('total'), cantidad=Sum('movimientos'))
+        .order_by('periodo', 'grupo')
+    )
+
+
+def _filas_productos(desde, hasta, kind):
+    """Ventas por producto y periodo; se agrupa en SQL sobre el rango de Caja.fecha."""
+    return (
+        VentaItem.objects.filter(
+            venta__fecha__gte=inicio_del_dia(desde), venta__fecha__lt=inicio_del_dia(hasta + timedelta(days=1)),
+        )
+        .annotate(periodo=Trunc('venta__fecha', kind, output_field=DateField()))
+        .values('periodo', 'producto__nombre', grupo=F('producto_id'))
+        .annotate(total=Sum('subtotal'), cantidad=Sum('cantidad'))
+        .order_by('periodo', 'grupo')
+    )
+
+
+def _calcular(desde, hasta, bucket, agrupar):
+    kind = PERIODOS[bucket]
+    if agrupar == 'producto':
+        filas = _filas_productos(desde, hasta, kind)
+    else:
+        filas = _filas_cierres(desde, hasta, kind, agrupar)
+
+    periodos = {}
+    for fila in filas:
+        periodo = periodos.setdefault(fila['periodo'], {'periodo': fila['periodo'], 'total': Decimal('0.00'), 'grupos': []})
+        nombre = fila.pop('producto__nombre', None) or NOMBRES.get(agrupar, {}).get(fila['grupo'], fila['grupo'])
+        periodo['total'] += fila['total']
+        periodo['grupos'].append({
+            'grupo': fila['grupo'], 'nombre': nombre, 'total': fila['total'], 'cantidad': fila['cantidad'],
+        })
+    lista = list(periodos.values())
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'bucket': bucket,
+        'group_by': agrupar,
+        'total': sum((periodo['total'] for periodo in lista), Decimal('0.00')),
+        'periodos': lista,
+    }
+
+
+def ingresos(desde, hasta, bucket='day', agrupar='tipo'):
+    """
+    Ingresos entre `desde` y `hasta` (ambos inclusive) agrupados por periodo
+    y por tipo, método de pago o producto. Si todos los días del rango ya
+    pasaron por close_day el resultado no puede cambiar y se guarda en caché
+    sin vencimiento; la versión de los cierres entra en la clave porque
+    close_day puede volver a cerrar un día con otros totales (o sin filas).
+    """
+    if bucket not in PERIODOS:
+        raise ReporteError(f"bucket debe ser uno de: {', '.join(PERIODOS)}.")
+    if agrupar not in AGRUPACIONES:
+        raise ReporteError(f"group_by debe ser uno de: {', '.join(AGRUPACIONES)}.")
+    if hasta < desde or (hasta - desde).days >= REPORTE_MAX_DIAS:
+        raise ReporteError(f'El rango debe ser válido y de máximo {REPORTE_MAX_DIAS} días.')
+
+    if hasta >= timezone.localdate():
+        return _calcular(desde, hasta, bucket, agrupar)
+
+    abiertos = CierreCaja.objects.filter(fecha__gte=desde, fecha__lte=hasta, cerrado=False).exists()
+    if abiertos:
+        return _calcular(desde, hasta, bucket, agrupar)
+
+    clave = f"reporte_ingresos:{desde:%Y%m%d}:{hasta:%Y%m%d}:{bucket}:{agrupar}:{version_cierres()}"
+    reporte = cache.get(clave)
+    if reporte is None:
+        reporte = _calcular(desde, hasta, bucket, agrupar)
+        cache.set(clave, reporte, timeout=None)
+    return reporte
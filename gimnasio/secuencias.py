@@ -0,0 +1,77 @@
+import re
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Clase, Entrenador, Secuencia, Socio, Suscripcion
+
+
+# nombre de secuencia -> (modelo, campo, prefijo, dígitos mínimos)
+SECUENCIAS = {
+    'socio': (Socio, 'id_socio', 'S', 3),
+    'suscripcion': (Suscripcion, 'id_suscripcion', 'SUB', 3),
+    'entrenador': (Entrenador, 'id_entrenador', '', 3),
+    'clase': (Clase, 'id_clase', 'C', 3),
+}
+
+
+def formatear_id(nombre, valor):
+    _, _, prefijo, digitos = SECUENCIAS[nombre]
+    return f"{prefijo}{valor:0{digitos}d}"
+
+
+def maximo_existente(nombre):
+    """Mayor número ya usado en la tabla (solo para reconciliar, recorre la tabla)."""
+    modelo, campo, prefijo, _ = SECUENCIAS[nombre]
+    patron = re.compile(rf'^{re.escape(prefijo)}(\d+)$')
+    maximo = 0
+    valores = modelo.objects.filter(**{f'{campo}__startswith': prefijo}).values_list(campo, flat=True)
+    for valor in valores.iterator(chunk_size=2000):
+        coincidencia = patron.match(valor)
+        if coincidencia:
+            maximo = max(maximo, int(coincidencia.group(1)))
+    return maximo
+
+
+def reconciliar(nombre):
+    """Adelanta el contador hasta el mayor ID existente; nunca lo retrocede."""
+    maximo = maximo_existente(nombre)
+    with transaction.atomic():
+        secuencia, created = Secuencia.objects.select_for_update().get_or_create(
+            nombre=nombre, defaults={'ultimo_valor': maximo}
+        )
+        if not created and secuencia.ultimo_valor < maximo:
+            secuencia.ultimo_valor = maximo
+            secuencia.save(update_fields=['ultimo_valor'])
+    return secuencia.ultimo_valor
+
+
+def reservar(nombre, cantidad=1):
+    """
+    Reserva `cantidad` valores consecutivos con un único UPDATE sobre la fila
+    del contador (que queda bloqueada hasta el fin de la transacción) y
+    devuelve el rango reservado.
+    """
+    if nombre not in SECUENCIAS:
+        raise ValueError(f"Secuencia desconocida: {nombre}")
+    if cantidad < 1:
+        raise ValueError("La cantidad a reservar debe ser al menos 1.")
+
+    with transaction.atomic():
+        actualizadas = Secuencia.objects.filter(nombre=nombre).update(ultimo_valor=F('ultimo_valor') + cantidad)
+        if not actualizadas:
+            # Primera vez: se inicializa a partir de los datos existentes
+            reconciliar(nombre)
+            Secuencia.objects.filter(nombre=nombre).update(ultimo_valor=F('ultimo_valor') + cantidad)
+        ultimo = Secuencia.objects.filter(nombre=nombre).values_list('ultimo_valor', flat=True).get()
+
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def siguiente_id(nombre):
+    return formatear_id(nombre, reservar(nombre)[0])
+
+
+def reservar_ids(nombre, cantidad):
+    """Bloque de IDs para importaciones masivas."""
+    return [formatear_id(nombre, valor) for valor in reservar(nombre, cantidad)]
@@ -1,6 +1,11 @@
 from rest_framework import serializers
-from .models import Entrenador, Clase, Socio, Suscripcion
+from django.db import transaction
+from .models import CajaMovimiento, Entrenador, Clase, ClaseSerie, Socio, Suscripcion
 from .security import sanitize_text_input, validate_email, validate_phone, validate_socio_id
+from .agenda import ConflictoHorario, validar_disponibilidad, validar_duracion
+from .secuencias import siguiente_id
+from .series import aplicar_cambios, materializar
+from .inscripciones import LOTE_MAXIMO, InscripcionError, llenar_desde_espera, sincronizar_participantes
 
 class EntrenadorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,7 +33,9 @@ class EntrenadorSerializer(serializers.ModelSerializer):
         return value
 
 class ClaseSerializer(serializers.ModelSerializer):
+    # Solo con ?include=participantes (IDs); el detalle paginado está en /api/clases/{id}/participantes/
     participantes = serializers.SerializerMethodField(read_only=True)
+    participantes_count = serializers.SerializerMethodField(read_only=True)
     participantes_ids = serializers.PrimaryKeyRelatedField(
         source='participantes', many=True, queryset=Socio.objects.all(), write_only=True, required=False
     )
@@ -43,6 +50,10 @@ class ClaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Clase
         fields = '__all__'
+        extra_kwargs = {
+            'id_clase': {'required': False},  # Si no viene se asigna de la secuencia
+            'serie': {'read_only': True},
+        }
 
     def validate_nombre(self, value):
         """Sanitiza y valida el nombre de la clase."""
@@ -69,8 +80,170 @@ class ClaseSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("El máximo de participantes debe ser mayor a 0.")
         return value
 
+    def validate_duracion_minutos(self, value):
+        """Valida que la duración esté dentro del rango permitido."""
+        try:
+            return validar_duracion(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validar_agenda(self, datos, instance=None):
+        """
+        Rechaza clases que se cruzan con otra del mismo entrenador. Se llama en
+        la transacción de create/update: la validación y el guardado quedan
+        serializados por el bloqueo del entrenador.
+        """
+        entrenador = datos.get('entrenador', getattr(instance, 'entrenador', None))
+        fecha_hora = datos.get('fecha_hora', getattr(instance, 'fecha_hora', None))
+        duracion = datos.get('duracion_minutos', getattr(instance, 'duracion_minutos', 60))
+        if entrenador and fecha_hora:
+            try:
+                validar_disponibilidad(entrenador.pk, fecha_hora, duracion, excluir_pk=getattr(instance, 'pk', None))
+            except ConflictoHorario as e:
+                raise serializers.ValidationError({'non_field_errors': [str(e)]})
+
+    def incluye_participantes(self):
+        request = self.context.get('request')
+        if request is None:
+            return False
+        incluidos = request.query_params.get('include', '').split(',')
+        return 'participantes' in incluidos
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.incluye_participantes():
+            fields.pop('participantes')
+        return fields
+
     def get_participantes(self, obj):
-        return SocioSerializer(obj.participantes.all(), many=True).data
+        return [socio.pk for socio in obj.participantes.all()]
+
+    def get_participantes_count(self, obj):
+        return obj.ocupados
+
+    # participantes_ids reemplaza las inscripciones pasando por gimnasio.inscripciones (cobro, cupo, lista de espera)
+    def create(self, validated_data):
+        participantes = validated_data.pop('participantes', None)
+        if not validated_data.get('id_clase'):
+            validated_data['id_clase'] = siguiente_id('clase')
+        with transaction.atomic():
+            self.validar_agenda(validated_data)
+            clase = super().create(validated_data)
+            if participantes is not None:
+                self.sincronizar_participantes(clase, participantes)
+        return clase
+
+    def update(self, instance, validated_data):
+        participantes = validated_data.pop('participantes', None)
+        with transaction.atomic():
+            self.validar_agenda(validated_data, instance)
+            clase = super().update(instance, validated_data)
+            if participantes is not None:
+                self.sincronizar_participantes(clase, participantes)
+            elif 'max_participantes' in validated_data:
+                llenar_desde_espera(clase)
+        return clase
+
+    def sincronizar_participantes(self, clase, participantes):
+        try:
+            sincronizar_participantes(clase, participantes)
+        except InscripcionError as e:
+            raise serializers.ValidationError({'participantes_ids': [str(e)]})
+
+class ClaseSerieSerializer(serializers.ModelSerializer):
+    dias_semana = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), allow_empty=False
+    )
+    entrenador_nombre = serializers.ReadOnlyField(source='entrenador.nombre')
+    total_clases = serializers.IntegerField(read_only=True)
+
+    # Una serie se materializa completa en una transacción: se limita su duración
+    MAXIMO_DIAS = 366
+
+    class Meta:
+        model = ClaseSerie
+        fields = '__all__'
+
+    def validate_nombre(self, value):
+        """Sanitiza y valida el nombre de la serie."""
+        value = sanitize_text_input(value)
+        if not value or len(value) < 2:
+            raise serializers.ValidationError("El nombre de la clase debe tener al menos 2 caracteres.")
+        return value
+
+    def validate_descripcion(self, value):
+        if value:
+            value = sanitize_text_input(value)
+        return value
+
+    def validate_dias_semana(self, value):
+        return sorted(set(value))
+
+    def validate_duracion_minutos(self, value):
+        try:
+            return validar_duracion(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate_max_participantes(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("El máximo de participantes debe ser mayor a 0.")
+        return value
+
+    def validate_precio(self, value):
+        if value < 0:
+            raise serializers.ValidationError("El precio no puede ser negativo.")
+        return value
+
+    def validate(self, attrs):
+        instance = self.instance
+        if instance is not None:
+            # Cambiar el patrón de días reordenaría clases con inscritos: se crea otra serie
+            for campo in ('dias_semana', 'fecha_inicio'):
+                if campo in attrs and attrs[campo] != getattr(instance, campo):
+                    raise serializers.ValidationError({campo: "No se puede cambiar en una serie existente; crea una nueva."})
+        fecha_inicio = attrs.get('fecha_inicio', getattr(instance, 'fecha_inicio', None))
+        fecha_fin = attrs.get('fecha_fin', getattr(instance, 'fecha_fin', None))
+        if fecha_inicio and fecha_fin:
+            if fecha_fin < fecha_inicio:
+                raise serializers.ValidationError({'fecha_fin': "La fecha de fin debe ser posterior a la de inicio."})
+            if (fecha_fin - fecha_inicio).days > self.MAXIMO_DIAS:
+                raise serializers.ValidationError({'fecha_fin': f"Una serie no puede durar más de {self.MAXIMO_DIAS} días."})
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                serie = super().create(validated_data)
+                clases, _ = materializar(serie)
+        except ConflictoHorario as e:
+            raise serializers.ValidationError(str(e))
+        serie.total_clases = len(clases)
+        return serie
+
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                serie = aplicar_cambios(instance, validated_data)
+                # Si se alargó fecha_fin se completa el horizonte
+                materializar(serie, omitir_conflictos=True)
+        except ConflictoHorario as e:
+            raise serializers.ValidationError(str(e))
+        serie.total_clases = serie.clases.count()
+        return serie
+
+
+class InscripcionLoteSerializer(serializers.Serializer):
+    """Entrada de /api/clases/{id}/inscripciones/bulk/"""
+    socios = serializers.ListField(
+        child=serializers.CharField(max_length=100), allow_empty=False, max_length=LOTE_MAXIMO
+    )
+    metodo_pago = serializers.ChoiceField(choices=CajaMovimiento.METODOS, default='efectivo')
+    lista_espera = serializers.BooleanField(default=False)
+
+    def validate_socios(self, value):
+        return [id_socio.strip().upper() for id_socio in value]
+
 
 class SocioSerializer(serializers.ModelSerializer):
     class Meta:
@@ -110,6 +283,12 @@ class SocioSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("El domicilio no puede estar vacío.")
         return value
 
+class SocioCompactoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Socio
+        fields = ('id', 'id_socio', 'nombre', 'apellido', 'telefono', 'tipo_socio', 'estado')
+
+
 class SuscripcionSerializer(serializers.ModelSerializer):
     # lectura: objeto completo; escritura: enviar socio_id
     socio = SocioSerializer(read_only=True)
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .agenda import ConflictoHorario, bloquear_entrenador, conflictos_en_lote
+from .inscripciones import llenar_desde_espera
+from .models import Clase, ClaseSerie
+from .secuencias import reservar_ids
+
+
+# Días por delante que se materializan al crear la serie y en cada corrida de extend_class_series
+HORIZONTE_DIAS = 90
+
+# Campos de la serie que se copian tal cual a sus clases futuras
+CAMPOS_EN_CASCADA = ('nombre', 'descripcion', 'entrenador', 'duracion_minutos', 'max_participantes', 'precio')
+
+
+def ocurrencias(serie, desde, hasta):
+    """Fechas y horas (aware) de la serie entre `desde` y `hasta`, ambos inclusive."""
+    dias = set(serie.dias_semana)
+    dia = max(desde, serie.fecha_inicio)
+    fin = min(hasta, serie.fecha_fin)
+    while dia <= fin:
+        if dia.weekday() in dias:
+            yield timezone.make_aware(datetime.combine(dia, serie.hora))
+        dia += timedelta(days=1)
+
+
+def _mensaje_conflictos(conflictos):
+    detalle = ', '.join(
+        f"{timezone.localtime(inicio):%d/%m/%Y %H:%M} con {clase.nombre}" for inicio, clase in conflictos[:5]
+    )
+    extra = f" y {len(conflictos) - 5} más" if len(conflictos) > 5 else ''
+    return f"El entrenador ya tiene clase en ese horario: {detalle}{extra}."
+
+
+def materializar(serie, dias=HORIZONTE_DIAS, omitir_conflictos=False):
+    """
+    Crea con un solo bulk_create las clases de la serie desde el último día
+    ya generado hasta `dias` por delante (contados desde hoy, o desde el
+    inicio si la serie aún no empezó). Nunca crea clases en el pasado.
+    Con omitir_conflictos las fechas que chocan con otra clase del entrenador
+    se saltan; si no, se lanza ConflictoHorario y no se crea nada.
+    Devuelve (clases creadas, fechas omitidas).
+    """
+    with transaction.atomic():
+        # El bloqueo evita que dos corridas generen las mismas fechas
+        serie = ClaseSerie.objects.select_for_update().get(pk=serie.pk)
+        hasta = min(max(timezone.localdate(), serie.fecha_inicio) + timedelta(days=dias), serie.fecha_fin)
+        desde = serie.generada_hasta + timedelta(days=1) if serie.generada_hasta else serie.fecha_inicio
+        desde = max(desde, timezone.localdate())
+        if desde > hasta:
+            return [], []
+
+        ahora = timezone.now()
+        inicios = [inicio for inicio in ocurrencias(serie, desde, hasta) if inicio >= ahora]
+        bloquear_entrenador(serie.entrenador_id)
+        conflictos = conflictos_en_lote(serie.entrenador_id, inicios, serie.duracion_minutos)
+        if conflictos and not omitir_conflictos:
+            raise ConflictoHorario(_mensaje_conflictos(conflictos), [clase for _, clase in conflictos])
+        omitidas = sorted({inicio for inicio, _ in conflictos})
+        libres = [inicio for inicio in inicios if inicio not in omitidas]
+
+        ids = reservar_ids('clase', len(libres)) if libres else []
+        clases = Clase.objects.bulk_create([
+            Clase(
+                id_clase=id_clase, serie=serie, fecha_hora=inicio,
+                **{campo: getattr(serie, campo) for campo in CAMPOS_EN_CASCADA},
+            )
+            for id_clase, inicio in zip(ids, libres)
+        ])
+        ClaseSerie.objects.filter(pk=serie.pk).update(generada_hasta=hasta)
+    return clases, omitidas
+
+
+def aplicar_cambios(serie, cambios):
+    """
+    Guarda los cambios de la serie y los propaga a sus clases futuras con
+    UPDATEs por conjunto. Las clases ya pasadas no se tocan; las futuras que
+    quedan fuera de un fecha_fin más corto se borran si no tienen inscritos.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        serie = ClaseSerie.objects.select_for_update().get(pk=serie.pk)
+        futuras = Clase.objects.filter(serie=serie, fecha_hora__gte=ahora)
+
+        # Cambio de hora: cada clase conserva su fecha local y toma la hora nueva
+        # (sumar una diferencia fija fallaría en los cambios de horario de verano)
+        filas = list(futuras.values_list('pk', 'fecha_hora'))
+        nuevas_fechas = {}
+        if 'hora' in cambios and cambios['hora'] != serie.hora:
+            nuevas_fechas = {
+                pk: timezone.make_aware(datetime.combine(timezone.localtime(fecha).date(), cambios['hora']))
+                for pk, fecha in filas
+            }
+
+        entrenador = cambios.get('entrenador', serie.entrenador)
+        duracion = cambios.get('duracion_minutos', serie.duracion_minutos)
+        if entrenador != serie.entrenador or duracion != serie.duracion_minutos or nuevas_fechas:
+            bloquear_entrenador(entrenador.pk)
+            conflictos = conflictos_en_lote(
+                entrenador.pk, [nuevas_fechas.get(pk, fecha) for pk, fecha in filas], duracion,
+                excluir=[pk for pk, _ in filas],
+            )
+            if conflictos:
+                raise ConflictoHorario(_mensaje_conflictos(conflictos), [clase for _, clase in conflictos])
+
+        for campo, valor in cambios.items():
+            setattr(serie, campo, valor)
+        serie.save()
+
+        if 'fecha_fin' in cambios:
+            limite = timezone.make_aware(datetime.combine(serie.fecha_fin + timedelta(days=1), datetime.min.time()))
+            futuras.filter(fecha_hora__gte=limite, ocupados=0).delete()
+            if serie.generada_hasta and serie.generada_hasta > serie.fecha_fin:
+                serie.generada_hasta = serie.fecha_fin
+                ClaseSerie.objects.filter(pk=serie.pk).update(generada_hasta=serie.fecha_fin)
+
+        # auto_now no se aplica en update(): se marca a mano para los ETag de los calendarios
+        valores = {campo: cambios[campo] for campo in CAMPOS_EN_CASCADA if campo in cambios}
+        if valores:
+            futuras.update(actualizado=ahora, **valores)
+        if nuevas_fechas:
+            Clase.objects.bulk_update(
+                [Clase(pk=pk, fecha_hora=fecha, actualizado=ahora) for pk, fecha in nuevas_fechas.items()],
+                ['fecha_hora', 'actualizado'], batch_size=500,
+            )
+        if 'max_participantes' in cambios:
+            for clase in futuras.filter(lista_espera__isnull=False).distinct():
+                llenar_desde_espera(clase)
+    return serie
+
+
+def eliminar_serie(serie):
+    """Borra la serie y sus clases futuras sin inscritos; las demás quedan como clases sueltas."""
+    with transaction.atomic():
+        Clase.objects.filter(serie=serie, fecha_hora__gte=timezone.now(), ocupados=0).delete()
+        serie.delete()
@@ -1,8 +1,46 @@
+import base64
+import csv
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APITestCase
 
-from .models import Entrenador, Clase
+from .models import (
+	Caja, CajaMovimiento, CierreCaja, Clase, ClaseSerie, ClaveVenta, Entrenador, InscripcionClase, ListaEspera, MovimientoStock, Producto,
+	Secuencia, Socio, Suscripcion, VentaItem,
+)
+from .admin import ClaseForm
+from .busqueda import buscar_socios, normalizar_busqueda, reindexar_socios
+from .catalogo import VERSION_CATALOGO, olvidar_catalogo
+from .cierres import acumular, cerrar_dia, total_del_periodo
+from .exportaciones import EXPORTACIONES, filas
+from .serializers import ClaseSerializer
+from .inventario import StockInsuficiente, ajustar_stock, por_reponer
+from .tickets import ruta_ticket
+from .inscripciones import (
+	ClaseLlena, YaEnEspera, YaInscrito, anotar_en_espera, cancelar, inscribir, inscribir_en_lote, inscribir_o_esperar,
+	sincronizar_participantes,
+)
+from .secuencias import reconciliar, reservar, reservar_ids, siguiente_id
+from .ventas import LOTE_MAXIMO_VENTAS, registrar_venta
 
 
 class ClaseAPITestCase(APITestCase):
@@ -26,14 +64,1585 @@ class ClaseAPITestCase(APITestCase):
 			entrenador=self.entrenador,
 			max_participantes=20,
 		)
-		self.clase.participantes.add(self.user)
+		self.socio = Socio.objects.create(
+			id_socio='S001', nombre='Ana', apellido='Lopez', telefono='123456789', domicilio='Dir',
+		)
+		inscribir(self.clase, self.socio)
 
 	def test_listado_clases_api(self):
 		url = reverse('clase-list')
-		response = self.client.get(url)
+		response = self.client.get(url, secure=True)
 
 		self.assertEqual(response.status_code, 200)
 		self.assertGreaterEqual(len(response.data['results']), 1)
 		clase_serializada = response.data['results'][0]
 		self.assertEqual(clase_serializada['nombre'], 'Yoga Matutino')
-		self.assertIn(self.user.id, clase_serializada['participantes'])
+		self.assertEqual(clase_serializada['participantes_count'], 1)
+		self.assertNotIn('participantes', clase_serializada)
+
+	def test_listado_clases_incluye_ids_de_participantes(self):
+		response = self.client.get(reverse('clase-list'), {'include': 'participantes'}, secure=True)
+		self.assertEqual(response.data['results'][0]['participantes'], [self.socio.id])
+
+	def test_listado_clases_consultas_constantes(self):
+		for i in range(5):
+			clase = Clase.objects.create(
+				id_clase=f'C{i}', nombre=f'Clase {i}', fecha_hora='2024-01-03T08:00:00Z', entrenador=self.entrenador,
+			)
+			inscribir(clase, self.socio)
+		with self.assertNumQueries(2):
+			self.client.get(reverse('clase-list'), secure=True)
+		with self.assertNumQueries(3):
+			self.client.get(reverse('clase-list'), {'include': 'participantes'}, secure=True)
+
+	def test_participantes_ids_escribe_inscripciones(self):
+		self.client.force_authenticate(self.user)
+		otro = Socio.objects.create(id_socio='S002', nombre='Eva', apellido='Ruiz', telefono='123456789', domicilio='Dir')
+		response = self.client.patch(
+			reverse('clase-detail', args=[self.clase.pk]), {'participantes_ids': [otro.pk]}, format='json', secure=True,
+		)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(list(InscripcionClase.objects.filter(clase=self.clase).values_list('socio', flat=True)), [otro.pk])
+		self.assertEqual(list(self.clase.participantes.all()), [otro])
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 1)
+		# La baja elimina el pago y el alta se cobra, igual que cancelar/inscribir
+		self.assertEqual(list(CajaMovimiento.objects.filter(tipo='clase').values_list('socio', flat=True)), [otro.pk])
+
+	def test_participantes_ids_respeta_cupo_y_lista_de_espera(self):
+		self.client.force_authenticate(self.user)
+		Clase.objects.filter(pk=self.clase.pk).update(max_participantes=2)
+		otros = Socio.objects.bulk_create([
+			Socio(id_socio=f'S{i:03d}', nombre='Otro', apellido='Z', telefono='123456789', domicilio='Dir')
+			for i in range(100, 103)
+		])
+		url = reverse('clase-detail', args=[self.clase.pk])
+		response = self.client.patch(url, {'participantes_ids': [s.pk for s in otros]}, format='json', secure=True)
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('participantes_ids', response.data)
+		# No se cambia nada
+		self.assertEqual(list(self.clase.participantes.all()), [self.socio])
+		self.assertEqual(CajaMovimiento.objects.filter(tipo='clase').count(), 1)
+
+		anotar_en_espera(self.clase, otros[2])
+		response = self.client.patch(url, {'participantes_ids': [otros[0].pk]}, format='json', secure=True)
+		self.assertEqual(response.status_code, 200)
+		# El lugar que queda libre pasa al primero de la lista de espera
+		self.assertEqual(sorted(s.pk for s in self.clase.participantes.all()), [otros[0].pk, otros[2].pk])
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 2)
+
+	def test_participantes_paginados(self):
+		otros = Socio.objects.bulk_create([
+			Socio(id_socio=f'S{i:03d}', nombre='Otro', apellido=f'Z{i:02d}', telefono='123456789', domicilio='Dir')
+			for i in range(100, 112)
+		])
+		sincronizar_participantes(self.clase, [self.socio, *otros])
+		url = reverse('clase-participantes', args=[self.clase.pk])
+		response = self.client.get(url, secure=True)
+
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['count'], 13)
+		self.assertEqual(len(response.data['results']), 10)
+		self.assertEqual(response.data['results'][0]['id_socio'], 'S001')
+		self.assertEqual(set(response.data['results'][0]), {'id', 'id_socio', 'nombre', 'apellido', 'telefono', 'tipo_socio', 'estado'})
+		self.assertIsNotNone(response.data['next'])
+
+
+class SocioSuscripcionActualQueryTestCase(TestCase):
+	"""El dashboard y el listado de socios usan un número fijo de consultas."""
+
+	def setUp(self):
+		self.client = Client()
+		User.objects.create_user(username='admin', password='test123', is_staff=True, is_superuser=True)
+		self.client.login(username='admin', password='test123')
+
+	def crear_socios(self, cantidad):
+		socios = Socio.objects.bulk_create([
+			Socio(
+				id_socio=f'S{i:05d}',
+				nombre=f'Socio{i}',
+				apellido='Test',
+				telefono='123456789',
+				domicilio='Dir Test',
+				tipo_socio='interno',
+			)
+			for i in range(cantidad)
+		])
+		inicio = date.today()
+		Suscripcion.objects.bulk_create([
+			Suscripcion(
+				id_suscripcion=f'SUB{socio.pk:05d}-{n}',
+				socio=socio,
+				tipo='mensual',
+				fecha_inicio=inicio - timedelta(days=30 * n),
+				fecha_fin=inicio - timedelta(days=30 * n) + timedelta(days=30),
+				activa=(n == 0),
+				monto_total=500,
+			)
+			for socio in socios
+			for n in range(2)
+		])
+
+	def contar_consultas(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url, secure=True)
+		self.assertEqual(response.status_code, 200)
+		return len(ctx.captured_queries)
+
+	def test_consultas_constantes(self):
+		for url in (reverse('dashboard'), reverse('socios_list')):
+			self.crear_socios(10)
+			pocas = self.contar_consultas(url)
+			Socio.objects.all().delete()
+			self.crear_socios(10000)
+			muchas = self.contar_consultas(url)
+			Socio.objects.all().delete()
+			self.assertEqual(pocas, muchas)
+
+	def test_suscripcion_activa_precargada(self):
+		self.crear_socios(3)
+		with self.assertNumQueries(2):
+			socios = list(Socio.objects.with_current_subscription())
+		with self.assertNumQueries(0):
+			for socio in socios:
+				self.assertTrue(socio.suscripcion_activa.activa)
+				self.assertEqual(socio.suscripcion_activa.fecha_inicio, date.today())
+
+	def test_socio_externo_sin_suscripcion_activa(self):
+		self.crear_socios(1)
+		Socio.objects.update(tipo_socio='externo')
+		socio = Socio.objects.with_current_subscription().get()
+		self.assertIsNone(socio.suscripcion_activa)
+
+
+class SweepMembershipsTestCase(TestCase):
+	def setUp(self):
+		self.socio = Socio.objects.create(
+			id_socio='S001', nombre='Ana', apellido='Lopez', telefono='123456789',
+			domicilio='Dir', tipo_socio='interno', estado='inactivo',
+		)
+
+	def test_guardar_suscripcion_sincroniza_estado(self):
+		Suscripcion.objects.create(id_suscripcion='SUB001', socio=self.socio, tipo='mensual', fecha_inicio=date.today())
+		self.socio.refresh_from_db()
+		self.assertEqual(self.socio.estado, 'activo')
+		with self.assertNumQueries(0):
+			self.assertTrue(self.socio.activo)
+
+	def test_interno_sin_suscripcion_queda_inactivo(self):
+		nuevo = Socio.objects.create(
+			id_socio='S002', nombre='Eva', apellido='Ruiz', telefono='123456789', domicilio='Dir', tipo_socio='interno',
+		)
+		self.assertFalse(nuevo.activo)
+		externo = Socio.objects.create(id_socio='S003', nombre='Luis', apellido='Paz', telefono='123456789', domicilio='Dir')
+		externo.tipo_socio = 'interno'
+		externo.save(update_fields=['tipo_socio'])
+		externo.refresh_from_db()
+		self.assertEqual(externo.estado, 'inactivo')
+
+	def test_borrar_suscripciones_sincroniza_estado(self):
+		Suscripcion.objects.create(id_suscripcion='SUB001', socio=self.socio, tipo='mensual', fecha_inicio=date.today())
+		self.socio.suscripciones.all().delete()
+		self.socio.refresh_from_db()
+		self.assertEqual(self.socio.estado, 'inactivo')
+
+	def test_sweep_vence_suscripciones_y_socios(self):
+		suscripcion = Suscripcion.objects.create(id_suscripcion='SUB001', socio=self.socio, tipo='mensual', fecha_inicio=date.today())
+		Suscripcion.objects.filter(pk=suscripcion.pk).update(fecha_fin=date.today() - timedelta(days=1))
+
+		call_command('sweep_memberships', stdout=StringIO())
+
+		suscripcion.refresh_from_db()
+		self.socio.refresh_from_db()
+		self.assertFalse(suscripcion.activa)
+		self.assertEqual(self.socio.estado, 'inactivo')
+		self.assertFalse(self.socio.activo)
+
+
+class SecuenciaTestCase(TestCase):
+	def crear_socio(self, id_socio):
+		return Socio.objects.create(
+			id_socio=id_socio, nombre='Ana', apellido='Lopez', telefono='123456789', domicilio='Dir',
+		)
+
+	def test_inicializa_desde_datos_existentes(self):
+		self.crear_socio('S001')
+		self.crear_socio('S007')
+		self.assertEqual(siguiente_id('socio'), 'S008')
+		self.assertEqual(siguiente_id('socio'), 'S009')
+
+	def test_reserva_en_bloque(self):
+		self.assertEqual(reservar_ids('suscripcion', 3), ['SUB001', 'SUB002', 'SUB003'])
+		self.assertEqual(siguiente_id('suscripcion'), 'SUB004')
+
+	def test_costo_constante(self):
+		siguiente_id('entrenador')
+		for i in range(50):
+			Entrenador.objects.create(
+				id_entrenador=f'{i + 900}', nombre='Juan', especialidad='Cardio',
+				telefono='123456789', fecha_contratacion='2024-01-01',
+			)
+		with self.assertNumQueries(4):
+			siguiente_id('entrenador')
+
+	def test_reconciliar_no_retrocede(self):
+		reservar('socio', 10)
+		self.crear_socio('S004')
+		self.assertEqual(reconciliar('socio'), 10)
+		self.crear_socio('S020')
+		self.assertEqual(reconciliar('socio'), 20)
+
+
+class SociosKeysetPaginationTestCase(TestCase):
+	def setUp(self):
+		self.client = Client()
+		User.objects.create_user(username='admin', password='test123', is_staff=True, is_superuser=True)
+		self.client.login(username='admin', password='test123')
+		Socio.objects.bulk_create([
+			Socio(
+				id_socio=f'S{i:03d}', nombre=f'Nombre{i % 3}', apellido=f'Apellido{i % 4}',
+				telefono='123456789', domicilio='Dir',
+			)
+			for i in range(23)
+		])
+		reindexar_socios(Socio.objects.all())
+		self.esperados = list(Socio.objects.order_by('apellido', 'nombre', 'id').values_list('pk', flat=True))
+
+	def obtener(self, **params):
+		response = self.client.get(reverse('socios_list'), {'formato': 'json', **params}, secure=True)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	def test_recorre_todas_las_paginas_en_ambos_sentidos(self):
+		vistos, cursores = [], []
+		data = self.obtener(por_pagina=5)
+		while True:
+			vistos.extend(r['pk'] for r in data['results'])
+			if not data['next_cursor']:
+				break
+			cursores.append(data['next_cursor'])
+			data = self.obtener(por_pagina=5, cursor=data['next_cursor'])
+		self.assertEqual(vistos, self.esperados)
+
+		anterior = self.obtener(por_pagina=5, cursor=data['prev_cursor'])
+		self.assertEqual([r['pk'] for r in anterior['results']], self.esperados[15:20])
+
+	def test_conserva_busqueda(self):
+		data = self.obtener(q='Apellido1', por_pagina=2)
+		siguiente = self.obtener(q='Apellido1', por_pagina=2, cursor=data['next_cursor'])
+		for fila in data['results'] + siguiente['results']:
+			self.assertEqual(fila['apellido'], 'Apellido1')
+
+	def test_cursor_invalido_vuelve_al_inicio(self):
+		data = self.obtener(por_pagina=3, cursor='no-es-un-cursor')
+		self.assertEqual([r['pk'] for r in data['results']], self.esperados[:3])
+		self.assertIsNone(data['prev_cursor'])
+
+	def test_html_muestra_navegacion(self):
+		response = self.client.get(reverse('dashboard'), {'por_pagina': 5}, secure=True)
+		self.assertEqual(len(response.context['socios']), 5)
+		self.assertContains(response, 'Siguientes')
+
+
+class BusquedaSociosTestCase(TestCase):
+	def setUp(self):
+		self.client = Client()
+		User.objects.create_user(username='admin', password='test123', is_staff=True)
+		self.client.login(username='admin', password='test123')
+		self.maria = Socio.objects.create(
+			id_socio='S001', nombre='María José', apellido='Núñez', telefono='123456789', domicilio='Dir',
+		)
+		self.pedro = Socio.objects.create(
+			id_socio='S002', nombre='Pedro', apellido='García', telefono='123456789', domicilio='Dir',
+		)
+
+	def buscar(self, q):
+		response = self.client.get(reverse('socio-search'), {'q': q}, secure=True)
+		self.assertEqual(response.status_code, 200)
+		return [r['id_socio'] for r in response.json()['results']]
+
+	def test_normalizar_busqueda(self):
+		self.assertEqual(normalizar_busqueda('  María&amp;José  NÚÑEZ '), 'maria jose nunez')
+
+	def test_busqueda_sin_acentos_y_por_prefijo(self):
+		self.assertEqual(self.buscar('nun'), ['S001'])
+		self.assertEqual(self.buscar('Garcí'), ['S002'])
+		self.assertEqual(self.buscar('maria nunez'), ['S001'])
+		self.assertEqual(self.buscar('s00'), ['S002', 'S001'])
+		self.assertEqual(self.buscar('<script>'), [])
+
+	def test_mismo_resultado_con_y_sin_trigramas(self):
+		marcos = Socio.objects.create(id_socio='S003', nombre='Marcos', apellido='Ruiz', telefono='123456789', domicilio='Dir')
+		for trigramas in (False, True):
+			with self.subTest(trigramas=trigramas), mock.patch('gimnasio.busqueda.usa_trigramas', return_value=trigramas):
+				self.assertEqual(list(buscar_socios(Socio.objects.all(), 'arc')), [])
+				self.assertEqual(list(buscar_socios(Socio.objects.all(), 'marc')), [marcos])
+				self.assertEqual(list(buscar_socios(Socio.objects.all(), 'jose nun')), [self.maria])
+
+	def test_edicion_actualiza_terminos(self):
+		self.pedro.apellido = 'Álvarez'
+		self.pedro.save()
+		self.assertEqual(self.buscar('alva'), ['S002'])
+		self.assertEqual(self.buscar('garcia'), [])
+
+	def test_requiere_autenticacion(self):
+		self.client.logout()
+		response = self.client.get(reverse('socio-search'), {'q': 'pedro'}, secure=True)
+		self.assertEqual(response.status_code, 403)
+
+
+class ImportSociosTestCase(TestCase):
+	def setUp(self):
+		Group.objects.create(name='Socios')
+		Socio.objects.create(id_socio='S050', nombre='Ya', apellido='Existe', telefono='123456789', domicilio='Dir')
+		self.tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(self.tmp.cleanup)
+
+	def escribir(self, nombre, contenido):
+		ruta = os.path.join(self.tmp.name, nombre)
+		with open(ruta, 'w', encoding='utf-8') as f:
+			f.write(contenido)
+		return ruta
+
+	def test_importa_csv_y_reporta_errores_por_fila(self):
+		ruta = self.escribir('socios.csv', (
+			'id_socio,nombre,apellido,telefono,domicilio,tipo_socio,tipo_suscripcion,fecha_inicio\n'
+			',Ana,López,123456789,Calle 1,interno,mensual,' + date.today().isoformat() + '\n'
+			',Luis,<b>Pérez</b>,abc,Calle 2,externo,,\n'
+			'S050,Repetido,Socio,123456789,Calle 3,externo,,\n'
+			'S200,Eva,Díaz,123456789,Calle 4,externo,,\n'
+			',Sin,Fecha,123456789,Calle 5,interno,anual,ayer\n'
+		))
+		credenciales = os.path.join(self.tmp.name, 'credenciales.csv')
+		err = StringIO()
+		call_command('import_socios', ruta, lote=2, workers=1, credenciales=credenciales, stdout=StringIO(), stderr=err)
+
+		self.assertIn('Línea 3', err.getvalue())
+		self.assertIn('Línea 4', err.getvalue())
+		self.assertIn('Línea 6', err.getvalue())
+		ana = Socio.objects.get(nombre='Ana')
+		self.assertEqual(ana.suscripcion_activa.monto_total, 500)
+		self.assertEqual(ana.estado, 'activo')
+		self.assertTrue(ana.user.groups.filter(name='Socios').exists())
+		self.assertEqual(list(buscar_socios(Socio.objects.all(), 'lopez')), [ana])
+
+		with open(credenciales, encoding='utf-8') as f:
+			filas = list(csv.DictReader(f))
+		self.assertEqual(sorted(f['id_socio'] for f in filas), sorted([ana.id_socio, 'S200']))
+		eva = Socio.objects.get(id_socio='S200')
+		password = next(f['password'] for f in filas if f['id_socio'] == 'S200')
+		self.assertTrue(eva.user.check_password(password))
+		self.assertEqual(siguiente_id('socio'), 'S201')
+
+	def test_importa_jsonl_con_pool_de_procesos(self):
+		lineas = [json.dumps({'nombre': f'Socio{i}', 'apellido': 'Jsonl', 'telefono': '123456789', 'domicilio': 'Dir'}) for i in range(5)]
+		ruta = self.escribir('socios.jsonl', '\n'.join(lineas + ['{no es json']))
+		err = StringIO()
+		call_command(
+			'import_socios', ruta, workers=2, credenciales=os.path.join(self.tmp.name, 'c.csv'),
+			stdout=StringIO(), stderr=err,
+		)
+		self.assertEqual(Socio.objects.filter(apellido='Jsonl').count(), 5)
+		self.assertIn('Línea 6', err.getvalue())
+
+	def test_campos_mas_largos_que_el_modelo_son_error_de_fila(self):
+		ruta = self.escribir('socios.csv', (
+			'nombre,apellido,telefono,domicilio\n'
+			'Ana,Ruiz,12345678901234567,Dir\n'
+			'Eva,Díaz,123456789,Dir\n'
+		))
+		err = StringIO()
+		call_command('import_socios', ruta, stdout=StringIO(), stderr=err)
+		self.assertIn('Línea 2', err.getvalue())
+		self.assertIn('telefono', err.getvalue())
+		self.assertFalse(Socio.objects.filter(apellido='Ruiz').exists())
+		self.assertTrue(Socio.objects.filter(apellido='Díaz').exists())
+
+	def test_sin_credenciales_usuarios_sin_password(self):
+		ruta = self.escribir('socios.csv', 'nombre,apellido,telefono,domicilio\nAna,Ruiz,123456789,Dir\n')
+		call_command('import_socios', ruta, stdout=StringIO(), stderr=StringIO())
+		self.assertFalse(Socio.objects.get(apellido='Ruiz').user.has_usable_password())
+
+
+class InscripcionServicioTestCase(TestCase):
+	def setUp(self):
+		entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2024-01-02T08:00:00Z', entrenador=entrenador,
+			max_participantes=1, precio=100,
+		)
+		self.socios = [
+			Socio.objects.create(id_socio=f'S00{i}', nombre=f'Socio{i}', apellido='Test', telefono='123456789', domicilio='Dir')
+			for i in range(2)
+		]
+
+	def test_inscribir_crea_inscripcion_y_pago(self):
+		inscripcion = inscribir(self.clase, self.socios[0], 'tarjeta')
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 1)
+		self.assertEqual(inscripcion.movimiento_caja.monto, 100)
+		self.assertEqual(inscripcion.movimiento_caja.metodo_pago, 'tarjeta')
+		self.assertTrue(self.clase.participantes.filter(pk=self.socios[0].pk).exists())
+
+	def test_clase_llena_y_duplicado_no_consumen_lugar(self):
+		inscribir(self.clase, self.socios[0])
+		with self.assertRaises(ClaseLlena):
+			inscribir(self.clase, self.socios[1])
+		Clase.objects.filter(pk=self.clase.pk).update(max_participantes=5)
+		with self.assertRaises(YaInscrito):
+			inscribir(self.clase, self.socios[0])
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 1)
+		self.assertEqual(CajaMovimiento.objects.count(), 1)
+
+	def test_otra_restriccion_no_se_informa_como_ya_inscrito(self):
+		otra = Clase.objects.create(
+			id_clase='C2', nombre='Yoga', fecha_hora='2024-01-03T08:00:00Z', entrenador=self.clase.entrenador, precio=100,
+		)
+		# Mismo id_inscripcion que generaría la inscripción en self.clase
+		InscripcionClase.objects.bulk_create([InscripcionClase(
+			id_inscripcion=InscripcionClase.generar_id(self.socios[0], self.clase), socio=self.socios[1], clase=otra,
+		)])
+		with self.assertRaises(IntegrityError):
+			inscribir(self.clase, self.socios[0])
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 0)
+
+	def test_cancelar_libera_lugar_y_pago(self):
+		inscribir(self.clase, self.socios[0])
+		cancelar(self.clase, self.socios[0])
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 0)
+		self.assertFalse(CajaMovimiento.objects.exists())
+		inscribir(self.clase, self.socios[1])
+
+
+class InscripcionConcurrenteTestCase(TransactionTestCase):
+	"""Inscripciones simultáneas desde varios hilos nunca sobrepasan el cupo."""
+
+	CUPO = 5
+	HILOS = 20
+
+	def test_sin_sobreventa(self):
+		entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2024-01-02T08:00:00Z', entrenador=entrenador,
+			max_participantes=self.CUPO,
+		)
+		socios = [
+			Socio.objects.create(id_socio=f'S{i:03d}', nombre=f'Socio{i}', apellido='Test', telefono='123456789', domicilio='Dir')
+			for i in range(self.HILOS)
+		]
+		barrera = threading.Barrier(self.HILOS)
+		resultados = []
+
+		def inscribir_en_hilo(socio):
+			try:
+				barrera.wait()
+				for _ in range(50):
+					try:
+						inscribir(clase, socio)
+						resultados.append('ok')
+						return
+					except OperationalError:
+						# SQLite bloquea la base completa: se reintenta
+						continue
+				resultados.append('bloqueado')
+			except ClaseLlena:
+				resultados.append('llena')
+			finally:
+				connection.close()
+
+		hilos = [threading.Thread(target=inscribir_en_hilo, args=(socio,)) for socio in socios]
+		for hilo in hilos:
+			hilo.start()
+		for hilo in hilos:
+			hilo.join()
+
+		clase.refresh_from_db()
+		self.assertEqual(resultados.count('ok'), self.CUPO)
+		self.assertEqual(clase.ocupados, self.CUPO)
+		self.assertEqual(InscripcionClase.objects.filter(clase=clase).count(), self.CUPO)
+		self.assertEqual(clase.participantes.count(), self.CUPO)
+		self.assertEqual(CajaMovimiento.objects.filter(tipo='clase').count(), self.CUPO)
+
+
+class HorarioAPITestCase(APITestCase):
+	def setUp(self):
+		self.entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		otro = Entrenador.objects.create(
+			id_entrenador='002', nombre='Eva', especialidad='Yoga', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.lunes = Clase.objects.create(
+			id_clase='C1', nombre='Spinning, nivel 1', fecha_hora='2030-01-07T08:00:00Z', entrenador=self.entrenador,
+		)
+		Clase.objects.create(id_clase='C2', nombre='Yoga', fecha_hora='2030-01-09T18:30:00Z', entrenador=otro)
+		Clase.objects.create(id_clase='C3', nombre='Fuera de rango', fecha_hora='2030-01-20T08:00:00Z', entrenador=otro)
+		self.user = User.objects.create_user(username='S001', password='test123')
+		self.socio = Socio.objects.create(
+			user=self.user, id_socio='S001', nombre='Ana', apellido='Lopez', telefono='123456789', domicilio='Dir',
+		)
+		inscribir(self.lunes, self.socio)
+
+	def test_semana_agrupada_por_dia(self):
+		response = self.client.get(reverse('horario_api'), {'desde': '2030-01-07', 'hasta': '2030-01-13'}, secure=True)
+		self.assertEqual(response.status_code, 200)
+		dias = response.data['dias']
+		self.assertEqual(len(dias), 7)
+		self.assertEqual([c['id_clase'] for c in dias[0]['clases']], ['C1'])
+		self.assertEqual(dias[0]['clases'][0]['hora'], '08:00')
+		self.assertEqual(dias[0]['clases'][0]['ocupados'], 1)
+		self.assertEqual([c['id_clase'] for c in dias[2]['clases']], ['C2'])
+
+	def test_filtro_por_entrenador_y_validaciones(self):
+		response = self.client.get(
+			reverse('horario_api'), {'desde': '2030-01-01', 'hasta': '2030-01-31', 'entrenador': self.entrenador.pk}, secure=True,
+		)
+		clases = [c['id_clase'] for dia in response.data['dias'] for c in dia['clases']]
+		self.assertEqual(clases, ['C1'])
+		self.assertEqual(self.client.get(reverse('horario_api'), {'desde': '2030-13-01'}, secure=True).status_code, 400)
+		self.assertEqual(
+			self.client.get(reverse('horario_api'), {'desde': '2030-01-01', 'hasta': '2031-01-01'}, secure=True).status_code, 400,
+		)
+
+	def test_ics_del_socio_con_etag(self):
+		self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'S001:test123').decode())
+		url = reverse('horario_socio_ics', args=[self.socio.pk])
+		response = self.client.get(url, secure=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+		contenido = response.content.decode()
+		self.assertIn('SUMMARY:Spinning\\, nivel 1', contenido)
+		self.assertIn('DTSTART:20300107T080000Z', contenido)
+		self.assertNotIn('Yoga', contenido)
+
+		# Usuario, socio y dos agregaciones: el calendario no se genera
+		with self.assertNumQueries(4):
+			cacheado = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=response['ETag'])
+		self.assertEqual(cacheado.status_code, 304)
+		# Sin Last-Modified: un If-Modified-Since solo nunca da un 304 desactualizado
+		self.assertNotIn('Last-Modified', response)
+		self.assertEqual(
+			self.client.get(url, secure=True, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 200,
+		)
+
+		# Inscribirse en otra clase no cambia `actualizado` de ninguna clase, pero sí la huella
+		inscribir(Clase.objects.get(id_clase='C2'), self.socio)
+		self.assertEqual(self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+		cancelar(Clase.objects.get(id_clase='C2'), self.socio)
+
+		self.lunes.nombre = 'Spinning avanzado'
+		self.lunes.save()
+		self.assertEqual(self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+	def test_ics_requiere_credenciales_y_dueño(self):
+		url = reverse('horario_socio_ics', args=[self.socio.pk])
+		self.assertEqual(self.client.get(url, secure=True).status_code, 401)
+		User.objects.create_user(username='otro', password='test123')
+		self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'otro:test123').decode())
+		self.assertEqual(self.client.get(url, secure=True).status_code, 403)
+		response = self.client.get(reverse('horario_entrenador_ics', args=[self.entrenador.pk]), secure=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('UID:clase-%d@reco-gym' % self.lunes.pk, response.content.decode())
+
+
+class AgendaEntrenadorTestCase(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='admin', password='test123', is_staff=True)
+		self.client.force_authenticate(self.user)
+		self.juan = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.eva = Entrenador.objects.create(
+			id_entrenador='002', nombre='Eva', especialidad='Yoga', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2030-01-07T08:00:00Z', duracion_minutos=90, entrenador=self.juan,
+		)
+
+	def datos(self, **extra):
+		datos = {
+			'id_clase': 'C2', 'nombre': 'Funcional', 'fecha_hora': '2030-01-07T09:00:00Z',
+			'duracion_minutos': 60, 'entrenador_id': self.juan.pk, 'max_participantes': 10,
+		}
+		datos.update(extra)
+		return datos
+
+	def test_rechaza_clase_superpuesta(self):
+		response = self.client.post(reverse('clase-list'), self.datos(), format='json', secure=True)
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('Spinning', str(response.data['non_field_errors']))
+		self.assertFalse(Clase.objects.filter(id_clase='C2').exists())
+
+	def test_permite_clase_contigua_u_otro_entrenador(self):
+		contigua = self.client.post(reverse('clase-list'), self.datos(fecha_hora='2030-01-07T09:30:00Z'), format='json', secure=True)
+		self.assertEqual(contigua.status_code, 201)
+		otro = self.client.post(reverse('clase-list'), self.datos(id_clase='C3', entrenador_id=self.eva.pk), format='json', secure=True)
+		self.assertEqual(otro.status_code, 201)
+
+	def test_editar_no_choca_consigo_misma(self):
+		url = reverse('clase-detail', args=[self.clase.pk])
+		response = self.client.patch(url, {'duracion_minutos': 120}, format='json', secure=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.client.patch(url, {'duracion_minutos': 600}, format='json', secure=True).status_code, 400)
+
+	def test_admin_valida_duracion_y_superposicion(self):
+		datos = {
+			'id_clase': 'C2', 'nombre': 'Funcional', 'fecha_hora': '2030-01-07 09:00',
+			'duracion_minutos': 60, 'entrenador': self.juan.pk, 'max_participantes': 10, 'precio': '0',
+		}
+		form = ClaseForm(data=datos)
+		self.assertFalse(form.is_valid())
+		self.assertIn('Spinning', str(form.non_field_errors()))
+		form = ClaseForm(data={**datos, 'duracion_minutos': 600, 'entrenador': self.eva.pk})
+		self.assertFalse(form.is_valid())
+		self.assertIn('duracion_minutos', form.errors)
+		self.assertTrue(ClaseForm(data={**datos, 'entrenador': self.eva.pk}).is_valid())
+		# Editar la propia clase no choca consigo misma
+		self.assertTrue(ClaseForm(data={**datos, 'id_clase': 'C1', 'fecha_hora': '2030-01-07 08:00'}, instance=self.clase).is_valid())
+
+	def test_entrenadores_libres(self):
+		url = reverse('entrenador-libres')
+		response = self.client.get(url, {'inicio': '2030-01-07T09:00:00Z', 'duracion': 30}, secure=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual([e['nombre'] for e in response.data['results']], ['Eva'])
+		response = self.client.get(url, {'inicio': '2030-01-07T09:30:00Z', 'duracion': 30}, secure=True)
+		self.assertEqual([e['nombre'] for e in response.data['results']], ['Eva', 'Juan'])
+		self.assertEqual(self.client.get(url, {'inicio': 'mañana'}, secure=True).status_code, 400)
+
+
+class AgendaConcurrenteTestCase(TransactionTestCase):
+	"""Altas simultáneas de clases superpuestas dejan una sola al entrenador."""
+
+	HILOS = 8
+
+	def test_sin_doble_reserva(self):
+		entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		barrera = threading.Barrier(self.HILOS)
+		resultados = []
+
+		def crear_en_hilo(n):
+			try:
+				barrera.wait()
+				for _ in range(50):
+					serializer = ClaseSerializer(data={
+						'id_clase': f'C{n}', 'nombre': 'Spinning', 'fecha_hora': f'2030-01-07T08:{n:02d}:00Z',
+						'duracion_minutos': 60, 'entrenador_id': entrenador.pk, 'max_participantes': 10,
+					})
+					serializer.is_valid(raise_exception=True)
+					try:
+						serializer.save()
+						resultados.append('ok')
+						return
+					except OperationalError:
+						# SQLite bloquea la base completa: se reintenta
+						continue
+				resultados.append('bloqueado')
+			except ValidationError:
+				resultados.append('conflicto')
+			finally:
+				connection.close()
+
+		hilos = [threading.Thread(target=crear_en_hilo, args=(n,)) for n in range(self.HILOS)]
+		for hilo in hilos:
+			hilo.start()
+		for hilo in hilos:
+			hilo.join()
+
+		self.assertEqual(resultados.count('ok'), 1)
+		self.assertEqual(Clase.objects.filter(entrenador=entrenador).count(), 1)
+
+
+class ClaseSerieTestCase(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='admin', password='test123', is_staff=True)
+		self.client.force_authenticate(self.user)
+		self.entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.datos = {
+			'nombre': 'Spinning', 'entrenador': self.entrenador.pk, 'dias_semana': [2, 0], 'hora': '07:00',
+			'duracion_minutos': 60, 'max_participantes': 10, 'precio': '100.00',
+			'fecha_inicio': '2030-01-07', 'fecha_fin': '2030-06-30',
+		}
+
+	def crear(self):
+		response = self.client.post(reverse('claseserie-list'), self.datos, format='json', secure=True)
+		self.assertEqual(response.status_code, 201, response.data)
+		return ClaseSerie.objects.get(pk=response.data['id']), response
+
+	def test_administradores_pueden_crear_series(self):
+		call_command('setup_roles', stdout=StringIO())
+		admin = User.objects.create_user(username='recepcion', password='test123')
+		admin.groups.add(Group.objects.get(name='Administradores'))
+		self.client.force_authenticate(admin)
+		self.client.force_login(admin)
+		self.assertEqual(self.client.get(reverse('clase_serie_form'), secure=True).status_code, 200)
+		self.crear()
+
+	def test_crear_serie_materializa_el_horizonte(self):
+		serie, response = self.crear()
+		clases = Clase.objects.filter(serie=serie).order_by('fecha_hora')
+		# 90 días desde el inicio: 13 lunes y 13 miércoles
+		self.assertEqual(response.data['total_clases'], 26)
+		self.assertEqual(clases.count(), 26)
+		self.assertEqual(serie.dias_semana, [0, 2])
+		self.assertEqual(serie.generada_hasta, date(2030, 4, 7))
+		self.assertTrue(all(c.fecha_hora.weekday() in (0, 2) and c.fecha_hora.hour == 7 for c in clases))
+		self.assertEqual(len({c.id_clase for c in clases}), 26)
+		self.assertTrue(clases[0].id_clase.startswith('C'))
+
+	def test_subir_cupo_de_la_serie_promueve_la_lista_de_espera(self):
+		self.datos['max_participantes'] = 1
+		serie, _ = self.crear()
+		clase = Clase.objects.filter(serie=serie).order_by('fecha_hora').first()
+		socios = [
+			Socio.objects.create(id_socio=f'S00{i}', nombre='Ana', apellido='Test', telefono='123456789', domicilio='Dir')
+			for i in range(2)
+		]
+		inscribir(clase, socios[0])
+		anotar_en_espera(clase, socios[1])
+		response = self.client.patch(
+			reverse('claseserie-detail', args=[serie.pk]), {'max_participantes': 2}, format='json', secure=True,
+		)
+		self.assertEqual(response.status_code, 200, response.data)
+		self.assertEqual(clase.participantes.count(), 2)
+		self.assertFalse(ListaEspera.objects.exists())
+
+	def test_serie_con_choque_no_crea_nada(self):
+		Clase.objects.create(id_clase='X1', nombre='Yoga', fecha_hora='2030-01-09T07:30:00Z', entrenador=self.entrenador)
+		response = self.client.post(reverse('claseserie-list'), self.datos, format='json', secure=True)
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('09/01/2030 07:00', str(response.data))
+		self.assertFalse(ClaseSerie.objects.exists())
+		self.assertEqual(Clase.objects.count(), 1)
+
+	def test_editar_propaga_a_clases_futuras(self):
+		serie, _ = self.crear()
+		socio = Socio.objects.create(id_socio='S001', nombre='Ana', apellido='Lopez', telefono='123456789', domicilio='Dir')
+		marzo = Clase.objects.get(serie=serie, fecha_hora__date=date(2030, 3, 4))
+		inscribir(marzo, socio)
+
+		response = self.client.patch(
+			reverse('claseserie-detail', args=[serie.pk]),
+			{'hora': '08:30', 'precio': '150.00', 'fecha_fin': '2030-02-28'}, format='json', secure=True,
+		)
+		self.assertEqual(response.status_code, 200, response.data)
+		clases = Clase.objects.filter(serie=serie)
+		# Las posteriores a fecha_fin se borran salvo la que tiene inscritos
+		self.assertEqual(clases.filter(fecha_hora__date__gt=date(2030, 2, 28)).get(), marzo)
+		self.assertEqual(clases.count(), 17)
+		self.assertEqual(set(clases.values_list('precio', flat=True)), {Decimal('150.00')})
+		self.assertEqual({(c.fecha_hora.hour, c.fecha_hora.minute) for c in clases}, {(8, 30)})
+		self.assertGreater(clases.get(pk=marzo.pk).actualizado, marzo.actualizado)
+
+		cambio_dias = self.client.patch(
+			reverse('claseserie-detail', args=[serie.pk]), {'dias_semana': [1]}, format='json', secure=True,
+		)
+		self.assertEqual(cambio_dias.status_code, 400)
+
+	@override_settings(TIME_ZONE='America/New_York')
+	def test_cambio_de_hora_respeta_horario_de_verano(self):
+		# Domingos alrededor del 10/3/2030, cuando Nueva York pasa a horario de verano
+		self.datos.update(dias_semana=[6], hora='01:30', fecha_inicio='2030-03-03', fecha_fin='2030-03-17')
+		serie, _ = self.crear()
+		response = self.client.patch(
+			reverse('claseserie-detail', args=[serie.pk]), {'hora': '03:30'}, format='json', secure=True,
+		)
+		self.assertEqual(response.status_code, 200, response.data)
+		locales = [timezone.localtime(c.fecha_hora) for c in Clase.objects.filter(serie=serie).order_by('fecha_hora')]
+		self.assertEqual([f.date() for f in locales], [date(2030, 3, 3), date(2030, 3, 10), date(2030, 3, 17)])
+		self.assertEqual({(f.hour, f.minute) for f in locales}, {(3, 30)})
+
+	def test_serie_que_ya_empezo_no_crea_clases_pasadas(self):
+		hoy = timezone.localdate()
+		self.datos.update(
+			dias_semana=list(range(7)), fecha_inicio=(hoy - timedelta(days=10)).isoformat(),
+			fecha_fin=(hoy + timedelta(days=10)).isoformat(),
+		)
+		serie, _ = self.crear()
+		clases = Clase.objects.filter(serie=serie)
+		self.assertTrue(clases.exists())
+		self.assertFalse(clases.filter(fecha_hora__lt=timezone.now()).exists())
+
+	def test_extend_class_series_completa_y_omite_choques(self):
+		serie, _ = self.crear()
+		Clase.objects.create(id_clase='X1', nombre='Yoga', fecha_hora='2030-05-06T07:00:00Z', entrenador=self.entrenador)
+		out, err = StringIO(), StringIO()
+		call_command('extend_class_series', dias=400, stdout=out, stderr=err)
+		# Lunes y miércoles del 7/1 al 30/6 son 50; uno choca con Yoga
+		self.assertEqual(Clase.objects.filter(serie=serie).count(), 49)
+		self.assertIn('06/05/2030 07:00', err.getvalue())
+		self.assertIn('Clases generadas: 23', out.getvalue())
+		call_command('extend_class_series', dias=400, stdout=StringIO())
+		self.assertEqual(Clase.objects.filter(serie=serie).count(), 49)
+
+	def test_eliminar_serie_conserva_clases_con_inscritos(self):
+		serie, _ = self.crear()
+		socio = Socio.objects.create(id_socio='S001', nombre='Ana', apellido='Lopez', telefono='123456789', domicilio='Dir')
+		clase = Clase.objects.filter(serie=serie).first()
+		inscribir(clase, socio)
+		response = self.client.delete(reverse('claseserie-detail', args=[serie.pk]), secure=True)
+		self.assertEqual(response.status_code, 204)
+		self.assertEqual(list(Clase.objects.all()), [clase])
+		clase.refresh_from_db()
+		self.assertIsNone(clase.serie)
+
+	def test_clase_suelta_recibe_id_de_la_secuencia(self):
+		response = self.client.post(reverse('clase-list'), {
+			'nombre': 'Funcional', 'fecha_hora': '2030-01-08T10:00:00Z', 'entrenador_id': self.entrenador.pk,
+		}, format='json', secure=True)
+		self.assertEqual(response.status_code, 201, response.data)
+		self.assertRegex(response.data['id_clase'], r'^C\d{3,}$')
+
+
+class ListaEsperaTestCase(APITestCase):
+	def setUp(self):
+		entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2030-01-07T08:00:00Z', entrenador=entrenador,
+			max_participantes=1, precio=100,
+		)
+		self.socios = [
+			Socio.objects.create(
+				user=User.objects.create_user(username=f'S00{i}', password='test123'),
+				id_socio=f'S00{i}', nombre=f'Socio{i}', apellido='Test', telefono='123456789', domicilio='Dir',
+			)
+			for i in range(4)
+		]
+
+	def test_clase_llena_anota_en_orden(self):
+		self.assertIsNone(inscribir_o_esperar(self.clase, self.socios[0])[1])
+		_, primera = inscribir_o_esperar(self.clase, self.socios[1], 'tarjeta')
+		_, segunda = inscribir_o_esperar(self.clase, self.socios[2])
+		self.assertLess(primera.posicion, segunda.posicion)
+		with self.assertRaises(YaEnEspera):
+			anotar_en_espera(self.clase, self.socios[1])
+		with self.assertRaises(YaInscrito):
+			anotar_en_espera(self.clase, self.socios[0])
+		self.assertEqual(ListaEspera.objects.count(), 2)
+
+	def test_cancelar_promueve_al_primero_con_su_pago(self):
+		inscribir(self.clase, self.socios[0])
+		anotar_en_espera(self.clase, self.socios[1], 'tarjeta')
+		anotar_en_espera(self.clase, self.socios[2])
+		pago_id, promovida = cancelar(self.clase, self.socios[0])
+		self.assertIsNotNone(pago_id)
+		self.assertEqual(promovida.socio, self.socios[1])
+		self.assertEqual(promovida.movimiento_caja.metodo_pago, 'tarjeta')
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 1)
+		self.assertEqual(list(self.clase.participantes.all()), [self.socios[1]])
+		self.assertEqual(list(ListaEspera.objects.values_list('socio', flat=True)), [self.socios[2].pk])
+
+	def test_promocion_salta_socios_que_no_pueden_inscribirse(self):
+		inscribir(self.clase, self.socios[0])
+		anotar_en_espera(self.clase, self.socios[1])
+		anotar_en_espera(self.clase, self.socios[2])
+		Socio.objects.filter(pk=self.socios[1].pk).update(tipo_socio='interno', estado='inactivo')
+		_, promovida = cancelar(self.clase, self.socios[0])
+		self.assertEqual(promovida.socio, self.socios[2])
+		self.assertFalse(ListaEspera.objects.exists())
+		self.assertEqual(CajaMovimiento.objects.count(), 1)
+
+	def test_subir_cupo_promueve_la_lista_de_espera(self):
+		inscribir(self.clase, self.socios[0])
+		for socio in self.socios[1:]:
+			anotar_en_espera(self.clase, socio)
+		self.client.force_authenticate(User.objects.create_user(username='admin', password='test123', is_staff=True))
+		response = self.client.patch(
+			reverse('clase-detail', args=[self.clase.pk]), {'max_participantes': 3}, format='json', secure=True,
+		)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(
+			sorted(self.clase.participantes.values_list('pk', flat=True)), [s.pk for s in self.socios[:3]],
+		)
+		self.assertEqual(list(ListaEspera.objects.values_list('socio', flat=True)), [self.socios[3].pk])
+
+	def test_estado_para_consultar_seguido(self):
+		inscribir(self.clase, self.socios[0])
+		anotar_en_espera(self.clase, self.socios[1])
+		anotar_en_espera(self.clase, self.socios[2])
+		url = reverse('clase-espera', args=[self.clase.pk])
+		self.client.force_authenticate(self.socios[2].user)
+		# Socio, estado de la clase y agregado de la lista
+		with self.assertNumQueries(3):
+			response = self.client.get(url, secure=True)
+		self.assertEqual(response.data, {
+			'ocupados': 1, 'max_participantes': 1, 'inscrito': False, 'en_espera': 2, 'posicion': 2,
+		})
+		self.assertEqual(self.client.get(url, {'socio': self.socios[0].pk}, secure=True).status_code, 403)
+
+		self.client.force_authenticate(self.socios[0].user)
+		response = self.client.get(url, secure=True)
+		self.assertTrue(response.data['inscrito'])
+		self.assertIsNone(response.data['posicion'])
+
+
+class InscripcionLoteTestCase(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_superuser(username='admin', password='test123', email='admin@example.com')
+		self.client.force_authenticate(self.user)
+		self.entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2030-01-07T08:00:00Z', entrenador=self.entrenador,
+			max_participantes=3, precio=50,
+		)
+		Socio.objects.bulk_create([
+			Socio(id_socio=f'S{i:03d}', nombre=f'Socio{i}', apellido='Test', telefono='123456789', domicilio='Dir')
+			for i in range(1, 21)
+		])
+		Socio.objects.filter(id_socio='S005').update(tipo_socio='interno', estado='inactivo')
+		inscribir(self.clase, Socio.objects.get(id_socio='S001'))
+		self.url = reverse('clase-inscripciones-bulk', args=[self.clase.pk])
+
+	def test_resultados_por_socio(self):
+		response = self.client.post(self.url, {
+			'socios': ['S001', 's002', 'S003', 'X999', 'S005', 'S004', 'S002'], 'metodo_pago': 'tarjeta',
+		}, format='json', secure=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['inscritos'], 2)
+		self.assertEqual([(r['id_socio'], r['estado']) for r in response.data['resultados']], [
+			('S001', 'ya_inscrito'), ('S002', 'inscrito'), ('S003', 'inscrito'),
+			('X999', 'no_encontrado'), ('S005', 'inactivo'), ('S004', 'sin_lugar'),
+		])
+		self.clase.refresh_from_db()
+		self.assertEqual(self.clase.ocupados, 3)
+		self.assertEqual(self.clase.participantes.count(), 3)
+		pagos = CajaMovimiento.objects.filter(metodo_pago='tarjeta')
+		self.assertEqual(pagos.count(), 2)
+		self.assertFalse(InscripcionClase.objects.filter(movimiento_caja__isnull=True).exists())
+
+	def test_sobrantes_a_lista_de_espera(self):
+		response = self.client.post(self.url, {
+			'socios': ['S002', 'S003', 'S004'], 'lista_espera': True,
+		}, format='json', secure=True)
+		self.assertEqual(response.data['resultados'][2]['estado'], 'en_espera')
+		self.assertEqual(ListaEspera.objects.get().socio.id_socio, 'S004')
+
+	def test_consultas_no_crecen_con_el_lote(self):
+		def consultas(ids):
+			clase = Clase.objects.create(
+				id_clase=f'L{len(ids)}', nombre='Lote', fecha_hora='2030-02-01T08:00:00Z', entrenador=self.entrenador,
+				max_participantes=50,
+			)
+			with CaptureQueriesContext(connection) as contexto:
+				resultados = inscribir_en_lote(clase, ids)
+			self.assertTrue(all(r['estado'] == 'inscrito' for r in resultados))
+			return len(contexto)
+
+		self.assertEqual(consultas(['S002', 'S003']), consultas([f'S{i:03d}' for i in range(6, 21)]))
+
+	def test_requiere_permiso(self):
+		self.client.force_authenticate(User.objects.create_user(username='recepcion', password='test123'))
+		response = self.client.post(self.url, {'socios': ['S002']}, format='json', secure=True)
+		self.assertEqual(response.status_code, 403)
+		self.assertEqual(self.client.post(self.url, {'socios': []}, format='json', secure=True).status_code, 403)
+
+
+class RegistrarVentaTestCase(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='cajero', password='test123')
+		self.client.force_authenticate(self.user)
+		Producto.objects.bulk_create([Producto(nombre=f'Producto {i}', precio=Decimal('25.00')) for i in range(40)])
+		self.productos = list(Producto.objects.values_list('pk', flat=True))
+		self.url = reverse('registrar_venta_api')
+
+	def venta(self, items):
+		return self.client.post(self.url, {'metodo_pago': 'tarjeta', 'items': items}, format='json', secure=True)
+
+	def test_consultas_constantes(self):
+		def consultas(n):
+			items = [{'producto_id': pk, 'cantidad': 2} for pk in self.productos[:n]]
+			with CaptureQueriesContext(connection) as contexto:
+				self.assertEqual(self.venta(items).status_code, 201)
+			return len(contexto)
+
+		consultas(1)  # La primera carga los permisos del usuario
+		self.assertEqual(consultas(1), consultas(40))
+		self.assertEqual(VentaItem.objects.count(), 42)
+
+	def test_precio_de_catalogo_sin_permiso(self):
+		response = self.venta([{'producto_id': self.productos[0], 'cantidad': 2, 'precio_unitario': '1.00'}])
+		self.assertEqual(response.status_code, 201)
+		venta = Caja.objects.get(pk=response.data['venta_id'])
+		self.assertEqual(venta.total, Decimal('50.00'))
+		self.assertEqual(venta.items.get().precio_unitario, Decimal('25.00'))
+		self.assertEqual(CajaMovimiento.objects.get(venta=venta).monto, Decimal('50.00'))
+
+	def test_precio_manual_con_permiso(self):
+		self.user.user_permissions.add(Permission.objects.get(codename='cambiar_precio_venta'))
+		self.user = User.objects.get(pk=self.user.pk)
+		self.client.force_authenticate(self.user)
+		response = self.venta([
+			{'producto_id': self.productos[0], 'cantidad': 2, 'precio_unitario': '20.00'},
+			{'producto_id': self.productos[1], 'cantidad': 1},
+		])
+		self.assertEqual(Caja.objects.get(pk=response.data['venta_id']).total, Decimal('65.00'))
+
+	def test_producto_inexistente(self):
+		response = self.venta([{'producto_id': self.productos[0], 'cantidad': 1}, {'producto_id': 999999, 'cantidad': 1}])
+		self.assertEqual(response.status_code, 400)
+		self.assertIn('999999', response.data['error'])
+		self.assertFalse(Caja.objects.exists())
+		self.assertEqual(self.venta([{'producto_id': self.productos[0], 'cantidad': 0}]).status_code, 400)
+
+
+class SincronizarVentasTestCase(APITestCase):
+	def setUp(self):
+		self.client.force_authenticate(User.objects.create_user(username='cajero', password='test123'))
+		Producto.objects.bulk_create([Producto(nombre=f'Producto {i}', precio=Decimal('10.00')) for i in range(5)])
+		self.productos = list(Producto.objects.values_list('pk', flat=True))
+		self.url = reverse('sincronizar_ventas_api')
+
+	def lote(self, n, desde=0):
+		return [
+			{'clave': f'pos1-{i}', 'metodo_pago': 'efectivo', 'items': [{'producto_id': self.productos[i % 5], 'cantidad': 1}]}
+			for i in range(desde, desde + n)
+		]
+
+	def sincronizar(self, ventas):
+		return self.client.post(self.url, {'ventas': ventas}, format='json', secure=True)
+
+	def test_lote_en_una_transaccion_con_consultas_acotadas(self):
+		self.sincronizar(self.lote(1))  # La primera carga los permisos del usuario
+		with CaptureQueriesContext(connection) as pocas:
+			self.sincronizar(self.lote(5, desde=100))
+		with CaptureQueriesContext(connection) as muchas:
+			response = self.sincronizar(self.lote(200, desde=1000))
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.data['creadas'], 200)
+		# Solo crece el INSERT de cada Caja; líneas, movimientos y claves van en bulk_create
+		self.assertLessEqual(len(muchas) - len(pocas), 195 + 6)
+		self.assertEqual(Caja.objects.count(), 206)
+		self.assertEqual(CajaMovimiento.objects.filter(tipo='producto').count(), 206)
+
+	def test_reenvio_no_duplica(self):
+		primera = self.sincronizar(self.lote(3))
+		venta_ids = [r['venta_id'] for r in primera.data['resultados']]
+		segunda = self.sincronizar(self.lote(4))
+		self.assertEqual([r['estado'] for r in segunda.data['resultados']], ['duplicada'] * 3 + ['creada'])
+		self.assertEqual([r['venta_id'] for r in segunda.data['resultados']][:3], venta_ids)
+		self.assertEqual(Caja.objects.count(), 4)
+		self.assertEqual(ClaveVenta.objects.count(), 4)
+
+	def test_errores_por_venta(self):
+		ventas = self.lote(2) + [
+			{'clave': 'pos1-0', 'items': [{'producto_id': self.productos[0], 'cantidad': 1}]},
+			{'clave': 'pos1-x', 'items': [{'producto_id': 999999, 'cantidad': 1}]},
+			{'items': [{'producto_id': self.productos[0], 'cantidad': 1}]},
+		]
+		resultados = self.sincronizar(ventas).data['resultados']
+		self.assertEqual([r['estado'] for r in resultados], ['creada', 'creada', 'duplicada', 'error', 'error'])
+		self.assertIn('999999', resultados[3]['error'])
+		self.assertEqual(Caja.objects.count(), 2)
+
+	def test_la_venta_queda_en_la_fecha_del_cobro(self):
+		cobrada = timezone.now() - timedelta(days=1)
+		ventas = self.lote(3)
+		ventas[0]['fecha'] = cobrada.isoformat()
+		ventas[1]['fecha'] = (timezone.now() + timedelta(hours=1)).isoformat()
+		ventas[2]['fecha'] = (timezone.now() - timedelta(days=30)).isoformat()
+		resultados = self.sincronizar(ventas).data['resultados']
+		self.assertEqual([r['estado'] for r in resultados], ['creada', 'error', 'error'])
+		self.assertIn('futuro', resultados[1]['error'])
+		venta = Caja.objects.get(pk=resultados[0]['venta_id'])
+		self.assertEqual(venta.fecha, cobrada)
+		self.assertEqual(CajaMovimiento.objects.get(venta=venta).fecha, cobrada)
+		cierre = CierreCaja.objects.get()
+		self.assertEqual((cierre.fecha, cierre.movimientos), (timezone.localdate(cobrada), 1))
+
+	def test_registrar_venta_con_clave_es_idempotente(self):
+		datos = {'clave': 'unica', 'items': [{'producto_id': self.productos[0], 'cantidad': 2}]}
+		primera = self.client.post(reverse('registrar_venta_api'), datos, format='json', secure=True)
+		segunda = self.client.post(reverse('registrar_venta_api'), datos, format='json', secure=True)
+		self.assertEqual(primera.data['venta_id'], segunda.data['venta_id'])
+		self.assertEqual(Caja.objects.count(), 1)
+
+
+class InventarioTestCase(APITestCase):
+	def setUp(self):
+		user = User.objects.create_user(username='cajero', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='view_producto'))
+		self.client.force_authenticate(user)
+		self.agua = Producto.objects.create(nombre='Agua', precio=Decimal('15.00'), stock=5, stock_minimo=2)
+		self.toalla = Producto.objects.create(nombre='Toalla', precio=Decimal('80.00'))  # Sin inventario
+
+	def venta(self, items):
+		return self.client.post(reverse('registrar_venta_api'), {'items': items}, format='json', secure=True)
+
+	def test_venta_descuenta_y_registra_movimiento(self):
+		response = self.venta([
+			{'producto_id': self.agua.pk, 'cantidad': 2}, {'producto_id': self.agua.pk, 'cantidad': 1},
+			{'producto_id': self.toalla.pk, 'cantidad': 10},
+		])
+		self.assertEqual(response.status_code, 201)
+		self.agua.refresh_from_db()
+		self.toalla.refresh_from_db()
+		self.assertEqual(self.agua.stock, 2)
+		self.assertIsNone(self.toalla.stock)
+		self.assertEqual(
+			sorted(MovimientoStock.objects.filter(venta_id=response.data['venta_id']).values_list('producto_id', 'cantidad')),
+			[(self.agua.pk, -2), (self.agua.pk, -1)],
+		)
+
+	def test_no_se_vende_mas_de_lo_que_hay(self):
+		response = self.venta([{'producto_id': self.toalla.pk, 'cantidad': 1}, {'producto_id': self.agua.pk, 'cantidad': 6}])
+		self.assertEqual(response.status_code, 409)
+		self.assertIn('Agua (quedan 5)', response.data['error'])
+		# La venta entera se revierte
+		self.assertFalse(Caja.objects.exists())
+		self.assertFalse(MovimientoStock.objects.exists())
+		self.agua.refresh_from_db()
+		self.assertEqual(self.agua.stock, 5)
+
+	def test_sincronizacion_registra_ventas_sin_stock_como_faltante(self):
+		ventas = [
+			{'clave': f'pos-{i}', 'items': [{'producto_id': self.agua.pk, 'cantidad': 2}]} for i in range(3)
+		]
+		response = self.client.post(reverse('sincronizar_ventas_api'), {'ventas': ventas}, format='json', secure=True)
+		# Las ventas ya se cobraron sin conexión: se registran todas
+		self.assertEqual([r['estado'] for r in response.data['resultados']], ['creada'] * 3)
+		self.agua.refresh_from_db()
+		self.assertEqual(self.agua.stock, 0)
+		faltante = MovimientoStock.objects.get(motivo='faltante')
+		self.assertEqual((faltante.cantidad, faltante.venta_id), (1, response.data['resultados'][2]['venta_id']))
+		# Los movimientos siguen cuadrando con el stock inicial
+		self.assertEqual(sum(MovimientoStock.objects.values_list('cantidad', flat=True)), -5)
+
+	def test_ajustes_y_productos_por_reponer(self):
+		ajustar_stock(self.toalla.pk, 3, descripcion='Compra')
+		Producto.objects.filter(pk=self.toalla.pk).update(stock_minimo=3)
+		with self.assertRaises(StockInsuficiente):
+			ajustar_stock(self.agua.pk, -6)
+		ajustar_stock(self.agua.pk, -4)
+		self.assertEqual(list(por_reponer()), [self.agua, self.toalla])
+
+		response = self.client.get(reverse('productos_por_reponer_api'), secure=True)
+		self.assertEqual([p['nombre'] for p in response.data], ['Agua', 'Toalla'])
+		self.assertEqual(MovimientoStock.objects.filter(motivo='ajuste').count(), 2)
+
+
+@override_settings(CATALOGO_REVISION_SEGUNDOS=60)
+class CatalogoTestCase(APITestCase):
+	def setUp(self):
+		olvidar_catalogo()
+		self.addCleanup(olvidar_catalogo)
+		user = User.objects.create_user(username='cajero', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='add_cajamovimiento'))
+		self.client.force_login(user)
+		self.agua = Producto.objects.create(nombre='Agua', precio=Decimal('15.00'))
+
+	def pantalla(self):
+		with CaptureQueriesContext(connection) as contexto:
+			response = self.client.get(reverse('pago_productos'), secure=True)
+		self.assertEqual(response.status_code, 200)
+		return response, [q['sql'] for q in contexto.captured_queries if 'gimnasio_producto' in q['sql']]
+
+	def test_pantalla_y_venta_sin_consultar_productos(self):
+		self.pantalla()
+		response, consultas = self.pantalla()
+		self.assertEqual(consultas, [])
+		self.assertContains(response, 'Agua — $15.00')
+
+		with CaptureQueriesContext(connection) as contexto:
+			venta = self.client.post(
+				reverse('registrar_venta_api'), {'items': [{'producto_id': self.agua.pk, 'cantidad': 2}]},
+				format='json', secure=True,
+			)
+		self.assertEqual(venta.status_code, 201)
+		self.assertEqual(venta.data['total'], Decimal('30.00'))
+		# Precio y nombre salen del catálogo; solo se consulta qué productos llevan inventario
+		consultas = [q['sql'] for q in contexto.captured_queries if 'FROM "gimnasio_producto"' in q['sql']]
+		self.assertEqual(len(consultas), 1)
+		self.assertNotIn('"precio"', consultas[0])
+
+	def test_venta_descuenta_stock_que_el_catalogo_aun_no_conoce(self):
+		self.pantalla()
+		# Otro proceso empieza a llevar inventario; este aún tiene la foto sin stock
+		with connection.cursor() as cursor:
+			cursor.execute('UPDATE gimnasio_producto SET stock = 5 WHERE id = %s', [self.agua.pk])
+		Secuencia.objects.filter(nombre=VERSION_CATALOGO).update(ultimo_valor=F('ultimo_valor') + 1)
+
+		venta = registrar_venta([{'producto_id': self.agua.pk, 'cantidad': 2}])
+		self.agua.refresh_from_db()
+		self.assertEqual(self.agua.stock, 3)
+		self.assertEqual(list(MovimientoStock.objects.filter(venta=venta).values_list('cantidad', flat=True)), [-2])
+		with self.assertRaises(StockInsuficiente):
+			registrar_venta([{'producto_id': self.agua.pk, 'cantidad': 4}])
+
+	def test_pantalla_muestra_el_stock_actual(self):
+		barra = Producto.objects.create(nombre='Barra', precio=Decimal('25.00'), stock=3)
+		self.pantalla()
+		# Las ventas bajan el stock sin invalidar el catálogo
+		registrar_venta([{'producto_id': barra.pk, 'cantidad': 3}])
+		response, consultas = self.pantalla()
+		self.assertEqual(len(consultas), 1)
+		self.assertContains(response, 'disabled>Barra — $25.00 (0 en stock)')
+		self.assertContains(response, '">Agua — $15.00</option>')
+
+	def test_pantalla_envia_la_cola_en_lotes_que_el_servidor_acepta(self):
+		self.assertContains(self.pantalla()[0], f'const LOTE_VENTAS = {LOTE_MAXIMO_VENTAS};')
+
+	def test_guardar_o_borrar_un_producto_invalida_el_catalogo(self):
+		self.pantalla()
+		self.agua.precio = Decimal('18.00')
+		self.agua.save()
+		Producto.objects.bulk_create([Producto(nombre='Barra', precio=Decimal('25.00'))])
+		response, consultas = self.pantalla()
+		self.assertTrue(consultas)
+		self.assertContains(response, 'Agua — $18.00')
+		self.assertContains(response, 'Barra — $25.00')
+
+		Producto.objects.filter(nombre='Barra').delete()
+		self.assertNotContains(self.pantalla()[0], 'Barra')
+
+	def test_cambios_de_otro_proceso_se_ven_al_revisar_la_version(self):
+		self.pantalla()
+		# Otro proceso: cambia el precio y sube la versión sin pasar por este proceso
+		with connection.cursor() as cursor:
+			cursor.execute('UPDATE gimnasio_producto SET precio = 20 WHERE id = %s', [self.agua.pk])
+		Secuencia.objects.filter(nombre=VERSION_CATALOGO).update(ultimo_valor=F('ultimo_valor') + 1)
+
+		self.assertContains(self.pantalla()[0], 'Agua — $15.00')
+		with override_settings(CATALOGO_REVISION_SEGUNDOS=0):
+			self.assertContains(self.pantalla()[0], 'Agua — $20.00')
+
+
+class CierreCajaTestCase(TestCase):
+	def setUp(self):
+		self.producto = Producto.objects.create(nombre='Agua', precio=Decimal('15.00'))
+		entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		self.clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2030-01-07T08:00:00Z', entrenador=entrenador,
+			max_participantes=5, precio=100,
+		)
+		self.socio = Socio.objects.create(id_socio='S001', nombre='Ana', apellido='Test', telefono='123456789', domicilio='Dir')
+
+	def cierres(self):
+		return {(c.metodo_pago, c.tipo): (c.total, c.movimientos) for c in CierreCaja.objects.filter(fecha=timezone.localdate())}
+
+	def test_movimientos_actualizan_el_dia(self):
+		registrar_venta([{'producto_id': self.producto.pk, 'cantidad': 2}])
+		registrar_venta([{'producto_id': self.producto.pk, 'cantidad': 1}], metodo_pago='tarjeta')
+		inscribir(self.clase, self.socio, 'efectivo')
+		self.assertEqual(self.cierres(), {
+			('efectivo', 'producto'): (Decimal('30.00'), 1),
+			('tarjeta', 'producto'): (Decimal('15.00'), 1),
+			('efectivo', 'clase'): (Decimal('100.00'), 1),
+		})
+		cancelar(self.clase, self.socio)
+		self.assertEqual(self.cierres()[('efectivo', 'clase')], (Decimal('0.00'), 0))
+		hoy = timezone.localdate()
+		self.assertEqual(total_del_periodo(hoy, hoy), Decimal('45.00'))
+
+	def test_close_day_recalcula_y_sella(self):
+		ayer = timezone.localdate() - timedelta(days=1)
+		registrar_venta([{'producto_id': self.producto.pk, 'cantidad': 2}])
+		CajaMovimiento.objects.update(fecha=timezone.now() - timedelta(days=1))
+		# Totales desfasados a propósito: close_day los rehace desde los movimientos
+		CierreCaja.objects.create(fecha=ayer, metodo_pago='efectivo', tipo='producto', total=Decimal('999.00'), movimientos=9)
+		call_command('close_day', stdout=StringIO())
+		cierre = CierreCaja.objects.get(fecha=ayer)
+		self.assertEqual((cierre.total, cierre.movimientos, cierre.cerrado), (Decimal('30.00'), 1, True))
+
+		# Una baja sobre un día cerrado lo reabre hasta el próximo close_day
+		acumular([CajaMovimiento.objects.get()], signo=-1)
+		self.assertFalse(CierreCaja.objects.get(fecha=ayer).cerrado)
+
+	def test_caja_lee_los_cierres(self):
+		user = User.objects.create_user(username='cajero', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='view_cajamovimiento'))
+		self.client.force_login(user)
+		registrar_venta([{'producto_id': self.producto.pk, 'cantidad': 2}])
+		response = self.client.get(reverse('caja'), secure=True)
+		self.assertEqual(response.context['total_hoy'], Decimal('30.00'))
+		self.assertEqual(response.context['totales_hoy'], [('Efectivo', Decimal('30.00'))])
+
+
+class ReporteIngresosTestCase(APITestCase):
+	def setUp(self):
+		cache.clear()
+		user = User.objects.create_user(username='contador', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='view_cajamovimiento'))
+		self.client.force_authenticate(user)
+		self.agua = Producto.objects.create(nombre='Agua', precio=Decimal('15.00'))
+		self.barra = Producto.objects.create(nombre='Barra', precio=Decimal('40.00'))
+		self.url = reverse('reporte_ingresos_api')
+		# Ventas de enero y febrero de 2025, cerradas
+		for dia, producto, metodo in [
+			(date(2025, 1, 10), self.agua, 'efectivo'),
+			(date(2025, 1, 20), self.barra, 'tarjeta'),
+			(date(2025, 2, 3), self.agua, 'efectivo'),
+		]:
+			venta = registrar_venta([{'producto_id': producto.pk, 'cantidad': 2}], metodo_pago=metodo)
+			momento = timezone.make_aware(datetime.combine(dia, time(12)))
+			Caja.objects.filter(pk=venta.pk).update(fecha=momento)
+			CajaMovimiento.objects.filter(venta=venta).update(fecha=momento)
+		for dia in (date(2025, 1, 10), date(2025, 1, 20), date(2025, 2, 3)):
+			cerrar_dia(dia)
+		CierreCaja.objects.filter(fecha=timezone.localdate()).delete()
+
+	def reporte(self, **params):
+		return self.client.get(self.url, {'desde': '2025-01-01', 'hasta': '2025-02-28', **params}, secure=True)
+
+	def test_por_mes_y_metodo(self):
+		response = self.reporte(bucket='month', group_by='metodo_pago')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['total'], Decimal('140.00'))
+		enero, febrero = response.data['periodos']
+		self.assertEqual(enero['periodo'], date(2025, 1, 1))
+		self.assertEqual({g['grupo']: g['total'] for g in enero['grupos']}, {'efectivo': Decimal('30.00'), 'tarjeta': Decimal('80.00')})
+		self.assertEqual(febrero['total'], Decimal('30.00'))
+
+	def test_por_producto(self):
+		response = self.reporte(bucket='month', group_by='producto')
+		enero = response.data['periodos'][0]
+		self.assertEqual([(g['nombre'], g['cantidad']) for g in enero['grupos']], [('Agua', 2), ('Barra', 2)])
+
+	def test_periodo_cerrado_en_cache(self):
+		self.reporte(bucket='week')
+		with CaptureQueriesContext(connection) as contexto:
+			response = self.reporte(bucket='week')
+		self.assertEqual(len(contexto), 2)  # Solo los días abiertos y la versión de los cierres
+		self.assertEqual(len(response.data['periodos']), 3)
+
+		# Reabrir un día invalida la caché hasta el próximo close_day
+		acumular([CajaMovimiento.objects.filter(metodo_pago='tarjeta').get()], signo=-1)
+		self.assertEqual(self.reporte(bucket='week').data['total'], Decimal('60.00'))
+		cerrar_dia(date(2025, 1, 20))
+		self.assertEqual(self.reporte(bucket='week').data['total'], Decimal('140.00'))
+
+		# Volver a cerrar un día que se quedó sin movimientos no deja filas, pero también invalida
+		CajaMovimiento.objects.filter(metodo_pago='tarjeta').delete()
+		cerrar_dia(date(2025, 1, 20))
+		self.assertEqual(self.reporte(bucket='week').data['total'], Decimal('60.00'))
+
+	def test_parametros_invalidos(self):
+		self.assertEqual(self.reporte(bucket='year').status_code, 400)
+		self.assertEqual(self.reporte(group_by='socio').status_code, 400)
+		self.assertEqual(self.client.get(self.url, {'desde': '2025-02-01', 'hasta': '2025-01-01'}, secure=True).status_code, 400)
+		self.client.force_authenticate(User.objects.create_user(username='socio', password='test123'))
+		self.assertEqual(self.reporte().status_code, 403)
+
+
+class ExportacionTestCase(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='contador', password='test123')
+		self.user.user_permissions.add(Permission.objects.get(codename='view_cajamovimiento'))
+		self.client.force_authenticate(self.user)
+		CajaMovimiento.objects.bulk_create([
+			CajaMovimiento(tipo='otro', descripcion=f'Movimiento {i}', monto=Decimal('10.00')) for i in range(7)
+		])
+		CajaMovimiento.objects.filter(descripcion='Movimiento 6').update(
+			descripcion='=HYPERLINK("x")', fecha=timezone.make_aware(datetime(2024, 1, 15, 12)),
+		)
+
+	def descargar(self, **params):
+		response = self.client.get(reverse('exportar_api', args=['movimientos']), params, secure=True)
+		return response, b''.join(response.streaming_content).decode()
+
+	def test_filas_por_lotes_en_orden(self):
+		with CaptureQueriesContext(connection) as contexto:
+			ids = [fila[0] for fila in filas('movimientos', lote=3)]
+		self.assertEqual(ids, sorted(CajaMovimiento.objects.values_list('pk', flat=True)))
+		self.assertEqual(len(contexto), 3)
+
+	def test_csv_en_streaming(self):
+		response, contenido = self.descargar(formato='csv')
+		self.assertTrue(response.streaming)
+		self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+		lector = list(csv.reader(StringIO(contenido)))
+		self.assertEqual(lector[0][:3], ['id', 'fecha', 'tipo'])
+		self.assertEqual(len(lector), 8)
+		# Un texto que empieza con "=" no debe abrirse como fórmula
+		self.assertIn("'=HYPERLINK(\"x\")", [fila[3] for fila in lector])
+
+	def test_jsonl_filtrado_por_fecha(self):
+		_, contenido = self.descargar(formato='jsonl', desde='2024-01-01', hasta='2024-01-31')
+		filas_json = [json.loads(linea) for linea in contenido.splitlines()]
+		self.assertEqual([fila['descripcion'] for fila in filas_json], ['=HYPERLINK("x")'])
+
+	def test_permisos_y_recursos(self):
+		self.assertEqual(self.client.get(reverse('exportar_api', args=['socios']), secure=True).status_code, 403)
+		self.assertEqual(self.client.get(reverse('exportar_api', args=['usuarios']), secure=True).status_code, 404)
+		self.assertEqual(self.client.get(reverse('exportar_api', args=['movimientos']), {'formato': 'xml'}, secure=True).status_code, 400)
+
+	def test_administradores_exportan_todos_los_recursos(self):
+		call_command('setup_roles', stdout=StringIO())
+		admin = User.objects.create_user(username='recepcion', password='test123')
+		admin.groups.add(Group.objects.get(name='Administradores'))
+		self.client.force_authenticate(admin)
+		for recurso in EXPORTACIONES:
+			with self.subTest(recurso=recurso):
+				self.assertEqual(self.client.get(reverse('exportar_api', args=[recurso]), secure=True).status_code, 200)
+
+	def test_comando(self):
+		with tempfile.TemporaryDirectory() as carpeta:
+			ruta = os.path.join(carpeta, 'movimientos.jsonl')
+			call_command('export_data', 'movimientos', '--formato', 'jsonl', '--salida', ruta, stderr=StringIO())
+			with open(ruta, encoding='utf-8') as archivo:
+				self.assertEqual(len(archivo.readlines()), 7)
+
+
+class LibroCajaTestCase(TestCase):
+	def setUp(self):
+		user = User.objects.create_user(username='cajero', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='view_cajamovimiento'))
+		self.client.force_login(user)
+		entrenador = Entrenador.objects.create(
+			id_entrenador='001', nombre='Juan', especialidad='Cardio', telefono='123456789', fecha_contratacion='2024-01-01',
+		)
+		clase = Clase.objects.create(
+			id_clase='C1', nombre='Spinning', fecha_hora='2030-01-07T08:00:00Z', entrenador=entrenador, max_participantes=50, precio=100,
+		)
+		for i in range(12):
+			socio = Socio.objects.create(id_socio=f'S{i:03d}', nombre=f'Socio{i}', apellido='Test', telefono='123456789', domicilio='Dir')
+			inscribir(clase, socio, 'tarjeta' if i % 2 else 'efectivo')
+		# Varios movimientos en el mismo instante y otros separados por microsegundos
+		base = timezone.make_aware(datetime(2025, 3, 1, 10))
+		for i, movimiento in enumerate(CajaMovimiento.objects.order_by('pk')):
+			CajaMovimiento.objects.filter(pk=movimiento.pk).update(fecha=base + timedelta(microseconds=(i // 3) * 250))
+
+	def pagina(self, **params):
+		return self.client.get(reverse('caja'), {'formato': 'json', 'por_pagina': 5, **params}, secure=True).json()
+
+	def test_recorre_todo_sin_saltos(self):
+		vistos, cursor = [], None
+		while True:
+			data = self.pagina(**({'cursor': cursor} if cursor else {}))
+			vistos += [m['id'] for m in data['results']]
+			cursor = data['next_cursor']
+			if not cursor:
+				break
+		esperados = list(CajaMovimiento.objects.order_by('-fecha', '-id').values_list('pk', flat=True))
+		self.assertEqual(vistos, esperados)
+		self.assertTrue(all(m['concepto'].startswith('Clase: Spinning - Socio') for m in data['results']))
+
+	def test_consultas_fijas_por_pagina(self):
+		def consultas(**params):
+			with CaptureQueriesContext(connection) as contexto:
+				self.assertEqual(self.client.get(reverse('caja'), params, secure=True).status_code, 200)
+			return len(contexto)
+
+		self.assertEqual(consultas(por_pagina=2), consultas(por_pagina=12))
+
+	def test_filtros(self):
+		self.assertEqual(len(self.pagina(metodo_pago='tarjeta', por_pagina=50)['results']), 6)
+		self.assertEqual(len(self.pagina(socio='s003')['results']), 1)
+		self.assertEqual(len(self.pagina(desde='2025-03-01', hasta='2025-03-01', por_pagina=50)['results']), 12)
+		self.assertEqual(self.pagina(desde='2025-03-02')['results'], [])
+		response = self.client.get(reverse('caja'), {'tipo': 'clase', 'por_pagina': 5}, secure=True)
+		self.assertContains(response, 'tipo=clase')
+
+
+class TicketVentaTestCase(TestCase):
+	def setUp(self):
+		carpeta = tempfile.TemporaryDirectory()
+		self.addCleanup(carpeta.cleanup)
+		configuracion = override_settings(TICKETS_DIR=carpeta.name)
+		configuracion.enable()
+		self.addCleanup(configuracion.disable)
+
+		user = User.objects.create_user(username='cajero', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='view_cajamovimiento'))
+		self.client.force_login(user)
+		producto = Producto.objects.create(nombre='Agua', precio=Decimal('15.00'))
+		self.venta = registrar_venta([{'producto_id': producto.pk, 'cantidad': 2}], cliente='Ana')
+		self.url = reverse('ticket_venta_pdf', args=[self.venta.pk])
+
+	def test_se_genera_una_vez(self):
+		response = self.client.get(self.url, secure=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+		huella = Caja.objects.get(pk=self.venta.pk).ticket
+		self.assertEqual(response['ETag'], f'"{huella}"')
+		self.assertTrue(os.path.exists(ruta_ticket(huella)))
+
+		with CaptureQueriesContext(connection) as contexto:
+			repetido = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'], secure=True)
+		self.assertEqual(repetido.status_code, 304)
+		# Sesión, usuario y la venta: sin precargar líneas ni productos
+		self.assertFalse(any('gimnasio_ventaitem' in q['sql'] for q in contexto.captured_queries))
+
+	def test_se_regenera_si_falta_el_archivo(self):
+		primera = self.client.get(self.url, secure=True)
+		os.remove(ruta_ticket(Caja.objects.get(pk=self.venta.pk).ticket))
+		segunda = self.client.get(self.url, secure=True)
+		self.assertEqual(segunda.status_code, 200)
+		# Mismo contenido, misma huella
+		self.assertEqual(primera['ETag'], segunda['ETag'])
+
+	def test_formatos_para_impresora_termica(self):
+		escpos = self.client.get(self.url, {'formato': 'escpos'}, secure=True)
+		self.assertEqual(escpos['Content-Type'], 'application/octet-stream')
+		self.assertTrue(escpos.content.startswith(b'\x1b@'))
+		self.assertTrue(escpos.content.endswith(b'\x1dVB\x00'))
+		self.assertIn('Cliente: Ana'.encode('cp850'), escpos.content)
+
+		texto = self.client.get(self.url, {'formato': 'texto'}, secure=True).content.decode()
+		renglon_total = next(linea for linea in texto.splitlines() if linea.startswith('TOTAL:'))
+		self.assertEqual(len(renglon_total), 48)
+		self.assertTrue(renglon_total.endswith('$30.00'))
+		self.assertFalse(Caja.objects.get(pk=self.venta.pk).ticket)  # No genera el PDF
+
+
+class ImpresionLoteTestCase(TestCase):
+	def setUp(self):
+		carpeta = tempfile.TemporaryDirectory()
+		self.addCleanup(carpeta.cleanup)
+		configuracion = override_settings(TICKETS_DIR=carpeta.name, IMPRESION_WORKERS=2)
+		configuracion.enable()
+		self.addCleanup(configuracion.disable)
+
+		user = User.objects.create_user(username='cajero', password='test123')
+		user.user_permissions.add(Permission.objects.get(codename='view_cajamovimiento'))
+		self.client.force_login(user)
+		producto = Producto.objects.create(nombre='Agua', precio=Decimal('15.00'))
+		self.ventas = [registrar_venta([{'producto_id': producto.pk, 'cantidad': n}]) for n in (1, 2, 3)]
+		self.hoy = timezone.localdate().isoformat()
+
+	def test_tickets_en_varios_procesos(self):
+		response = self.client.get(
+			reverse('imprimir_lote_api'), {'desde': self.hoy, 'hasta': self.hoy}, secure=True,
+		)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Content-Type'], 'application/zip')
+		archivo = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+		self.assertEqual(archivo.namelist(), [f'ticket_venta_{venta.pk}.pdf' for venta in self.ventas])
+		# Los PDF quedan guardados y anotados en cada venta
+		for venta in Caja.objects.filter(pk__in=[v.pk for v in self.ventas]):
+			with open(ruta_ticket(venta.ticket), 'rb') as guardado:
+				self.assertEqual(guardado.read(), archivo.read(f'ticket_venta_{venta.pk}.pdf'))
+
+		fuera_de_rango = self.client.get(
+			reverse('imprimir_lote_api'), {'desde': '2025-01-01', 'hasta': '2025-12-31'}, secure=True,
+		)
+		self.assertEqual(fuera_de_rango.status_code, 400)
+
+	def test_estados_de_cuenta_por_socio_y_mes(self):
+		socio = Socio.objects.create(id_socio='S001', nombre='Ana', apellido='Paz', telefono='123456789', domicilio='Dir')
+		CajaMovimiento.objects.create(tipo='mensualidad', descripcion='Mensualidad', monto=Decimal('300.00'), socio=socio)
+		CajaMovimiento.objects.create(tipo='clase', descripcion='Yoga', monto=Decimal('50.00'), socio=socio)
+
+		with tempfile.TemporaryDirectory() as carpeta:
+			salida = os.path.join(carpeta, 'estados.zip')
+			call_command('render_tickets', salida, desde=self.hoy, hasta=self.hoy, tipo='estados', stdout=StringIO())
+			with zipfile.ZipFile(salida) as archivo:
+				self.assertEqual(archivo.namelist(), [f"estado_S001_{timezone.localdate():%Y-%m}.pdf"])
+				self.assertTrue(archivo.read(archivo.namelist()[0]).startswith(b'%PDF'))
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from .models import Caja
+
+
+def ruta_ticket(huella):
+    """Archivo del ticket dentro de TICKETS_DIR, repartido por los dos primeros caracteres."""
+    return os.path.join(settings.TICKETS_DIR, huella[:2], f'{huella}.pdf')
+
+
+def disposicion(venta, items):
+    """
+    Contenido del ticket como instrucciones comunes a todos los formatos:
+    ('centro', texto, tamaño, avance_mm), ('fila', izquierda, derecha, negrita, avance_mm),
+    ('linea', avance_mm) y ('espacio', avance_mm).
+    """
+    ops = [
+        ('centro', "Control Gym", 12, 6),
+        ('centro', "Ticket de Venta", 11, 8),
+        ('fila', f"N°: {venta.id}", '', False, 5),
+        ('fila', venta.fecha.strftime("Fecha: %d/%m/%Y %H:%M"), '', False, 5),
+        ('fila', f"Método: {venta.get_metodo_pago_display()}", '', False, 5),
+    ]
+    if venta.cliente:
+        ops.append(('fila', f"Cliente: {venta.cliente}", '', False, 5))
+
+    ops += [('linea', 5), ('fila', "Producto", "Subtotal", False, 4), ('linea', 4)]
+    for it in items:
+        ops.append(('fila', f"{it.producto.nombre} x{it.cantidad}"[:30], f"${it.subtotal:.2f}", False, 5))
+
+    ops += [('linea', 6), ('fila', "TOTAL:", f"${venta.total:.2f}", True, 8)]
+    if venta.observacion:
+        ops.append(('fila', "Obs:", '', False, 5))
+        ops += [('fila', line[:40], '', False, 4) for line in str(venta.observacion).splitlines()]
+        ops.append(('espacio', 2))
+
+    ops += [('linea', 6), ('centro', "¡Gracias por su compra!", 10, 0)]
+    return ops
+
+
+def renderizar_ticket(venta):
+    """PDF tipo ticket de 80 mm; `venta` debe traer precargado items__producto."""
+    items = list(venta.items.all())
+    ancho = 80 * mm
+    alto_base = 110 * mm
+    alto_por_item = 6 * mm
+    alto = alto_base + len(items) * alto_por_item
+    pagesize = (ancho, alto)
+
+    salida = BytesIO()
+    # invariant: sin fecha de creación ni ID aleatorio, así la misma venta da los mismos bytes
+    c = canvas.Canvas(salida, pagesize=pagesize, invariant=1)
+    y = alto - 8 * mm
+
+    for op in disposicion(venta, items):
+        if op[0] == 'centro':
+            _, texto, tamano, avance = op
+            c.setFont("Helvetica-Bold", tamano)
+            c.drawCentredString(ancho / 2, y, texto)
+        elif op[0] == 'fila':
+            _, izquierda, derecha, negrita, avance = op
+            c.setFont(*(("Helvetica-Bold", 11) if negrita else ("Helvetica", 10)))
+            c.drawString(6 * mm, y, izquierda)
+            if derecha:
+                c.drawRightString(ancho - 6 * mm, y, derecha)
+        elif op[0] == 'linea':
+            _, avance = op
+            c.line(6 * mm, y, ancho - 6 * mm, y)
+        else:
+            _, avance = op
+        y -= avance * mm
+
+    c.showPage()
+    c.save()
+    return salida.getvalue()
+
+
+# Papel de 80 mm con la fuente A: 48 columnas
+COLUMNAS = 48
+
+ESC_INICIAR = b'\x1b@'
+ESC_PAGINA_850 = b'\x1bt\x02'  # Tabla PC850: acentos, ñ, ¡ y °
+ESC_CENTRAR, ESC_IZQUIERDA = b'\x1ba\x01', b'\x1ba\x00'
+ESC_NEGRITA, ESC_NORMAL = b'\x1bE\x01', b'\x1bE\x00'
+ESC_CORTE = b'\x1bd\x04\x1dVB\x00'  # Avanza 4 líneas y corte parcial
+
+
+def _renglones(venta, items):
+    """(texto, centrado, negrita) de cada renglón a COLUMNAS caracteres."""
+    for op in disposicion(venta, items):
+        if op[0] == 'centro':
+            yield op[1][:COLUMNAS], True, op[2] >= 11
+        elif op[0] == 'fila':
+            _, izquierda, derecha, negrita, _ = op
+            if derecha:
+                izquierda = izquierda[:COLUMNAS - len(derecha) - 1].ljust(COLUMNAS - len(derecha))
+            yield (izquierda + derecha)[:COLUMNAS], False, negrita
+        elif op[0] == 'linea':
+            yield '-' * COLUMNAS, False, False
+        else:
+            yield '', False, False
+
+
+def renderizar_texto(venta):
+    """Ticket en texto plano de ancho fijo (para impresoras sin ESC/POS o vista previa)."""
+    items = list(venta.items.all())
+    return '\n'.join(
+        texto.center(COLUMNAS).rstrip() if centrado else texto
+        for texto, centrado, _ in _renglones(venta, items)
+    ) + '\n'
+
+
+def renderizar_escpos(venta):
+    """Ticket como flujo ESC/POS listo para enviar a la impresora térmica."""
+    items = list(venta.items.all())
+    salida = [ESC_INICIAR, ESC_PAGINA_850]
+    for texto, centrado, negrita in _renglones(venta, items):
+        salida += [
+            ESC_CENTRAR if centrado else ESC_IZQUIERDA,
+            ESC_NEGRITA if negrita else ESC_NORMAL,
+            texto.encode('cp850', errors='replace') + b'\n',
+        ]
+    salida += [ESC_NORMAL, ESC_IZQUIERDA, ESC_CORTE]
+    return b''.join(salida)
+
+
+def guardar_pdf(contenido):
+    """Guarda el PDF con su sha256 como nombre (si ya existe no se reescribe) y devuelve la huella."""
+    huella = hashlib.sha256(contenido).hexdigest()
+    ruta = ruta_ticket(huella)
+    if not os.path.exists(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otro proceso nunca ve un PDF a medias
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    return huella
+
+
+def generar_ticket(venta):
+    """Renderiza y guarda el ticket de `venta` y anota su huella en la venta."""
+    huella = guardar_pdf(renderizar_ticket(venta))
+    if venta.ticket != huella:
+        Caja.objects.filter(pk=venta.pk).update(ticket=huella)
+        venta.ticket = huella
+    return huella
+
+
+def ticket_guardado(venta):
+    """Huella del ticket si el archivo sigue en disco (solo un stat), o None."""
+    if venta.ticket and os.path.exists(ruta_ticket(venta.ticket)):
+        return venta.ticket
+    return None
@@ -17,8 +17,11 @@ urlpatterns = [
     path('clase-form/', views.clase_form, name='clase_form'), 
     path('clase-form/<int:pk>/', views.clase_form, name='clase_form'), 
     path('clase-delete/<int:pk>/', views.eliminar_clase, name='eliminar_clase'), 
+    path('clase-serie-form/', views.clase_serie_form, name='clase_serie_form'),
+    path('clase-serie-form/<int:pk>/', views.clase_serie_form, name='clase_serie_form'),
     path('clase/inscripcion/<int:pk>/', views.inscripcion_clase_detalle, name='inscripcion_clase_detalle'), 
     path('clases/<int:clase_pk>/eliminar-inscripcion/<int:socio_pk>/', views.eliminar_inscripcion_clase, name='eliminar_inscripcion_clase'),
+    path('clases/<int:clase_pk>/quitar-espera/<int:socio_pk>/', views.quitar_de_espera, name='quitar_de_espera'),
 
     # URLs para Instructores (Nombres de URL corregidos)
     path('instructores/', views.instructores_list, name='instructores_list'),
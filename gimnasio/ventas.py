@@ -0,0 +1,220 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .catalogo import productos as productos_del_catalogo
+from .cierres import acumular
+from .inventario import descontar_ventas
+from .models import Caja, CajaMovimiento, ClaveVenta, VentaItem
+
+
+# Permiso para cobrar un precio distinto al de catálogo (descuentos, promociones)
+PERMISO_CAMBIAR_PRECIO = 'gimnasio.cambiar_precio_venta'
+
+# Ventas por llamada a sincronizar_ventas
+LOTE_MAXIMO_VENTAS = 500
+
+# Tolerancia para relojes de punto de venta algo adelantados
+DESFASE_RELOJ = timedelta(minutes=5)
+
+
+class VentaError(ValueError):
+    pass
+
+
+class SincronizacionConcurrente(VentaError):
+    """Otra petición registró alguna de las mismas claves a la vez; basta con reintentar."""
+
+
+def leer_items(items_data):
+    """
+    Normaliza las líneas recibidas a (producto_id, cantidad, precio o None).
+    Las líneas sin producto o con cantidad/precio no válidos se descartan,
+    igual que hacía la vista original.
+    """
+    try:
+        items = []
+        for item_data in items_data:
+            pid = item_data.get("producto_id")
+            cant = int(item_data.get("cantidad", 0))
+            precio = item_data.get("precio_unitario")
+            punit = Decimal(str(precio)) if precio not in (None, '') else None
+            if not pid or cant <= 0 or (punit is not None and punit < 0):
+                continue
+            items.append((int(pid), cant, punit))
+    except (AttributeError, InvalidOperation, TypeError, ValueError) as e:
+        raise VentaError(f'Datos de entrada inválidos: {e}')
+    if not items:
+        raise VentaError("Agrega al menos un producto válido.")
+    return items
+
+
+def preparar_lineas(items, productos, permite_precio=False):
+    """
+    Arma los VentaItem (sin guardar) y el total. El precio es el de catálogo
+    salvo que `permite_precio` sea True y la línea traiga `precio_unitario`.
+    """
+    faltantes = sorted({pid for pid, _, _ in items if pid not in productos})
+    if faltantes:
+        raise VentaError(f"Producto(s) no encontrado(s): {', '.join(map(str, faltantes))}.")
+
+    lineas = []
+    total = Decimal("0.00")
+    for pid, cant, punit in items:
+        producto = productos[pid]
+        if punit is None or not permite_precio:
+            punit = producto.precio
+        subtotal = punit * cant
+        total += subtotal
+        lineas.append(VentaItem(producto=producto, cantidad=cant, precio_unitario=punit, subtotal=subtotal))
+    return lineas, total
+
+
+def _guardar(preparadas, forzar_stock=False):
+    """
+    Guarda en una transacción las ventas preparadas [(datos, lineas, total, clave)]:
+    un INSERT por venta, un bulk_create para todas las líneas, movimientos y claves
+    y un UPDATE de stock por producto con inventario. Si el stock no alcanza
+    se lanza StockInsuficiente y no se guarda nada, salvo con `forzar_stock`
+    (ver descontar_ventas).
+    """
+    try:
+        with transaction.atomic():
+            ventas = []
+            for datos, lineas, total, _ in preparadas:
+                venta = Caja.objects.create(total=total, **datos)
+                for linea in lineas:
+                    linea.venta = venta
+                ventas.append(venta)
+            VentaItem.objects.bulk_create([linea for _, lineas, _, _ in preparadas for linea in lineas])
+            descontar_ventas([(venta, lineas) for venta, (_, lineas, _, _) in zip(ventas, preparadas)], forzar=forzar_stock)
+            movimientos = CajaMovimiento.objects.bulk_create([
+                CajaMovimiento(
+                    tipo='producto',
+                    descripcion=f'Venta #{venta.id} - {len(lineas)} item(s)',
+                    metodo_pago=venta.metodo_pago,
+                    monto=venta.total,
+                    venta=venta,
+                    fecha=venta.fecha,
+                )
+                for venta, (_, lineas, _, _) in zip(ventas, preparadas)
+            ])
+            acumular(movimientos)
+            ClaveVenta.objects.bulk_create([
+                ClaveVenta(clave=clave, venta=venta)
+                for venta, (_, _, _, clave) in zip(ventas, preparadas) if clave
+            ])
+    except IntegrityError:
+        raise SincronizacionConcurrente("Otra sincronización registró estas ventas al mismo tiempo; reintenta.")
+    return ventas
+
+
+def leer_fecha(valor, ahora):
+    """
+    Hora en que se cobró una venta sin conexión (ISO 8601, la envía el punto de
+    venta). Sin valor es `ahora`; no se aceptan fechas futuras ni más antiguas
+    que VENTAS_SIN_CONEXION_DIAS.
+    """
+    if not valor:
+        return ahora
+    try:
+        fecha = parse_datetime(str(valor))
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise VentaError(f'Fecha de venta inválida: {valor}.')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    if fecha > ahora + DESFASE_RELOJ:
+        raise VentaError('La fecha de la venta está en el futuro.')
+    if fecha < ahora - timedelta(days=settings.VENTAS_SIN_CONEXION_DIAS):
+        raise VentaError(f'La venta tiene más de {settings.VENTAS_SIN_CONEXION_DIAS} días.')
+    return min(fecha, ahora)
+
+
+def _datos_venta(venta_data, ahora):
+    return {
+        'metodo_pago': venta_data.get("metodo_pago", "efectivo"),
+        'cliente': venta_data.get("cliente", ""),
+        'observacion': venta_data.get("observacion", ""),
+        'fecha': leer_fecha(venta_data.get("fecha"), ahora),
+    }
+
+
+def registrar_venta(items_data, metodo_pago='efectivo', cliente='', observacion='', permite_precio=False, clave=None):
+    """
+    Registra una venta con un número fijo de consultas sin importar cuántas
+    líneas tenga (los productos salen del catálogo en memoria y las líneas
+    van en un bulk_create). Con `clave` la operación es idempotente: si ya se
+    registró se devuelve la venta existente.
+    Lanza VentaError si no hay líneas válidas o algún producto no existe y
+    StockInsuficiente si no alcanza el stock de algún producto.
+    """
+    if clave:
+        existente = Caja.objects.filter(clave_offline__clave=clave).first()
+        if existente:
+            return existente
+    items = leer_items(items_data)
+    productos = productos_del_catalogo({pid for pid, _, _ in items})
+    lineas, total = preparar_lineas(items, productos, permite_precio)
+    datos = {'metodo_pago': metodo_pago, 'cliente': cliente, 'observacion': observacion}
+    return _guardar([(datos, lineas, total, clave)])[0]
+
+
+def sincronizar_ventas(ventas_data, permite_precio=False):
+    """
+    Registra un lote de ventas hechas sin conexión, cada una con su `clave`
+    generada en el punto de venta y la `fecha` en que se cobró. Las claves ya registradas se informan como
+    'duplicada' con su venta original; las ventas válidas se guardan todas en
+    una sola transacción. Las ventas ya se cobraron, así que se registran aunque
+    el stock no alcance: la diferencia queda como movimiento 'faltante' para
+    revisarla en el inventario. Devuelve [{'clave', 'estado', 'venta_id', 'error'}]
+    en el orden recibido.
+    """
+    if len(ventas_data) > LOTE_MAXIMO_VENTAS:
+        raise VentaError(f'Se pueden sincronizar como máximo {LOTE_MAXIMO_VENTAS} ventas por lote.')
+
+    claves = [str(venta_data.get('clave') or '').strip() for venta_data in ventas_data]
+    existentes = dict(ClaveVenta.objects.filter(clave__in=[c for c in claves if c]).values_list('clave', 'venta_id'))
+
+    resultados = []
+    pendientes = []
+    vistas = set()
+    for clave, venta_data in zip(claves, ventas_data):
+        resultado = {'clave': clave, 'estado': 'error', 'venta_id': None, 'error': None}
+        resultados.append(resultado)
+        if not clave or len(clave) > 64:
+            resultado['error'] = 'Cada venta necesita una clave de hasta 64 caracteres.'
+        elif clave in existentes:
+            resultado.update(estado='duplicada', venta_id=existentes[clave])
+        elif clave in vistas:
+            resultado.update(estado='duplicada', error='Clave repetida dentro del lote.')
+        else:
+            vistas.add(clave)
+            try:
+                pendientes.append((resultado, venta_data, leer_items(venta_data.get('items', []))))
+            except VentaError as e:
+                resultado['error'] = str(e)
+
+    productos = productos_del_catalogo({pid for _, _, items in pendientes for pid, _, _ in items})
+    ahora = timezone.now()
+    preparadas = []
+    aceptados = []
+    for resultado, venta_data, items in pendientes:
+        try:
+            datos = _datos_venta(venta_data, ahora)
+            lineas, total = preparar_lineas(items, productos, permite_precio)
+        except VentaError as e:
+            resultado['error'] = str(e)
+            continue
+        preparadas.append((datos, lineas, total, resultado['clave']))
+        aceptados.append(resultado)
+
+    guardadas = _guardar(preparadas, forzar_stock=True) if preparadas else []
+    for resultado, venta in zip(aceptados, guardadas):
+        resultado.update(estado='creada', venta_id=venta.id)
+    return resultados
@@ -4,12 +4,10 @@ from django.contrib import messages
 from django.db.models import Q
 from django.utils.crypto import get_random_string
 from datetime import date, timedelta
-from .models import Clase, Entrenador, Socio, Suscripcion,InscripcionClase, Producto, Caja, VentaItem, CajaMovimiento
+from .models import Clase, ClaseSerie, Entrenador, Socio, Suscripcion,InscripcionClase, Producto, Caja, VentaItem, CajaMovimiento
 from decimal import Decimal, InvalidOperation
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import mm
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
 from django.views.generic import TemplateView
 from django.db.models import Sum
 from django.contrib.auth.decorators import login_required, user_passes_test, permission_required
@@ -20,14 +18,56 @@ from django.contrib.auth.models import User, Group
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from .whatsapp import send_whatsapp_message
+from .catalogo import productos_con_stock
+from .ventas import LOTE_MAXIMO_VENTAS
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from datetime import datetime
 from django.conf import settings
+from urllib.parse import urlencode
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
 # Importar funciones de seguridad XSS
 from .security import sanitize_text_input, sanitize_search_query, escape_javascript_string
+from .secuencias import siguiente_id
+from .cierres import inicio_del_dia, totales_por_metodo
+from .tickets import generar_ticket, renderizar_escpos, renderizar_texto, ruta_ticket, ticket_guardado
+from .paginacion import paginar_keyset, leer_por_pagina
+from .busqueda import buscar_socios
+from .inscripciones import inscribir_o_esperar, cancelar, salir_de_espera, llenar_desde_espera, InscripcionError, YaInscrito
+from .agenda import leer_fecha_hora, validar_disponibilidad, validar_duracion
+
+
+SOCIOS_ORDEN = ('apellido', 'nombre', 'id')
+
+
+def _paginar_socios(request, socios):
+    por_pagina = leer_por_pagina(request.GET.get('por_pagina'))
+    pagina = paginar_keyset(socios, SOCIOS_ORDEN, request.GET.get('cursor'), por_pagina)
+    return pagina, por_pagina
+
+
+def _socios_json(pagina):
+    """Variante JSON de una página de socios para carga progresiva."""
+    resultados = []
+    for socio in pagina:
+        suscripcion = socio.suscripcion_activa
+        resultados.append({
+            'pk': socio.pk,
+            'id_socio': socio.id_socio,
+            'nombre': socio.nombre,
+            'apellido': socio.apellido,
+            'telefono': socio.telefono,
+            'tipo_socio': socio.tipo_socio,
+            'estado': socio.estado,
+            'vencimiento': suscripcion.fecha_fin if suscripcion else None,
+        })
+    return JsonResponse({
+        'results': resultados,
+        'next_cursor': pagina.next_cursor,
+        'prev_cursor': pagina.prev_cursor,
+    })
 
 
 @login_required
@@ -38,29 +78,24 @@ def dashboard(request):
     total_clases = Clase.objects.count()
     total_entrenadores = Entrenador.objects.count()
 
-    socios = Socio.objects.all()
+    socios = Socio.objects.with_current_subscription()
     # Sanitizar query de búsqueda
     query = sanitize_search_query(request.GET.get('q', ''))
     if query:
-        socios = socios.filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query) |
-            Q(id_socio__icontains=query)
-        )
-    today = date.today()
-    for socio in socios:
-        if socio.tipo_socio == 'interno':
-            socio.suscripcion_activa = socio.suscripciones.filter(activa=True).first() or socio.suscripciones.order_by('-fecha_inicio').first()
-        else:
-            socio.suscripcion_activa = None
-            
+        socios = buscar_socios(socios, query)
+    pagina, por_pagina = _paginar_socios(request, socios)
+    if request.GET.get('formato') == 'json':
+        return _socios_json(pagina)
+
     context = {
         'total_socios': total_socios,
         'total_clases': total_clases,
         'total_entrenadores': total_entrenadores,
-        'socios': socios,
+        'socios': pagina,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
         'query': query,
-        'today': today,
+        'today': date.today(),
     }
     
     return render(request, 'gimnasio/dashboard.html', context)
@@ -180,26 +215,22 @@ def registro_usuario(request):
 @login_required
 @permission_required('gimnasio.view_socio', login_url='perfil_socio', raise_exception=False)
 def socios_list(request):
-    socios = Socio.objects.all()
+    socios = Socio.objects.with_current_subscription()
     # Sanitizar query de búsqueda
     query = sanitize_search_query(request.GET.get('q', ''))
     if query:
-        socios = socios.filter(
-            Q(nombre__icontains=query) |
-            Q(apellido__icontains=query) |
-            Q(id_socio__icontains=query)
-        )
-        
-    for socio in socios:
-        if socio.tipo_socio == 'interno':
-            socio.suscripcion_activa = socio.suscripciones.filter(activa=True).first() or socio.suscripciones.order_by('-fecha_inicio').first()
-        else:
-            socio.suscripcion_activa = None
+        socios = buscar_socios(socios, query)
+    pagina, por_pagina = _paginar_socios(request, socios)
+    if request.GET.get('formato') == 'json':
+        return _socios_json(pagina)
 
     temp_password_data = request.session.pop('temp_password_data', None)
     
     context = {
-        'socios': socios,
+        'socios': pagina,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'query': query,
         'temp_password_data': temp_password_data,
     }
     return render(request, 'gimnasio/socios_list.html', context)
@@ -231,12 +262,7 @@ def socio_form(request, pk=None):
 
                 # Generar id_socio único (solo para nuevo)
                 if not socio:
-                    contador = Socio.objects.count() + 1
-                    id_socio_propuesto = f"S{contador:03d}"
-                    while Socio.objects.filter(id_socio=id_socio_propuesto).exists():
-                        contador += 1
-                        id_socio_propuesto = f"S{contador:03d}"
-                    id_socio = id_socio_propuesto
+                    id_socio = siguiente_id('socio')
                 else:
                     id_socio = socio.id_socio
 
@@ -259,7 +285,6 @@ def socio_form(request, pk=None):
                         telefono=telefono,
                         domicilio=domicilio,
                         tipo_socio=tipo_socio,
-                        estado='activo'
                     )
                     messages.success(request, f'Socio {nombre} {apellido} creado correctamente.')
 
@@ -271,13 +296,8 @@ def socio_form(request, pk=None):
                         suscripcion.fecha_inicio = fecha_inicio
                         suscripcion.save()  # Recalcula fin/monto
                     else:  # Crear nueva
-                        contador_sus = Suscripcion.objects.count() + 1
-                        id_sus_propuesto = f"SUB{contador_sus:03d}"
-                        while Suscripcion.objects.filter(id_suscripcion=id_sus_propuesto).exists():
-                            contador_sus += 1
-                            id_sus_propuesto = f"SUB{contador_sus:03d}"
                         Suscripcion.objects.create(
-                            id_suscripcion=id_sus_propuesto,
+                            id_suscripcion=siguiente_id('suscripcion'),
                             socio=socio,
                             tipo=tipo_suscripcion,
                             fecha_inicio=fecha_inicio
@@ -432,7 +452,7 @@ def perfil_socio(request):
         'socio': socio,
         'suscripcion': suscripcion,
         'clases_inscritas': clases_inscritas,
-        'clases_activas': Clase.objects.all(), 
+        'clases_activas': Clase.objects.filter(fecha_hora__gte=timezone.now()).order_by('fecha_hora'),
     }
     return render(request, 'gimnasio/perfil_socio.html', context)
 
@@ -461,6 +481,15 @@ def perfil_instructores_list(request):
             Q(telefono__icontains=query)
         )
     return render(request, 'gimnasio/perfil_instructores_list.html', {'entrenadores': entrenadores, 'query': query})
+
+
+def _mensaje_inscripcion(request, socio, clase, espera):
+    if espera is None:
+        messages.success(request, f'¡Inscripción exitosa! {socio.nombre} inscrito a la clase de {clase.nombre} por ${clase.precio}.')
+    else:
+        lugar = clase.lista_espera.filter(posicion__lte=espera.posicion).count()
+        messages.info(request, f'La clase {clase.nombre} está llena: {socio.nombre} quedó en lista de espera (lugar {lugar}).')
+
 @login_required
 @permission_required('gimnasio.add_inscripcionclase', login_url='perfil_socio', raise_exception=False)
 def inscribir_a_clase(request, socio_id, clase_id):
@@ -468,26 +497,14 @@ def inscribir_a_clase(request, socio_id, clase_id):
     clase = get_object_or_404(Clase, pk=clase_id)
     
     if request.method == 'POST':
-        movimiento = CajaMovimiento.objects.create(
-            tipo='clase',
-            descripcion=f"Pago Clase {clase.nombre} - Socio {socio.id_socio}",
-            metodo_pago=request.POST.get('metodo', 'efectivo'),
-            monto=clase.precio,
-            socio=socio,
-        )
-        inscripcion = InscripcionClase.objects.create(
-            id_inscripcion=f"INS{date.today().strftime('%Y%m%d')}-{socio.id_socio}-{clase.id_clase}",
-            socio=socio,
-            clase=clase,
-            movimiento_caja=movimiento
-        )
-        
-        movimiento.inscripcion_clase = inscripcion
-        movimiento.save()
-        
-        clase.participantes.add(socio)
-        
-        messages.success(request, f'{socio.nombre} inscrito a {clase.nombre} por ${clase.precio}.')
+        try:
+            _, espera = inscribir_o_esperar(clase, socio, request.POST.get('metodo', 'efectivo'))
+        except YaInscrito as e:
+            messages.warning(request, str(e))
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            _mensaje_inscripcion(request, socio, clase, espera)
         return redirect('lista_clases')
     
     context = {'socio': socio, 'clase': clase}
@@ -503,7 +520,7 @@ def clase_form(request, pk=None):
 
     if request.method == 'POST':
         # Campos de Clase - Sanitizar entrada
-        id_clase = request.POST.get('id_clase', get_random_string(length=10))
+        id_clase = request.POST.get('id_clase', '').strip()
         nombre = sanitize_text_input(request.POST.get('nombre', ''))
         descripcion = sanitize_text_input(request.POST.get('descripcion', ''))
         fecha_hora = request.POST.get('fecha_hora', '')
@@ -519,26 +536,40 @@ def clase_form(request, pk=None):
             
         entrenador = get_object_or_404(Entrenador, pk=entrenador_pk)
 
-        # Crear o actualizar Clase
-        if clase is None:
-            if Clase.objects.filter(id_clase=id_clase).exists():
-                id_clase = get_random_string(length=10)
-            clase = Clase(
-                id_clase=id_clase, nombre=nombre, descripcion=descripcion, 
-                fecha_hora=fecha_hora, duracion_minutos=duracion_minutos,
-                entrenador=entrenador, max_participantes=max_participantes,
-                precio=precio
-            )
-        else:
-            clase.nombre = nombre
-            clase.descripcion = descripcion
-            clase.fecha_hora = fecha_hora
-            clase.duracion_minutos = duracion_minutos
-            clase.entrenador = entrenador
-            clase.max_participantes = max_participantes
-            clase.precio = precio
-            
-        clase.save()
+        # Evitar que el entrenador quede con dos clases a la vez: la validación y
+        # el guardado van en una transacción con el entrenador bloqueado
+        try:
+            with transaction.atomic():
+                duracion_minutos = validar_duracion(duracion_minutos)
+                validar_disponibilidad(
+                    entrenador.pk, leer_fecha_hora(fecha_hora), duracion_minutos,
+                    excluir_pk=clase.pk if clase else None,
+                )
+
+                # Crear o actualizar Clase
+                if clase is None:
+                    clase = Clase(
+                        id_clase=id_clase or siguiente_id('clase'), nombre=nombre, descripcion=descripcion, 
+                        fecha_hora=fecha_hora, duracion_minutos=duracion_minutos,
+                        entrenador=entrenador, max_participantes=max_participantes,
+                        precio=precio
+                    )
+                else:
+                    clase.nombre = nombre
+                    clase.descripcion = descripcion
+                    clase.fecha_hora = fecha_hora
+                    clase.duracion_minutos = duracion_minutos
+                    clase.entrenador = entrenador
+                    clase.max_participantes = max_participantes
+                    clase.precio = precio
+
+                clase.save()
+                # Si subió el cupo, los lugares nuevos son primero de la lista de espera
+                llenar_desde_espera(clase)
+        except ValueError as e:
+            messages.error(request, str(e))
+            context = {'clase': clase, 'entrenadores': entrenadores}
+            return render(request, 'gimnasio/clase_form.html', context)
 
         messages.success(request, f'Clase "{nombre}" guardada correctamente.')
         return redirect('lista_clases')
@@ -548,6 +579,19 @@ def clase_form(request, pk=None):
     return render(request, 'gimnasio/clase_form.html', context)
 
 
+@login_required
+@permission_required('gimnasio.add_claseserie', login_url='perfil_socio', raise_exception=False)
+def clase_serie_form(request, pk=None):
+    # El formulario guarda vía /api/series/ (igual que clase_form con /api/clases/)
+    serie = get_object_or_404(ClaseSerie, pk=pk) if pk else None
+    context = {
+        'serie': serie,
+        'entrenadores': Entrenador.objects.all(),
+        'dias_semana': ClaseSerie.DIAS_SEMANA,
+    }
+    return render(request, 'gimnasio/clase_serie_form.html', context)
+
+
 @login_required
 @permission_required('gimnasio.delete_clase', login_url='perfil_socio', raise_exception=False)
 def eliminar_clase(request, pk):
@@ -571,21 +615,11 @@ def inscribir_clase(request, clase_pk):
             
         try:
             socio = Socio.objects.get(id_socio=socio_id_input)
+            _, espera = inscribir_o_esperar(clase, socio, request.POST.get('metodo', 'efectivo'))
+            _mensaje_inscripcion(request, socio, clase, espera)
             
-            if clase.participantes.filter(pk=socio.pk).exists():
-                messages.warning(request, f'El socio {socio.nombre} ya está inscrito en {clase.nombre}.')
-                return redirect('lista_clases')
-
-            #Verificar capacidad máxima
-            if clase.participantes_actuales >= clase.max_participantes:
-                messages.error(request, f'La clase {clase.nombre} está llena. ¡Máximo {clase.max_participantes} participantes!')
-                return redirect('lista_clases')
-                
-            #Realizar la inscripción
-            clase.participantes.add(socio)
-            
-            messages.success(request, f'¡Inscripción exitosa! {socio.nombre} inscrito a la clase de {clase.nombre}.')
-            
+        except YaInscrito as e:
+            messages.warning(request, str(e))
         except Socio.DoesNotExist:
             messages.error(request, f'Error: No se encontró ningún socio con el ID "{socio_id_input}".')
         except Exception as e:
@@ -605,38 +639,11 @@ def inscripcion_clase_detalle(request, pk):
             
         try:
             socio = Socio.objects.get(id_socio=socio_id_input)
+            _, espera = inscribir_o_esperar(clase, socio, request.POST.get('metodo', 'efectivo')) # Debe venir del formulario
+            _mensaje_inscripcion(request, socio, clase, espera)
             
-            if clase.participantes.filter(pk=socio.pk).exists():
-                messages.warning(request, f'El socio {socio.nombre} ya está inscrito en {clase.nombre}.')
-                return redirect('inscripcion_clase_detalle', pk=pk)
-
-            if clase.participantes_actuales >= clase.max_participantes:
-                messages.error(request, f'La clase {clase.nombre} está llena. ¡Máximo {clase.max_participantes} participantes!')
-                return redirect('inscripcion_clase_detalle', pk=pk)
-                
-            clase.participantes.add(socio)
-    
-            inscripcion = InscripcionClase.objects.create(
-                id_inscripcion=f"INS{date.today().strftime('%Y%m%d')}-{socio.id_socio}-{clase.id_clase}",
-                socio=socio,
-                clase=clase,
-            )
-            
-            movimiento = CajaMovimiento.objects.create(
-                tipo='clase',
-                descripcion=f"Pago Clase {clase.nombre} - Socio {socio.id_socio}",
-                metodo_pago=request.POST.get('metodo', 'efectivo'), # Debe venir del formulario
-                monto=clase.precio,
-                socio=socio,
-                inscripcion_clase=inscripcion
-            )
-
-            inscripcion.movimiento_caja = movimiento
-            inscripcion.save()
-            
-            
-            messages.success(request, f'¡Inscripción exitosa! {socio.nombre} inscrito a la clase de {clase.nombre} por ${clase.precio}.')
-            
+        except YaInscrito as e:
+            messages.warning(request, str(e))
         except Socio.DoesNotExist:
             messages.error(request, f'Error: No se encontró ningún socio con el ID "{socio_id_input}".')
         except Exception as e:
@@ -646,6 +653,7 @@ def inscripcion_clase_detalle(request, pk):
 
     context = {
         'clase': clase,
+        'lista_espera': clase.lista_espera.select_related('socio'),
     }
     return render(request, 'gimnasio/inscripcion_clase_detalle.html', context)
 
@@ -656,26 +664,34 @@ def eliminar_inscripcion_clase(request, clase_pk, socio_pk):
     socio = get_object_or_404(Socio, pk=socio_pk)
     
     if request.method == 'POST':
-        if clase.participantes.filter(pk=socio.pk).exists():
-            clase.participantes.remove(socio)
-            
-            try:
-                inscripcion = InscripcionClase.objects.get(socio=socio, clase=clase)
-                
-                if inscripcion.movimiento_caja:
-                    pago_id = inscripcion.movimiento_caja.pk
-                    inscripcion.movimiento_caja.delete() # Elimina el pago
-                    messages.info(request, f'Pago asociado ({pago_id}) eliminado.')
-                
-                inscripcion.delete()
-                
-                messages.success(request, f'Inscripción de {socio.nombre} a {clase.nombre} eliminada correctamente.')
-                
-            except InscripcionClase.DoesNotExist:
-                messages.warning(request, f'Advertencia: No se encontró un registro formal de InscripcionClase. Se eliminó de la lista de participantes.')
-            
+        try:
+            pago_id, promovida = cancelar(clase, socio)
+        except InscripcionError as e:
+            messages.error(request, str(e))
         else:
-            messages.error(request, f'El socio {socio.nombre} no estaba inscrito en {clase.nombre}.')
+            if pago_id:
+                messages.info(request, f'Pago asociado ({pago_id}) eliminado.')
+            messages.success(request, f'Inscripción de {socio.nombre} a {clase.nombre} eliminada correctamente.')
+            if promovida:
+                messages.success(request, f'{promovida.socio.nombre} pasó de la lista de espera a la clase.')
+
+    return redirect('inscripcion_clase_detalle', pk=clase_pk)
+
+@login_required
+@permission_required('gimnasio.delete_inscripcionclase', login_url='perfil_socio', raise_exception=False)
+def quitar_de_espera(request, clase_pk, socio_pk):
+    clase = get_object_or_404(Clase, pk=clase_pk)
+    socio = get_object_or_404(Socio, pk=socio_pk)
+
+    if request.method == 'POST':
+        try:
+            salir_de_espera(clase, socio)
+        except InscripcionError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f'{socio.nombre} salió de la lista de espera de {clase.nombre}.')
+
+    return redirect('inscripcion_clase_detalle', pk=clase_pk)
             
 # Listado de Instructores
 @login_required
@@ -727,14 +743,8 @@ def instructor_form(request, pk=None):
                 messages.success(request, f'Instructor {nombre} actualizado con éxito.')
             else:
                 # Nuevo Entrenador
-                contador = Entrenador.objects.count() + 1
-                id_entrenador =str(contador).zfill(3)
-                while Entrenador.objects.filter(id_entrenador=id_entrenador).exists():
-                    contador += 1
-                    id_entrenador =str(contador).zfill(3)
-                    
                 Entrenador.objects.create(
-                    id_entrenador=id_entrenador,
+                    id_entrenador=siguiente_id('entrenador'),
                     nombre=nombre,
                     especialidad=especialidad,
                     telefono=telefono,
@@ -769,6 +779,59 @@ def eliminar_instructor(request, pk):
 
     return redirect('instructores_list')
 
+MOVIMIENTOS_ORDEN = ('-fecha', '-id')
+
+
+def _filtrar_movimientos(params):
+    """Aplica los filtros del libro de caja; devuelve (queryset, filtros válidos)."""
+    movimientos = CajaMovimiento.objects.select_related(
+        'venta',
+        'suscripcion',
+        'socio',
+        'inscripcion_clase__clase',
+    )
+    filtros = {}
+    if params.get('tipo') in dict(CajaMovimiento.TIPOS):
+        filtros['tipo'] = params['tipo']
+        movimientos = movimientos.filter(tipo=filtros['tipo'])
+    if params.get('metodo_pago') in dict(CajaMovimiento.METODOS):
+        filtros['metodo_pago'] = params['metodo_pago']
+        movimientos = movimientos.filter(metodo_pago=filtros['metodo_pago'])
+    socio = sanitize_search_query(params.get('socio', '')).upper()
+    if socio:
+        filtros['socio'] = socio
+        movimientos = movimientos.filter(socio__id_socio=socio)
+    for campo, lookup, dias in (('desde', 'fecha__gte', 0), ('hasta', 'fecha__lt', 1)):
+        try:
+            dia = datetime.strptime(params.get(campo, ''), '%Y-%m-%d').date()
+        except ValueError:
+            continue
+        filtros[campo] = dia.isoformat()
+        # Rango sobre el índice (fecha, id) en lugar de fecha__date
+        movimientos = movimientos.filter(**{lookup: inicio_del_dia(dia + timedelta(days=dias))})
+    return movimientos, filtros
+
+
+def _movimientos_json(pagina):
+    """Variante JSON de una página del libro de caja para carga progresiva."""
+    return JsonResponse({
+        'results': [
+            {
+                'id': m.pk,
+                'fecha': timezone.localtime(m.fecha).strftime('%d/%m/%Y %H:%M'),
+                'tipo': m.get_tipo_display(),
+                'concepto': m.concepto,
+                'metodo_pago': m.get_metodo_pago_display(),
+                'monto': f'{m.monto:.2f}',
+                'venta_id': m.venta_id,
+            }
+            for m in pagina
+        ],
+        'next_cursor': pagina.next_cursor,
+        'prev_cursor': pagina.prev_cursor,
+    })
+
+
 class CajaView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
     template_name = "gimnasio/caja.html"
     permission_required = 'gimnasio.view_cajamovimiento'
@@ -776,16 +839,32 @@ class CajaView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
     def handle_no_permission(self):
         return redirect('perfil_socio')
 
+    def get(self, request, *args, **kwargs):
+        movimientos, self.filtros = _filtrar_movimientos(request.GET)
+        self.por_pagina = leer_por_pagina(request.GET.get('por_pagina'))
+        # Una consulta por página sin importar cuántas páginas haya detrás
+        self.pagina = paginar_keyset(movimientos, MOVIMIENTOS_ORDEN, request.GET.get('cursor'), self.por_pagina)
+        if request.GET.get('formato') == 'json':
+            return _movimientos_json(self.pagina)
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        movimientos = CajaMovimiento.objects.select_related(
-            'venta', 
-            'suscripcion',            
-        ).order_by('-fecha')[:200]
-        total_hoy = CajaMovimiento.objects.filter(fecha__date=date.today()).aggregate(total=Sum('monto'))['total'] or 0
+        # Los totales salen de CierreCaja, que se actualiza al registrar cada movimiento
+        hoy = timezone.localdate()
+        por_metodo = totales_por_metodo(hoy)
         ctx.update({
-            'movimientos': movimientos,
-            'total_hoy': total_hoy,
+            'movimientos': self.pagina,
+            'pagina': self.pagina,
+            'por_pagina': self.por_pagina,
+            'filtros': self.filtros,
+            'filtros_qs': urlencode(self.filtros),
+            'tipos': CajaMovimiento.TIPOS,
+            'metodos': CajaMovimiento.METODOS,
+            'total_hoy': sum(por_metodo.values()),
+            'totales_hoy': [
+                (nombre, por_metodo[metodo]) for metodo, nombre in CajaMovimiento.METODOS if metodo in por_metodo
+            ],
         })
         return ctx
 
@@ -793,83 +872,46 @@ class CajaView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
 @permission_required('gimnasio.add_cajamovimiento', login_url='perfil_socio', raise_exception=False)
 def pago_productos(request):
     """Pantalla para registrar ventas de productos en la tienda del gym."""
-    productos = Producto.objects.all().order_by("nombre")
+    productos = productos_con_stock()
 
     if request.method == "POST":
         pass 
-    return render(request, "gimnasio/pago_productos.html", {"productos": productos})
+    return render(request, "gimnasio/pago_productos.html", {"productos": productos, "lote_ventas": LOTE_MAXIMO_VENTAS})
 
 @login_required
 @permission_required('gimnasio.view_cajamovimiento', login_url='perfil_socio', raise_exception=False)
 def ticket_venta_pdf(request, venta_id: int):
-    """Genera un PDF tipo ticket para una venta de productos."""
-    venta = get_object_or_404(Caja.objects.prefetch_related("items__producto"), pk=venta_id)
-
-    ancho = 80 * mm
-    alto_base = 110 * mm
-    alto_por_item = 6 * mm
-    num_items = venta.items.count()
-    alto = alto_base + num_items * alto_por_item
-    pagesize = (ancho, alto)
-
-    # Respuesta PDF
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f"inline; filename=ticket_venta_{venta.id}.pdf"
-
-    c = canvas.Canvas(response, pagesize=pagesize)
-    y = alto - 8 * mm
-
-    def center(text, y_pos, size=11):
-        c.setFont("Helvetica-Bold", size)
-        c.drawCentredString(ancho / 2, y_pos, text)
-
-    def left(text, y_pos, size=10):
-        c.setFont("Helvetica", size)
-        c.drawString(6 * mm, y_pos, text)
-
-    # Encabezado
-    center("Control Gym", y, 12); y -= 6 * mm
-    center("Ticket de Venta", y, 11); y -= 8 * mm
-
-    left(f"N°: {venta.id}", y); y -= 5 * mm
-    left(venta.fecha.strftime("Fecha: %d/%m/%Y %H:%M"), y); y -= 5 * mm
-    left(f"Método: {venta.get_metodo_pago_display()}", y); y -= 5 * mm
-    if venta.cliente:
-        left(f"Cliente: {venta.cliente}", y); y -= 5 * mm
-
-    # Separador
-    c.line(6 * mm, y, ancho - 6 * mm, y); y -= 5 * mm
-    left("Producto", y); c.drawRightString(ancho - 6 * mm, y, "Subtotal"); y -= 4 * mm
-    c.line(6 * mm, y, ancho - 6 * mm, y); y -= 4 * mm
-
-    # Items
-    for it in venta.items.all():
-        nombre = f"{it.producto.nombre} x{it.cantidad}"
-        left(nombre[:30], y)
-        c.drawRightString(ancho - 6 * mm, y, f"${it.subtotal:.2f}")
-        y -= 5 * mm
-
-    # Total
-    c.line(6 * mm, y, ancho - 6 * mm, y); y -= 6 * mm
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(6 * mm, y, "TOTAL:")
-    c.drawRightString(ancho - 6 * mm, y, f"${venta.total:.2f}")
-    y -= 8 * mm
-
-    # Observación
-    if venta.observacion:
-        left("Obs:", y); y -= 5 * mm
-        c.setFont("Helvetica", 9)
-        for line in str(venta.observacion).splitlines():
-            left(line[:40], y); y -= 4 * mm
-        y -= 2 * mm
-
-    # Footer
-    c.line(6 * mm, y, ancho - 6 * mm, y); y -= 6 * mm
-    center("¡Gracias por su compra!", y, 10)
-
-    c.showPage()
-    c.save()
+    """
+    Ticket PDF de una venta. Se genera una sola vez y se sirve desde TICKETS_DIR;
+    con If-None-Match basta la consulta de la venta y un stat del archivo.
+    ?formato=escpos devuelve los bytes ESC/POS y ?formato=texto el ticket en texto plano.
+    """
+    formato = request.GET.get("formato", "pdf")
+    if formato in ("escpos", "texto"):
+        # Salida directa para impresora térmica: más barata de generar que el PDF y sin rasterizar
+        venta = get_object_or_404(Caja.objects.prefetch_related("items__producto"), pk=venta_id)
+        if formato == "escpos":
+            response = HttpResponse(renderizar_escpos(venta), content_type="application/octet-stream")
+            response["Content-Disposition"] = f"attachment; filename=ticket_venta_{venta.id}.bin"
+        else:
+            response = HttpResponse(renderizar_texto(venta), content_type="text/plain; charset=utf-8")
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    venta = get_object_or_404(Caja, pk=venta_id)
+    huella = ticket_guardado(venta)
+    if huella is None:
+        venta = Caja.objects.prefetch_related("items__producto").get(pk=venta.pk)
+        huella = generar_ticket(venta)
+
+    etag = f'"{huella}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(open(ruta_ticket(huella), 'rb'), content_type="application/pdf")
+        response["Content-Disposition"] = f"inline; filename=ticket_venta_{venta.id}.pdf"
+    response["ETag"] = etag
+    # El ticket puede cambiar si se corrige la venta en el admin: se revalida siempre con el ETag
+    response["Cache-Control"] = "private, no-cache"
     return response
 
 